@@ -1,3 +1,4 @@
+import os
 from flask import Flask
 from config import Config
 from database import init_db
@@ -6,6 +7,12 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # Take the client address from X-Forwarded-* set by our own reverse proxies
+    if app.config.get('TRUSTED_PROXY_HOPS'):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config['TRUSTED_PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
     # Import all models first to ensure proper registration
     import models
 
@@ -25,6 +32,17 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(otp_bp, url_prefix='/api/otp')
 
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+
+    # Start the maintenance scheduler on the first request this process serves
+    from services.maintenance_service import MaintenanceService
+
+    @app.before_request
+    def start_maintenance_scheduler():
+        MaintenanceService.ensure_started(app)
+
     # Add headers for API compatibility
     @app.after_request
     def after_request(response):
@@ -43,4 +61,7 @@ def create_app():
 
 if __name__ == '__main__':
     app = create_app()
+    # The development server is one process, so it can hold the notification hub itself
+    if 'SSE_HUB_MODE' not in os.environ:
+        app.config['SSE_HUB_MODE'] = 'embedded'
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,171 @@
+import click
+import json
+import time
+
+
+def register_commands(app):
+    """Register maintenance CLI commands (run with `flask --app app <command>`)"""
+
+    @app.cli.command('merge-duplicate-customers')
+    @click.option('--apply', 'apply_changes', is_flag=True, help='Merge the duplicates instead of only reporting them.')
+    @click.option('--chunk-size', default=1000, show_default=True, help='Customers fetched per chunk while scanning.')
+    @click.option('--groups-per-transaction', default=100, show_default=True, help='Duplicate groups merged per commit.')
+    def merge_duplicate_customers(apply_changes, chunk_size, groups_per_transaction):
+        """Find customers sharing a phone/email and merge them (dry run by default)."""
+        from services.customer_merge_service import CustomerMergeService
+
+        report = CustomerMergeService.merge_duplicates(
+            dry_run=not apply_changes,
+            chunk_size=chunk_size,
+            groups_per_transaction=groups_per_transaction
+        )
+        click.echo(json.dumps(report, indent=2))
+
+    @app.cli.command('sms-outbox-worker')
+    @click.option('--once', is_flag=True, help='Deliver everything that is currently due, then exit.')
+    def sms_outbox_worker(once):
+        """Deliver queued SMS from the outbox (run with SMS_OUTBOX_WORKER_ENABLED=false on web workers)."""
+        from services.sms_outbox_service import SmsOutboxWorker, SmsBatchDispatcher
+
+        worker = SmsOutboxWorker.from_config(app)
+        batch_dispatcher = SmsBatchDispatcher.from_config(app) if app.config.get('SMS_BATCHED_PURPOSES') else None
+        if once:
+            while worker.drain_once():
+                pass
+            stats = {'worker': worker.get_stats()}
+            if batch_dispatcher:
+                # Send what is queued now instead of waiting for the grouping window
+                batch_dispatcher.window_seconds = 0
+                while batch_dispatcher.drain_once():
+                    pass
+                stats['batch_dispatcher'] = batch_dispatcher.get_stats()
+            click.echo(json.dumps(stats, indent=2))
+            return
+
+        worker.start()
+        if batch_dispatcher:
+            batch_dispatcher.start()
+        click.echo(f"SMS outbox worker running with {worker.threads} threads. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            worker.stop()
+            if batch_dispatcher:
+                batch_dispatcher.stop()
+
+    @app.cli.command('sms-outbox-benchmark')
+    @click.option('--count', default=1000, show_default=True, help='Messages to enqueue and deliver.')
+    @click.option('--threads', default=8, show_default=True, help='Delivery threads.')
+    @click.option('--batch-size', default=50, show_default=True, help='Messages claimed per batch.')
+    @click.option('--latency-ms', default=50, show_default=True, help='Simulated gateway latency per message.')
+    def sms_outbox_benchmark(count, threads, batch_size, latency_ms):
+        """Measure outbox throughput offline using the fake SMS provider."""
+        from services.sms_outbox_service import SmsOutboxService
+
+        report = SmsOutboxService.run_benchmark(app, count=count, threads=threads,
+                                                batch_size=batch_size, latency_ms=latency_ms)
+        click.echo(json.dumps(report, indent=2))
+
+    @app.cli.command('domain-event-dispatcher')
+    @click.option('--once', is_flag=True, help='Dispatch everything that is currently due, then exit.')
+    def domain_event_dispatcher(once):
+        """Dispatch outbox events (run with DOMAIN_EVENT_DISPATCHER_ENABLED=false on web workers)."""
+        from services.domain_event_service import DomainEventDispatcher
+
+        dispatcher = DomainEventDispatcher.from_config(app)
+        if once:
+            while dispatcher.drain_once():
+                pass
+            click.echo(json.dumps(dispatcher.get_stats(), indent=2))
+            return
+
+        dispatcher.start()
+        click.echo("Domain event dispatcher running. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            dispatcher.stop()
+
+    @app.cli.command('sms-batch-benchmark')
+    @click.option('--count', default=1000, show_default=True, help='Messages to enqueue and deliver.')
+    @click.option('--distinct-messages', default=10, show_default=True, help='Different message texts among them.')
+    @click.option('--max-recipients', default=100, show_default=True, help='Numbers per provider call.')
+    @click.option('--latency-ms', default=50, show_default=True, help='Simulated gateway latency per call.')
+    def sms_batch_benchmark(count, distinct_messages, max_recipients, latency_ms):
+        """Measure batched delivery offline using the fake SMS provider."""
+        from services.sms_outbox_service import SmsOutboxService
+
+        report = SmsOutboxService.run_batch_benchmark(app, count=count, distinct_messages=distinct_messages,
+                                                      max_recipients=max_recipients, latency_ms=latency_ms)
+        click.echo(json.dumps(report, indent=2))
+
+    from services.maintenance_service import MAINTENANCE_JOBS
+
+    @app.cli.command('run-maintenance')
+    @click.option('--job', 'job_name', default=None, type=click.Choice(list(MAINTENANCE_JOBS)),
+                  help='Run only this job (default: all).')
+    def run_maintenance(job_name):
+        """Run the cleanup jobs (expired OTPs and tokens, old read notifications and SMS) once."""
+        from services.maintenance_service import MaintenanceScheduler
+
+        scheduler = MaintenanceScheduler(app)
+        if job_name:
+            scheduler.run_job(job_name)
+        else:
+            scheduler.run_all()
+        click.echo(json.dumps(scheduler.get_stats()['jobs'], indent=2))
+
+    @app.cli.command('archive-old-records')
+    @click.option('--appointment-days', default=None, type=int, help='Archive finished appointments not updated for this many days (default: APPOINTMENT_ARCHIVE_AFTER_DAYS).')
+    @click.option('--notification-days', default=None, type=int, help='Archive notifications read this many days ago (default: NOTIFICATION_ARCHIVE_AFTER_DAYS).')
+    @click.option('--chunk-size', default=1000, show_default=True, help='Rows moved per transaction.')
+    def archive_old_records(appointment_days, notification_days, chunk_size):
+        """Move old finished appointments and read notifications to the archive tables."""
+        from services.archive_service import ArchiveService
+
+        moved = ArchiveService.archive_old_records(appointment_days=appointment_days,
+                                                   notification_days=notification_days,
+                                                   chunk_size=chunk_size)
+        click.echo(json.dumps({'moved': moved, 'tables': ArchiveService.get_stats()}, indent=2))
+
+    @app.cli.command('build-pincode-db')
+    @click.argument('source_csv', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--output', default=None, help='Output file (default: PINCODE_DATASET_PATH).')
+    def build_pincode_db(source_csv, output):
+        """Compile the data.gov.in All India Pincode Directory CSV into the offline lookup file."""
+        from services.pincode_dataset import PincodeDataset
+
+        output = output or app.config['PINCODE_DATASET_PATH']
+        count = PincodeDataset.compile_csv(source_csv, output)
+        click.echo(f"Wrote {count} pincodes to {output}")
+
+    @app.cli.command('notification-hub-benchmark')
+    @click.option('--clients', default=1000, show_default=True, help='Concurrent event streams to open.')
+    @click.option('--rounds', default=5, show_default=True, help='Events fanned out to every stream.')
+    def notification_hub_benchmark(clients, rounds):
+        """Measure how many idle notification streams one hub holds and how fast it fans out."""
+        from services.notification_hub import NotificationHubService
+
+        report = NotificationHubService.run_benchmark(app, clients=clients, rounds=rounds)
+        click.echo(json.dumps(report, indent=2))
+
+    @app.cli.command('notification-hub')
+    def notification_hub():
+        """Run the notification hub in the foreground (web workers must keep SSE_HUB_MODE=external)."""
+        import asyncio
+        from services.notification_hub import NotificationHubService
+
+        hub = NotificationHubService.create_hub(app)
+        NotificationHubService.set_hub(hub)
+
+        async def serve():
+            await hub.start(app.config['SSE_HUB_HOST'], app.config['SSE_HUB_PORT'])
+            click.echo(f"Notification hub listening on port {hub.port}, bus socket {hub.bus_path}. Press Ctrl+C to stop.")
+            await asyncio.Event().wait()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
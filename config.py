@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
@@ -12,6 +13,14 @@ class Config:
     AUTH_TOKEN_EXPIRY_HOURS = 24 * 30  # 30 days
     MAX_AUTH_ATTEMPTS = 5  # Max failed authentication attempts
     AUTH_RATE_LIMIT = 10  # Max auth requests per minute
+    AUTH_ATTEMPT_WINDOW_SECONDS = 600  # Window for MAX_AUTH_ATTEMPTS per phone number
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))  # Reverse proxies in front of the app whose X-Forwarded-* headers are trusted (client IP for rate limits)
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite')  # 'sqlite' (shared by all workers) or 'memory' (single process)
+    RATE_LIMIT_STORAGE_PATH = os.environ.get('RATE_LIMIT_STORAGE_PATH') or str(BASE_DIR / 'rate_limits.db')
+    AUTH_TOKEN_CACHE_SIZE = 10000  # Max tokens held in the in-process validation cache
+    AUTH_TOKEN_CACHE_TTL_SECONDS = 60  # How long a cached token is trusted before re-checking the database
+    AUTH_SIGNED_TOKENS = os.environ.get('AUTH_SIGNED_TOKENS', '').lower() in ('1', 'true', 'yes')  # Issue stateless signed tokens
+    AUTH_EPOCH_CACHE_TTL_SECONDS = 30  # How long a customer's revocation epoch is trusted before re-checking
 
     # Database configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{BASE_DIR / "om_engineers.db"}'
@@ -30,6 +39,90 @@ class Config:
     # Fast2SMS API Configuration
     FAST2SMS_API_KEY = '4arM7o4FY7pK5cyjUlrBcXa5UlcmYlJZGrbrlZsuQ0d8ZQ5Syvs3xe6JSZgU'
 
+    # SMS delivery configuration
+    SMS_PROVIDER = os.environ.get('SMS_PROVIDER', 'fast2sms')  # 'fast2sms' or 'fake' (offline testing)
+    FAKE_SMS_LATENCY_MS = int(os.environ.get('FAKE_SMS_LATENCY_MS', 0))  # Simulated gateway latency for the fake provider
+    FAKE_SMS_FAILURE_RATE = float(os.environ.get('FAKE_SMS_FAILURE_RATE', 0))  # Fraction of fake sends that fail
+    SMS_OUTBOX_WORKER_ENABLED = os.environ.get('SMS_OUTBOX_WORKER_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # Run the outbox worker inside web processes
+    SMS_OUTBOX_WORKER_THREADS = 8  # Concurrent deliveries per worker
+    SMS_OUTBOX_BATCH_SIZE = 50  # Messages claimed per batch
+    SMS_OUTBOX_POLL_SECONDS = 2  # Idle poll interval when not woken by a new message
+    SMS_OUTBOX_LEASE_SECONDS = 120  # Claimed messages are retried by another worker after this long
+    SMS_OUTBOX_MAX_ATTEMPTS = 5  # Deliveries tried before a message is dead-lettered
+    SMS_RETRY_BASE_SECONDS = 5  # First retry delay, doubled on each attempt
+    SMS_BATCHED_PURPOSES = ['appointment']  # Outbox messages of these kinds are grouped into multi-recipient calls
+    SMS_BATCH_WINDOW_SECONDS = 5  # Identical messages queued within this window share provider calls
+    SMS_BATCH_MAX_RECIPIENTS = 100  # Numbers per provider call
+    SMS_BATCH_CALLS_PER_SECOND = 5  # Batched provider calls per second across all workers on the host
+    SMS_BATCH_CLAIM_SIZE = 1000  # Messages claimed per dispatcher pass
+    APPOINTMENT_SMS_STATUSES = ['confirmed', 'cancelled', 'rescheduled']  # Appointment status changes also sent to the customer by SMS
+
+    # Domain event outbox (appointment changes are turned into notifications/SMS after they commit)
+    DOMAIN_EVENT_DISPATCHER_ENABLED = os.environ.get('DOMAIN_EVENT_DISPATCHER_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # Run the dispatcher inside web processes
+    DOMAIN_EVENT_BATCH_SIZE = 100  # Events claimed per batch
+    DOMAIN_EVENT_POLL_SECONDS = 2  # Idle poll interval when not woken by a new event
+    DOMAIN_EVENT_LEASE_SECONDS = 60  # Claimed events are retried by another dispatcher after this long
+    DOMAIN_EVENT_RETRY_BASE_SECONDS = 5  # First retry delay, doubled on each attempt
+
+    # Background maintenance (every app process runs the scheduler; a per-job database lease runs each job once per interval)
+    MAINTENANCE_ENABLED = os.environ.get('MAINTENANCE_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # Set false on processes that should never run the jobs
+    MAINTENANCE_CHUNK_SIZE = 1000  # Rows deleted/updated per statement and transaction
+    MAINTENANCE_OTP_INTERVAL_SECONDS = 300  # Purge expired OTPs
+    MAINTENANCE_TOKEN_INTERVAL_SECONDS = 3600  # Clear expired auth tokens
+    MAINTENANCE_NOTIFICATION_INTERVAL_SECONDS = 6 * 3600  # Purge old read notifications
+    MAINTENANCE_NOTIFICATION_COUNTER_INTERVAL_SECONDS = 3600  # Recompute drifted unread counters
+    MAINTENANCE_SMS_OUTBOX_INTERVAL_SECONDS = 3600  # Purge delivered and dead-lettered SMS
+    MAINTENANCE_DOMAIN_EVENT_INTERVAL_SECONDS = 3600  # Purge dispatched and dead-lettered domain events
+    MAINTENANCE_PINCODE_CACHE_INTERVAL_SECONDS = 24 * 3600  # Purge expired pincode cache entries
+    MAINTENANCE_RATE_LIMIT_INTERVAL_SECONDS = 3600  # Delete rate-limit buckets idle for longer than their window
+    MAINTENANCE_ARCHIVE_INTERVAL_SECONDS = 24 * 3600  # Move old appointments and notifications to the archive tables
+    NOTIFICATION_RETENTION_DAYS = 90  # Read notifications older than this are deleted, hot or archived
+    APPOINTMENT_ARCHIVE_AFTER_DAYS = 180  # Completed/cancelled appointments not updated for this long are archived
+    NOTIFICATION_ARCHIVE_AFTER_DAYS = 30  # Read notifications older than this are archived
+    SMS_OUTBOX_RETENTION_DAYS = 7  # Finished outbox messages older than this are deleted
+    DOMAIN_EVENT_RETENTION_DAYS = 7  # Dispatched domain events older than this are deleted
+
+    # Offline pincode directory (build with `flask --app app build-pincode-db <csv>`)
+    PINCODE_DATASET_PATH = os.environ.get('PINCODE_DATASET_PATH') or str(BASE_DIR / 'data' / 'pincodes.bin')
+    PINCODE_LOOKUP_THREADS = 8  # Shared pool used to query the online providers concurrently
+    PINCODE_LOOKUP_TIMEOUT_SECONDS = 4  # Longest a cold online lookup may take
+    PINCODE_CACHE_SIZE = 5000  # Results kept in the in-process LRU
+    PINCODE_MEMORY_CACHE_TTL_SECONDS = 3600  # In-process lifetime of a cached result
+    PINCODE_CACHE_TTL_SECONDS = 30 * 24 * 3600  # Persistent lifetime of a found result
+    PINCODE_NEGATIVE_CACHE_TTL_SECONDS = 24 * 3600  # Persistent lifetime of a 'not found' result
+
+    # Outbound HTTP clients (per provider connection pool, timeouts and circuit breaker)
+    OUTBOUND_HTTP_DEFAULTS = {
+        'connect_timeout': 3,
+        'read_timeout': 10,
+        'failure_threshold': 5,  # Consecutive failures before the circuit opens
+        'reset_seconds': 30,  # How long an open circuit fails fast before probing again
+        'pool_maxsize': 10  # Keep-alive connections per host
+    }
+    OUTBOUND_HTTP_PROVIDERS = {
+        'fast2sms': {'read_timeout': 10},
+        'pincode_gov_data': {'connect_timeout': 2, 'read_timeout': 3},
+        'pincode_new_format': {'connect_timeout': 2, 'read_timeout': 3},
+        'pincode_old_format': {'connect_timeout': 2, 'read_timeout': 3},
+        'pincode_zippopotam': {'connect_timeout': 2, 'read_timeout': 3}
+    }
+
+    # Real-time notification hub (asyncio server holding the SSE streams)
+    SSE_HUB_MODE = os.environ.get('SSE_HUB_MODE', 'external')  # 'external' (`flask --app app notification-hub` behind the proxy, for production) or 'embedded' (single process; the default under `python app.py`)
+    SSE_HUB_HOST = os.environ.get('SSE_HUB_HOST', '127.0.0.1')  # Only the reverse proxy should reach the hub
+    SSE_HUB_PORT = int(os.environ.get('SSE_HUB_PORT', 5001))
+    SSE_HUB_PUBLIC_URL = os.environ.get('SSE_HUB_PUBLIC_URL', '')  # e.g. https://example.com when proxied; defaults to this host on SSE_HUB_PORT
+    SSE_BUS_SOCKET = os.environ.get('SSE_BUS_SOCKET') or os.path.join(tempfile.gettempdir(), 'om_engineers_notifications.sock')  # Unix socket other workers publish to the hub through
+    SSE_KEEPALIVE_SECONDS = 30  # Idle streams get a keepalive event this often
+    SSE_CLIENT_QUEUE_SIZE = 32  # Undelivered events kept per stream; on overflow the backlog is replaced by one 'resync' event
+    SSE_MAX_CONNECTIONS_PER_CUSTOMER = 5  # Oldest stream is closed when a customer opens more
+    SSE_REPLAY_BUFFER_SIZE = 50  # Recent events kept per customer for Last-Event-ID resume
+    SSE_REPLAY_MAX_CUSTOMERS = 10000  # Customers with a replay buffer; least recently notified are dropped first
+    NOTIFICATION_BROADCAST_CHUNK_SIZE = 1000  # Customers notified per transaction and SSE fan-out in a segment broadcast
+
     # OTP Configuration
     OTP_EXPIRY_MINUTES = 10  # OTP valid for 10 minutes
-    OTP_LENGTH = 6  # 6 digit OTP
\ No newline at end of file
+    OTP_LENGTH = 6  # 6 digit OTP
+    OTP_SEND_COALESCE_SECONDS = 30  # Repeat send/resend requests within this window reuse the last SMS
+    OTP_RESEND_MIN_REMAINING_SECONDS = 120  # Resends reuse the live code while it has at least this long left
+    OTP_STORE_BACKEND = os.environ.get('OTP_STORE_BACKEND', 'database')  # 'database' (shared by all workers) or 'memory' (single process, no DB writes)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -19,34 +20,348 @@ def initialize_default_data():
     # Import all models to ensure proper registration
     from models import Service, Customer, Appointment, OTP, CustomerAuth
 
+    # Add and backfill canonical identity columns on existing databases
+    migrate_customer_identity_columns()
+
+    # Add revocation epoch column used by signed auth tokens
+    add_missing_columns('customer_auth', {'token_epoch': 'INTEGER NOT NULL DEFAULT 0'})
+
+    # Add send timestamp used to coalesce OTP resends
+    add_missing_columns('otps', {'last_sent_at': 'DATETIME'})
+
+    # Add provider request id recorded by batched SMS delivery
+    add_missing_columns('sms_outbox', {'provider_ref': 'VARCHAR(100)'})
+
     # Migrate existing customers to have auth records
     migrate_existing_customers()
 
+    # Full-text index behind admin customer search
+    ensure_customer_search_index()
+
+    # Indexes used by the scheduled cleanup jobs
+    ensure_maintenance_indexes()
+
     # No default services - admin will populate via web interface
     print("Database tables created successfully! Ready for admin population.")
 
-def migrate_existing_customers():
-    """Create auth records for existing customers that don't have them"""
+def add_missing_columns(table_name, columns):
+    """Add columns that db.create_all() cannot add to an already existing table.
+
+    Args:
+        table_name: Name of the table to alter
+        columns: Mapping of column name to its SQL type declaration
+
+    Returns:
+        list: Names of the columns that were added
+    """
+    inspector = db.inspect(db.engine)
+    if not inspector.has_table(table_name):
+        return []
+
+    existing = {column['name'] for column in inspector.get_columns(table_name)}
+    added = []
+    for column_name, column_type in columns.items():
+        if column_name not in existing:
+            db.session.execute(db.text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+            added.append(column_name)
+
+    if added:
+        db.session.commit()
+    return added
+
+def migrate_customer_identity_columns(chunk_size=1000):
+    """Add canonical phone/email columns to customers and backfill existing rows"""
+    try:
+        from utils.normalization import normalize_phone_number, normalize_email
+
+        added = add_missing_columns('customers', {
+            'phone_normalized': 'VARCHAR(20)',
+            'email_normalized': 'VARCHAR(120)'
+        })
+        db.session.execute(db.text("CREATE INDEX IF NOT EXISTS ix_customers_email_normalized ON customers (email_normalized)"))
+        db.session.commit()
+
+        if added:
+            print(f"Added customer identity columns: {', '.join(added)}")
+
+        # Backfill rows written before the columns existed, walking the primary key in chunks
+        backfilled = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(db.text(
+                "SELECT id, phone, email FROM customers "
+                "WHERE id > :last_id AND (phone_normalized IS NULL "
+                "OR (email_normalized IS NULL AND email IS NOT NULL AND email != '')) "
+                "ORDER BY id LIMIT :chunk_size"
+            ), {'last_id': last_id, 'chunk_size': chunk_size}).fetchall()
+
+            if not rows:
+                break
+
+            db.session.execute(db.text(
+                "UPDATE customers SET phone_normalized = :phone_normalized, "
+                "email_normalized = :email_normalized WHERE id = :id"
+            ), [{
+                'id': row.id,
+                'phone_normalized': normalize_phone_number(row.phone) or None,
+                'email_normalized': normalize_email(row.email) or None
+            } for row in rows])
+            db.session.commit()
+
+            backfilled += len(rows)
+            last_id = rows[-1].id
+
+        if backfilled:
+            print(f"Backfilled canonical phone/email for {backfilled} customers.")
+
+        ensure_customer_phone_unique_index()
+
+    except Exception as e:
+        print(f"Customer identity migration error: {e}")
+        db.session.rollback()
+
+def ensure_customer_phone_unique_index():
+    """Enforce one customer per canonical phone, which Customer.upsert relies on.
+
+    Databases that still hold duplicate customers keep a plain index until the
+    duplicates are merged; Customer.upsert falls back to lookup-then-insert there.
+    """
+    from models import Customer
+
+    try:
+        db.session.execute(db.text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_customers_phone_normalized ON customers (phone_normalized)"
+        ))
+        db.session.execute(db.text("DROP INDEX IF EXISTS ix_customers_phone_normalized"))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        db.session.execute(db.text(
+            "CREATE INDEX IF NOT EXISTS ix_customers_phone_normalized ON customers (phone_normalized)"
+        ))
+        db.session.commit()
+        print("Duplicate customers share a phone number; merge them to enable atomic customer upserts.")
+
+    Customer.reset_upsert_support()
+
+CUSTOMER_SEARCH_TRIGGERS = {
+    'customers_fts_ai': """
+        CREATE TRIGGER customers_fts_ai AFTER INSERT ON customers BEGIN
+            INSERT INTO customers_fts(rowid, name, email, phone_normalized)
+            VALUES (new.id, new.name, new.email, new.phone_normalized);
+        END
+    """,
+    'customers_fts_ad': """
+        CREATE TRIGGER customers_fts_ad AFTER DELETE ON customers BEGIN
+            INSERT INTO customers_fts(customers_fts, rowid, name, email, phone_normalized)
+            VALUES ('delete', old.id, old.name, old.email, old.phone_normalized);
+        END
+    """,
+    'customers_fts_au': """
+        CREATE TRIGGER customers_fts_au AFTER UPDATE ON customers BEGIN
+            INSERT INTO customers_fts(customers_fts, rowid, name, email, phone_normalized)
+            VALUES ('delete', old.id, old.name, old.email, old.phone_normalized);
+            INSERT INTO customers_fts(rowid, name, email, phone_normalized)
+            VALUES (new.id, new.name, new.email, new.phone_normalized);
+        END
+    """
+}
+
+# Trigram index over the canonical phone digits, so any run of 3+ digits (e.g. the last four) matches
+CUSTOMER_PHONE_SEARCH_TRIGGERS = {
+    'customers_phone_fts_ai': """
+        CREATE TRIGGER customers_phone_fts_ai AFTER INSERT ON customers BEGIN
+            INSERT INTO customers_phone_fts(rowid, phone_normalized) VALUES (new.id, new.phone_normalized);
+        END
+    """,
+    'customers_phone_fts_ad': """
+        CREATE TRIGGER customers_phone_fts_ad AFTER DELETE ON customers BEGIN
+            INSERT INTO customers_phone_fts(customers_phone_fts, rowid, phone_normalized)
+            VALUES ('delete', old.id, old.phone_normalized);
+        END
+    """,
+    'customers_phone_fts_au': """
+        CREATE TRIGGER customers_phone_fts_au AFTER UPDATE OF phone_normalized ON customers BEGIN
+            INSERT INTO customers_phone_fts(customers_phone_fts, rowid, phone_normalized)
+            VALUES ('delete', old.id, old.phone_normalized);
+            INSERT INTO customers_phone_fts(rowid, phone_normalized) VALUES (new.id, new.phone_normalized);
+        END
+    """
+}
+
+def _ensure_fts_index(name, create_sql, triggers):
+    """Create an external-content FTS5 table and its sync triggers, rebuilding it when triggers were missing"""
+    db.session.execute(db.text(create_sql))
+
+    existing_triggers = {row.name for row in db.session.execute(db.text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'customers'"
+    ))}
+    missing_triggers = [trigger for trigger in triggers if trigger not in existing_triggers]
+
+    if missing_triggers:
+        for trigger in missing_triggers:
+            db.session.execute(db.text(triggers[trigger]))
+
+        # Index is new or was detached from the table (e.g. after a reset) - rebuild from content
+        db.session.execute(db.text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+        print(f"Built {name} search index.")
+
+    db.session.commit()
+
+def ensure_customer_search_index():
+    """Create the FTS5 indexes mirroring customers, kept in sync by triggers (SQLite only)"""
+    from models import Customer
+
     try:
-        from models import Customer, CustomerAuth
+        if db.engine.dialect.name != 'sqlite':
+            return
+
+        _ensure_fts_index(
+            'customers_fts',
+            "CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5("
+            "name, email, phone_normalized, "
+            "content='customers', content_rowid='id', prefix='2 3')",
+            CUSTOMER_SEARCH_TRIGGERS
+        )
+    except Exception as e:
+        print(f"Customer search index unavailable, falling back to LIKE search: {e}")
+        db.session.rollback()
 
-        # Find customers without auth records
-        customers_without_auth = db.session.query(Customer).outerjoin(CustomerAuth).filter(CustomerAuth.customer_id == None).all()
+    try:
+        # The trigram tokenizer needs SQLite 3.34+
+        _ensure_fts_index(
+            'customers_phone_fts',
+            "CREATE VIRTUAL TABLE IF NOT EXISTS customers_phone_fts USING fts5("
+            "phone_normalized, content='customers', content_rowid='id', tokenize='trigram')",
+            CUSTOMER_PHONE_SEARCH_TRIGGERS
+        )
+    except Exception as e:
+        print(f"Customer phone search index unavailable, falling back to LIKE search: {e}")
+        db.session.rollback()
 
-        if customers_without_auth:
-            print(f"Creating auth records for {len(customers_without_auth)} customers...")
+    Customer.reset_search_support()
 
-            for customer in customers_without_auth:
-                CustomerAuth.get_or_create_for_customer(customer.id)
+def migrate_existing_customers(chunk_size=500):
+    """Create auth records for existing customers that don't have them"""
+    try:
+        from models import CustomerAuth
 
-            print(f"Successfully created auth records for {len(customers_without_auth)} customers!")
-        else:
+        # Cheap EXISTS check so a normal boot skips the backfill entirely
+        if not CustomerAuth.has_customers_without_auth():
             print("All customers already have auth records.")
+            return
+
+        def report_progress(created, total):
+            print(f"Creating auth records... {created}/{total}")
+
+        created = CustomerAuth.backfill_missing(chunk_size=chunk_size, progress=report_progress)
+        print(f"Successfully created auth records for {created} customers!")
 
     except Exception as e:
         print(f"Migration error (this is normal on first run): {e}")
         db.session.rollback()
 
+def delete_in_chunks(model, *criteria, chunk_size=1000, before_delete=None):
+    """Bulk-delete matching rows of a model or table, at most chunk_size per statement and transaction.
+
+    before_delete(chunk_ids), if given, runs in each chunk's transaction just
+    before its rows are deleted.
+
+    Returns:
+        int: Number of rows deleted
+    """
+    primary_key = next(iter(db.inspect(model).primary_key))
+    total = 0
+    while True:
+        chunk_ids = db.select(primary_key).where(*criteria).limit(chunk_size).scalar_subquery()
+        if before_delete is not None:
+            # Fix the chunk so the callback sees exactly the rows about to be deleted
+            chunk_ids = db.session.execute(db.select(primary_key).where(*criteria).limit(chunk_size)).scalars().all()
+            before_delete(chunk_ids)
+        result = db.session.execute(
+            db.delete(model).where(primary_key.in_(chunk_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        total += result.rowcount
+        if result.rowcount < chunk_size:
+            return total
+
+def update_in_chunks(model, values, *criteria, chunk_size=1000):
+    """Bulk-update matching rows, at most chunk_size per statement and transaction.
+
+    The values must make the rows stop matching the criteria, otherwise this never ends.
+
+    Returns:
+        int: Number of rows updated
+    """
+    total = 0
+    while True:
+        chunk_ids = db.select(model.id).where(*criteria).limit(chunk_size).scalar_subquery()
+        result = db.session.execute(
+            db.update(model).where(model.id.in_(chunk_ids)).values(**values),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        total += result.rowcount
+        if result.rowcount < chunk_size:
+            return total
+
+def archive_in_chunks(model, archive_table, *criteria, chunk_size=1000, before_delete=None):
+    """Move matching rows into an archive table with the same columns plus archived_at.
+
+    Each chunk is copied with INSERT ... SELECT and deleted from the hot table
+    in the same transaction, so a row is never in both tables or neither.
+    before_delete(chunk_ids), if given, runs in that transaction just before
+    the delete.
+
+    Returns:
+        int: Number of rows moved
+    """
+    source = model.__table__
+    column_names = [column.name for column in source.columns]
+    total = 0
+    while True:
+        chunk_ids = db.session.execute(
+            db.select(source.c.id).where(*criteria).order_by(source.c.id).limit(chunk_size)
+        ).scalars().all()
+        if not chunk_ids:
+            return total
+
+        try:
+            db.session.execute(archive_table.insert().from_select(
+                column_names + ['archived_at'],
+                db.select(*source.columns, db.literal(datetime.utcnow(), db.DateTime))
+                  .where(source.c.id.in_(chunk_ids))
+            ))
+            if before_delete is not None:
+                before_delete(chunk_ids)
+            db.session.execute(source.delete().where(source.c.id.in_(chunk_ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        total += len(chunk_ids)
+        if len(chunk_ids) < chunk_size:
+            return total
+
+def ensure_maintenance_indexes():
+    """Indexes behind the maintenance jobs and notification queries, for tables created before they were declared"""
+    try:
+        db.session.execute(db.text("CREATE INDEX IF NOT EXISTS ix_otps_expires_at ON otps (expires_at)"))
+        db.session.execute(db.text("CREATE INDEX IF NOT EXISTS ix_customer_auth_token_expires_at ON customer_auth (token_expires_at)"))
+        db.session.execute(db.text("CREATE INDEX IF NOT EXISTS ix_notifications_read_at ON notifications (read_at)"))
+        db.session.execute(db.text("CREATE INDEX IF NOT EXISTS ix_notifications_customer_read_created "
+                                   "ON notifications (customer_id, is_read, created_at)"))
+        db.session.execute(db.text("CREATE INDEX IF NOT EXISTS ix_notifications_customer_created "
+                                   "ON notifications (customer_id, created_at)"))
+        db.session.execute(db.text("CREATE INDEX IF NOT EXISTS ix_notifications_appointment_id ON notifications (appointment_id)"))
+        db.session.commit()
+    except Exception as e:
+        print(f"Maintenance index migration error: {e}")
+        db.session.rollback()
+
 def reset_database():
     """Reset the database - useful for development"""
     db.drop_all()
@@ -5,6 +5,12 @@ from .service_db import Service
 from .appointment_db import Appointment, AppointmentStatus, AppointmentType
 from .otp import OTP
 from .notification import Notification, NotificationType
+from .notification_counter import NotificationCounter
+from .sms_outbox import SmsOutbox, SmsStatus
+from .domain_event import DomainEvent, DomainEventStatus
+from .pincode_cache import PincodeCache
+from .maintenance_lease import MaintenanceLease
+from .archive import appointments_archive, notifications_archive
 
 # Export for easier imports
-__all__ = ['Customer', 'CustomerAuth', 'Service', 'Appointment', 'AppointmentStatus', 'AppointmentType', 'OTP', 'Notification', 'NotificationType']
\ No newline at end of file
+__all__ = ['Customer', 'CustomerAuth', 'Service', 'Appointment', 'AppointmentStatus', 'AppointmentType', 'OTP', 'Notification', 'NotificationType', 'NotificationCounter', 'SmsOutbox', 'SmsStatus', 'DomainEvent', 'DomainEventStatus', 'PincodeCache', 'MaintenanceLease', 'appointments_archive', 'notifications_archive']
\ No newline at end of file
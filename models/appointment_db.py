@@ -42,6 +42,9 @@ class Appointment(db.Model):
     customer = db.relationship('Customer', back_populates='appointments')
     service = db.relationship('Service', back_populates='appointments')
 
+    # True on instances loaded from appointments_archive
+    is_archived = False
+
     @property
     def appointment_datetime(self) -> datetime:
         """Get appointment as datetime object"""
@@ -70,20 +73,49 @@ class Appointment(db.Model):
             'cancelled_at': self.cancelled_at.isoformat() if self.cancelled_at else None
         }
 
+    def record_status_change(self, previous_status, reason: str = ""):
+        """
+        Add an appointment.status_changed event to the domain event outbox,
+        snapshotting what the customer will be told. Does not commit.
+        """
+        from models.domain_event import DomainEvent
+        return DomainEvent.record(
+            'appointment.status_changed',
+            self.id,
+            customer_id=self.customer_id,
+            previous_status=previous_status.value if previous_status else None,
+            status=self.status.value,
+            service_id=self.service_id,
+            appointment_date=self.appointment_date.isoformat(),
+            appointment_time=self.appointment_time.isoformat(),
+            reason=reason
+        )
+
+    def _commit_transition(self, previous_status, reason: str = ""):
+        """Commit a status transition together with its event, then wake the dispatcher"""
+        self.record_status_change(previous_status, reason)
+        db.session.commit()
+
+        from services.domain_event_service import DomainEventService
+        DomainEventService.notify_dispatcher()
+
     def confirm(self):
         """Confirm the appointment"""
+        previous_status = self.status
         self.status = AppointmentStatus.CONFIRMED
         self.updated_at = datetime.utcnow()
-        db.session.commit()
+        self._commit_transition(previous_status)
 
     def start_service(self):
         """Mark appointment as in progress"""
+        previous_status = self.status
         self.status = AppointmentStatus.IN_PROGRESS
         self.updated_at = datetime.utcnow()
-        db.session.commit()
+        self._commit_transition(previous_status)
 
     def complete(self, actual_cost: str = "", technician_notes: str = ""):
         """Complete the appointment"""
+        previous_status = self.status
         self.status = AppointmentStatus.COMPLETED
         self.completed_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
@@ -91,31 +123,48 @@ class Appointment(db.Model):
             self.actual_cost = actual_cost
         if technician_notes:
             self.technician_notes = technician_notes
-        db.session.commit()
+        self._commit_transition(previous_status)
 
     def cancel(self, reason: str = ""):
         """Cancel the appointment"""
+        previous_status = self.status
         self.status = AppointmentStatus.CANCELLED
         self.cancelled_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
         if reason:
             self.technician_notes = f"Cancelled: {reason}"
-        db.session.commit()
+        self._commit_transition(previous_status, reason)
 
     def reschedule(self, new_date: date, new_time: time, reason: str = ""):
         """Reschedule the appointment"""
+        previous_status = self.status
         self.appointment_date = new_date
         self.appointment_time = new_time
         self.status = AppointmentStatus.RESCHEDULED
         self.updated_at = datetime.utcnow()
         if reason:
             self.technician_notes = f"Rescheduled: {reason}"
-        db.session.commit()
+        self._commit_transition(previous_status, reason)
+
+    @classmethod
+    def get_by_customer(cls, customer_id: int, include_archived: bool = False):
+        """Get appointments by customer ID, optionally including archived ones (read-only)"""
+        appointments = cls.query.filter_by(customer_id=customer_id).all()
+        if include_archived:
+            from models.archive import appointments_archive, load_archived
+            appointments += load_archived(cls, appointments_archive.c.customer_id == customer_id,
+                                          order_by=(appointments_archive.c.id,))
+        return appointments
 
     @classmethod
-    def get_by_customer(cls, customer_id: int):
-        """Get appointments by customer ID"""
-        return cls.query.filter_by(customer_id=customer_id).all()
+    def find(cls, appointment_id: int, include_archived: bool = False):
+        """Get an appointment by ID, falling back to the archive (read-only) if asked"""
+        appointment = db.session.get(cls, appointment_id)
+        if appointment is None and include_archived:
+            from models.archive import appointments_archive, load_archived
+            archived = load_archived(cls, appointments_archive.c.id == appointment_id)
+            appointment = archived[0] if archived else None
+        return appointment
 
     @classmethod
     def get_by_service(cls, service_id: int):
@@ -210,35 +259,51 @@ class Appointment(db.Model):
         return available_slots
 
     @classmethod
-    def get_statistics(cls):
-        """Get appointment statistics"""
-        total = cls.query.count()
-        if total == 0:
-            return {
-                'total': 0,
-                'pending': 0,
-                'confirmed': 0,
-                'completed': 0,
-                'cancelled': 0,
-                'completion_rate': 0.0
-            }
-
-        status_counts = {}
-        for status in AppointmentStatus:
-            status_counts[status.value] = cls.query.filter_by(status=status).count()
-
-        completed = status_counts.get('completed', 0)
+    def get_statistics(cls, include_archived: bool = False):
+        """Get appointment statistics, by default over the hot table only"""
+        status_counts = {status.value: 0 for status in AppointmentStatus}
+        counts = db.session.query(cls.status, db.func.count(cls.id)).group_by(cls.status).all()
+        if include_archived:
+            from models.archive import appointments_archive
+            counts += db.session.query(appointments_archive.c.status, db.func.count(appointments_archive.c.id))\
+                                .group_by(appointments_archive.c.status).all()
+        for status, count in counts:
+            if status is not None:
+                status_counts[status.value] += count
+
+        total = sum(status_counts.values())
+        completed = status_counts['completed']
         completion_rate = (completed / total) * 100 if total > 0 else 0
 
         return {
             'total': total,
-            'pending': status_counts.get('pending', 0),
-            'confirmed': status_counts.get('confirmed', 0),
+            'pending': status_counts['pending'],
+            'confirmed': status_counts['confirmed'],
             'completed': completed,
-            'cancelled': status_counts.get('cancelled', 0),
+            'cancelled': status_counts['cancelled'],
             'completion_rate': round(completion_rate, 2)
         }
 
+    @classmethod
+    def archive_finished_before(cls, cutoff: datetime, chunk_size: int = 1000):
+        """
+        Move completed and cancelled appointments last updated before the
+        cutoff to appointments_archive. Appointments still referenced by a
+        hot notification stay until that notification is archived.
+        """
+        from database import archive_in_chunks
+        from models.archive import appointments_archive
+        from models.notification import Notification
+        return archive_in_chunks(
+            cls, appointments_archive,
+            cls.status.in_([AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED]),
+            cls.updated_at < cutoff,
+            ~db.select(Notification.id).where(Notification.appointment_id == cls.id).exists(),
+            # Never move the newest row: SQLite would hand its id out again
+            cls.id < db.select(db.func.max(cls.id)).scalar_subquery(),
+            chunk_size=chunk_size
+        )
+
     def __str__(self) -> str:
         return f"Appointment(id={self.id}, customer_id={self.customer_id}, date={self.appointment_date}, status={self.status.value})"
 
@@ -0,0 +1,46 @@
+from database import db
+from sqlalchemy import Column, DateTime
+from models.appointment_db import Appointment
+from models.notification import Notification
+
+
+def _archive_table(model, name, *indexes):
+    """A table with the model's columns plus archived_at, without foreign keys or defaults"""
+    columns = [Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+               for column in model.__table__.columns]
+    return db.Table(name, db.metadata, *columns, Column('archived_at', DateTime, nullable=False), *indexes)
+
+
+# Cold tier: rows moved out of the hot tables by ArchiveService, keeping their ids
+appointments_archive = _archive_table(
+    Appointment, 'appointments_archive',
+    db.Index('ix_appointments_archive_customer_id', 'customer_id')
+)
+notifications_archive = _archive_table(
+    Notification, 'notifications_archive',
+    db.Index('ix_notifications_archive_customer_created', 'customer_id', 'created_at'),
+    db.Index('ix_notifications_archive_read_at', 'read_at')
+)
+
+ARCHIVE_TABLES = {
+    Appointment: appointments_archive,
+    Notification: notifications_archive
+}
+
+
+def load_archived(model, *criteria, order_by=(), limit=None):
+    """
+    Load archived rows of a model as detached, read-only instances with
+    is_archived set, so callers can treat them like hot rows. Relationships
+    are not loaded on them.
+    """
+    table = ARCHIVE_TABLES[model]
+    columns = [table.c[column.name] for column in model.__table__.columns]
+    query = db.select(*columns).where(*criteria).order_by(*order_by).limit(limit)
+
+    instances = []
+    for row in db.session.execute(query):
+        instance = model(**row._mapping)
+        instance.is_archived = True
+        instances.append(instance)
+    return instances
@@ -1,11 +1,15 @@
 from database import db
 from datetime import datetime, timedelta
 from sqlalchemy import String, DateTime, Boolean, ForeignKey, Integer
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from typing import Optional
+from typing import Optional, Tuple
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 import secrets
 import string
 
+SIGNED_TOKEN_SALT = 'customer-auth-token'
+
 
 class CustomerAuth(db.Model):
     """Authentication model for customers - separate from main Customer table"""
@@ -17,8 +21,9 @@ class CustomerAuth(db.Model):
     # Authentication fields
     auth_key: Mapped[str] = mapped_column(String(16), unique=True, nullable=False, index=True)
     auth_token: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
-    token_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    token_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    token_epoch: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Bumped to revoke signed tokens
     last_login: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -37,6 +42,17 @@ class CustomerAuth(db.Model):
             if not CustomerAuth.query.filter_by(auth_key=auth_key).first():
                 return auth_key
 
+    @staticmethod
+    def generate_auth_key_batch(count: int) -> list:
+        """Generate `count` distinct 16-digit keys without checking the database.
+
+        Collisions with existing keys are caught by the unique index on insert.
+        """
+        keys = set()
+        while len(keys) < count:
+            keys.add(f'{secrets.randbelow(10 ** 16):016d}')
+        return list(keys)
+
     @staticmethod
     def generate_auth_token() -> str:
         """Generate a secure authentication token"""
@@ -44,11 +60,42 @@ class CustomerAuth(db.Model):
 
     def create_auth_token(self, hours_valid: int = 24 * 30) -> str:
         """Create and store a new authentication token"""
+        from services.auth_service import token_cache
+        token_cache.invalidate(self.auth_token)
+
         self.auth_token = self.generate_auth_token()
         self.token_expires_at = datetime.utcnow() + timedelta(hours=hours_valid)
         self.last_login = datetime.utcnow()
         return self.auth_token
 
+    def create_signed_auth_token(self, secret_key: str, hours_valid: int = 24 * 30) -> str:
+        """Create a stateless signed token carrying customer_id, issue time and revocation epoch"""
+        serializer = URLSafeTimedSerializer(secret_key, salt=SIGNED_TOKEN_SALT)
+        self.token_expires_at = datetime.utcnow() + timedelta(hours=hours_valid)
+        self.last_login = datetime.utcnow()
+        return serializer.dumps({'cid': self.customer_id, 'ep': self.token_epoch or 0})
+
+    @staticmethod
+    def is_signed_token(token: str) -> bool:
+        """Signed tokens contain '.' separators, opaque url-safe tokens never do"""
+        return bool(token) and '.' in token
+
+    @staticmethod
+    def load_signed_auth_token(token: str, secret_key: str, max_age_seconds: int) -> Optional[Tuple[int, int]]:
+        """
+        Verify a signed token's signature and age without touching the database.
+        Returns (customer_id, token_epoch) or None if the token is invalid or expired.
+        """
+        serializer = URLSafeTimedSerializer(secret_key, salt=SIGNED_TOKEN_SALT)
+        try:
+            claims = serializer.loads(token, max_age=max_age_seconds)
+        except (BadSignature, SignatureExpired):
+            return None
+
+        if not isinstance(claims, dict) or 'cid' not in claims or 'ep' not in claims:
+            return None
+        return int(claims['cid']), int(claims['ep'])
+
     def is_token_valid(self) -> bool:
         """Check if the current token is valid and not expired"""
         if not self.auth_token or not self.token_expires_at:
@@ -57,8 +104,27 @@ class CustomerAuth(db.Model):
 
     def revoke_token(self):
         """Revoke the current authentication token"""
+        from services.auth_service import token_cache
+        token_cache.invalidate(self.auth_token)
+
         self.auth_token = None
         self.token_expires_at = None
+        self.revoke_signed_tokens()
+
+    def revoke_signed_tokens(self):
+        """Invalidate every signed token issued so far by bumping the revocation epoch"""
+        self.token_epoch = CustomerAuth.token_epoch + 1
+
+    @classmethod
+    def clear_expired_tokens(cls, chunk_size: int = 1000) -> int:
+        """Clear expired opaque tokens in chunked bulk UPDATEs. Returns the number cleared"""
+        from database import update_in_chunks
+        return update_in_chunks(
+            cls,
+            {'auth_token': None, 'token_expires_at': None},
+            cls.token_expires_at < datetime.utcnow(),
+            chunk_size=chunk_size
+        )
 
     @classmethod
     def get_or_create_for_customer(cls, customer_id: int):
@@ -75,6 +141,81 @@ class CustomerAuth(db.Model):
 
         return auth_record
 
+    @classmethod
+    def _customers_without_auth_query(cls):
+        """Query of customer IDs that have no authentication record"""
+        from models.customer_db import Customer
+        return db.session.query(Customer.id)\
+                         .outerjoin(cls, cls.customer_id == Customer.id)\
+                         .filter(cls.id.is_(None))
+
+    @classmethod
+    def has_customers_without_auth(cls) -> bool:
+        """Cheap EXISTS check for customers missing an authentication record"""
+        return db.session.query(cls._customers_without_auth_query().exists()).scalar()
+
+    @classmethod
+    def backfill_missing(cls, chunk_size: int = 500, max_retries: int = 5, progress=None) -> int:
+        """
+        Create authentication records for every customer that lacks one.
+
+        Works through missing customers in primary-key order, generating a batch
+        of keys per chunk and inserting the chunk with a single executemany INSERT
+        and one commit. A chunk that hits a unique constraint (key collision or a
+        concurrent backfill) is rolled back and retried with fresh keys.
+
+        Args:
+            chunk_size: Number of customers per INSERT/commit
+            max_retries: Attempts per chunk before giving up
+            progress: Optional callable(created, total) invoked after each chunk
+
+        Returns:
+            int: Number of auth records created
+        """
+        from models.customer_db import Customer
+
+        total = cls._customers_without_auth_query().count()
+        created = 0
+        last_id = 0
+        retries = 0
+
+        while True:
+            customer_ids = [row.id for row in cls._customers_without_auth_query()
+                                                 .filter(Customer.id > last_id)
+                                                 .order_by(Customer.id)
+                                                 .limit(chunk_size)]
+            if not customer_ids:
+                break
+
+            now = datetime.utcnow()
+            keys = cls.generate_auth_key_batch(len(customer_ids))
+            rows = [{
+                'customer_id': customer_id,
+                'auth_key': auth_key,
+                'is_active': True,
+                'token_epoch': 0,
+                'created_at': now,
+                'updated_at': now
+            } for customer_id, auth_key in zip(customer_ids, keys)]
+
+            try:
+                db.session.execute(cls.__table__.insert(), rows)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                retries += 1
+                if retries > max_retries:
+                    raise
+                continue
+
+            retries = 0
+            created += len(rows)
+            last_id = customer_ids[-1]
+            if progress:
+                progress(created, total)
+
+        return created
+
     @classmethod
     def get_by_auth_key(cls, auth_key: str):
         """Get authentication record by auth key"""
@@ -1,23 +1,55 @@
 from database import db
 from datetime import datetime
-from sqlalchemy import String, Text, DateTime
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Text, DateTime, table, column, literal_column
+from sqlalchemy.orm import Mapped, mapped_column, validates
 from typing import List
+import re
+from utils.normalization import normalize_phone_number, normalize_email
 
 class Customer(db.Model):
     __tablename__ = 'customers'
+    __table_args__ = (
+        # One customer per canonical phone - the conflict target of Customer.upsert
+        db.Index('uq_customers_phone_normalized', 'phone_normalized', unique=True),
+    )
+
+    # Whether the database can run INSERT ... ON CONFLICT upserts (checked lazily)
+    _upsert_supported = None
+
+    # Whether the customers_fts full-text index exists (checked lazily)
+    _search_index_available = None
+
+    # Whether the customers_phone_fts trigram index exists (checked lazily)
+    _phone_index_available = None
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     email: Mapped[str] = mapped_column(String(120), nullable=True, index=True)
     phone: Mapped[str] = mapped_column(String(20), nullable=False, index=True)
     address: Mapped[str] = mapped_column(Text, nullable=True)
+
+    # Canonical identity columns - kept in sync with phone/email by the validators below
+    phone_normalized: Mapped[str] = mapped_column(String(20), nullable=True)
+    email_normalized: Mapped[str] = mapped_column(String(120), nullable=True, index=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationship with appointments - using string reference
     appointments = db.relationship('Appointment', back_populates='customer', cascade='all, delete-orphan')
 
+    @validates('phone')
+    def _sync_phone_normalized(self, key, phone):
+        """Keep the canonical phone column in sync on every write"""
+        self.phone_normalized = normalize_phone_number(phone) or None
+        return phone
+
+    @validates('email')
+    def _sync_email_normalized(self, key, email):
+        """Keep the canonical email column in sync on every write"""
+        self.email_normalized = normalize_email(email) or None
+        return email
+
     def to_dict(self) -> dict:
         """Convert customer to dictionary representation"""
         return {
@@ -32,87 +64,212 @@ class Customer(db.Model):
 
     @classmethod
     def get_by_email(cls, email: str):
-        """Get customer by email"""
-        return cls.query.filter_by(email=email).first()
+        """Get customer by email (case-insensitive, uses the canonical email index)"""
+        email_normalized = normalize_email(email)
+        if not email_normalized:
+            return None
+        return cls.query.filter_by(email_normalized=email_normalized).order_by(cls.id).first()
 
     @classmethod
     def get_by_phone(cls, phone: str):
-        """Get customer by phone number"""
-        # Clean phone number for comparison
-        clean_phone = ''.join(filter(str.isdigit, phone))
-        customers = cls.query.all()
-
-        for customer in customers:
-            customer_clean_phone = ''.join(filter(str.isdigit, customer.phone))
-            if customer_clean_phone == clean_phone:
-                return customer
-
-        return None
+        """Get customer by phone number (uses the canonical phone index)"""
+        phone_normalized = normalize_phone_number(phone)
+        if not phone_normalized:
+            return None
+        return cls.query.filter_by(phone_normalized=phone_normalized).order_by(cls.id).first()
 
     @classmethod
     def get_all_by_phone(cls, phone: str):
         """Get all customers with the same phone number"""
-        # Clean phone number for comparison
-        clean_phone = ''.join(filter(str.isdigit, phone))
-        customers = cls.query.all()
-
-        matching_customers = []
-        for customer in customers:
-            customer_clean_phone = ''.join(filter(str.isdigit, customer.phone))
-            if customer_clean_phone == clean_phone:
-                matching_customers.append(customer)
-
-        return matching_customers
+        phone_normalized = normalize_phone_number(phone)
+        if not phone_normalized:
+            return []
+        return cls.query.filter_by(phone_normalized=phone_normalized).order_by(cls.id).all()
 
     @classmethod
     def search(cls, query: str):
         """Search customers by name, email, or phone"""
+        return cls.search_query(query).all()
+
+    @classmethod
+    def search_query(cls, query: str):
+        """
+        Build a query for customers matching a search term, best matches first.
+        Uses the customers_fts full-text index (prefix matching on every word)
+        when available and falls back to LIKE filters otherwise.
+
+        Phone-like input matches anywhere in the canonical digits, so the last
+        digits of a number find it too: three or more digits through the
+        customers_phone_fts trigram index, shorter input as a prefix of the
+        customers_fts phone column. Numbers starting with the digits rank
+        first, then by bm25.
+        """
+        digits = cls._phone_digits(query)
+        if digits:
+            if len(digits) >= 3 and cls.has_phone_search_index():
+                index, match = 'customers_phone_fts', f'"{digits}"'
+            elif len(digits) < 3 and cls.has_search_index():
+                index, match = 'customers_fts', f'phone_normalized : "{digits}"*'
+            else:
+                return cls.query.filter(cls.phone_normalized.like(f'%{digits}%')).order_by(cls.created_at.desc())
+
+            return cls._fts_query(index, match).order_by(
+                cls.phone_normalized.like(f'{digits}%').desc(),
+                literal_column(f'{index}.rank')
+            )
+
+        match = cls._build_fts_match(query)
+        if match and cls.has_search_index():
+            return cls._fts_query('customers_fts', match).order_by(literal_column('customers_fts.rank'))
+
         return cls.query.filter(
             db.or_(
                 cls.name.ilike(f'%{query}%'),
                 cls.email.ilike(f'%{query}%'),
                 cls.phone.ilike(f'%{query}%')
             )
-        ).all()
+        ).order_by(cls.created_at.desc())
 
     @classmethod
-    def get_or_create(cls, name: str, email: str, phone: str, address: str = ""):
-        """Get existing customer or create new one. Returns (customer, created)"""
-        # Try to find existing customer by email or phone
-        existing = None
-        if email:
-            existing = cls.get_by_email(email)
-        if not existing:
-            existing = cls.get_by_phone(phone)
+    def _fts_query(cls, index: str, match: str):
+        """Customers whose row in the given FTS5 index matches"""
+        fts = table(index, column('rowid'), column('rank'))
+        return cls.query.join(fts, fts.c.rowid == cls.id)\
+                        .filter(literal_column(index).op('MATCH')(match))
+
+    @staticmethod
+    def _phone_digits(query: str) -> str:
+        """Canonical digits of phone-like input ("+91 98765-43210"), or '' for anything else"""
+        query = (query or '').strip()
+        if not re.fullmatch(r'[\d\s()+\-]+', query):
+            return ''
+        digits = re.sub(r'\D', '', query)
+        return digits[2:] if query.startswith('+91') else normalize_phone_number(digits)
+
+    @staticmethod
+    def _build_fts_match(query: str) -> str:
+        """Turn free text into a safe FTS5 prefix query"""
+        terms = re.findall(r'\w+', query or '')
+        return ' AND '.join(f'"{term}"*' for term in terms)
+
+    @classmethod
+    def has_search_index(cls) -> bool:
+        """Check once per process whether the customers_fts index exists"""
+        if cls._search_index_available is None:
+            bind = db.session.get_bind()
+            cls._search_index_available = bind.dialect.name == 'sqlite' and db.inspect(bind).has_table('customers_fts')
+        return cls._search_index_available
+
+    @classmethod
+    def has_phone_search_index(cls) -> bool:
+        """Check once per process whether the customers_phone_fts index exists"""
+        if cls._phone_index_available is None:
+            bind = db.session.get_bind()
+            cls._phone_index_available = bind.dialect.name == 'sqlite' and db.inspect(bind).has_table('customers_phone_fts')
+        return cls._phone_index_available
+
+    @classmethod
+    def reset_search_support(cls):
+        """Forget the cached search index checks (after schema changes)"""
+        cls._search_index_available = None
+        cls._phone_index_available = None
+
+    @classmethod
+    def supports_upsert(cls) -> bool:
+        """Check once per process whether atomic upserts keyed on the canonical phone are available"""
+        if cls._upsert_supported is None:
+            bind = db.session.get_bind()
+            indexes = db.inspect(bind).get_indexes(cls.__tablename__)
+            cls._upsert_supported = bind.dialect.name in ('sqlite', 'postgresql') and any(
+                index['unique'] and index['column_names'] == ['phone_normalized'] for index in indexes
+            )
+        return cls._upsert_supported
+
+    @classmethod
+    def reset_upsert_support(cls):
+        """Forget the cached upsert capability check (after schema changes)"""
+        cls._upsert_supported = None
+
+    @classmethod
+    def upsert(cls, name: str, email: str, phone: str, address: str = ""):
+        """
+        Insert a customer or update the one sharing the canonical phone, in a
+        single INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement.
+        Empty name, email or address never overwrite stored values.
+        Does not commit; the caller commits together with its own changes.
+        Returns (customer, created)
+        """
+        if not cls.supports_upsert():
+            return cls._upsert_fallback(name, email, phone, address)
+
+        if db.session.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        now = datetime.utcnow()
+        stmt = insert(cls).values(
+            name=name or "",
+            email=email,
+            phone=phone,
+            address=address,
+            phone_normalized=normalize_phone_number(phone) or None,
+            email_normalized=normalize_email(email) or None,
+            created_at=now,
+            updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.phone_normalized],
+            set_={
+                'name': db.func.coalesce(db.func.nullif(stmt.excluded.name, ''), cls.name),
+                'email': db.func.coalesce(db.func.nullif(stmt.excluded.email, ''), cls.email),
+                'email_normalized': db.func.coalesce(stmt.excluded.email_normalized, cls.email_normalized),
+                'address': db.func.coalesce(db.func.nullif(stmt.excluded.address, ''), cls.address),
+                'phone': stmt.excluded.phone,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+
+        customer = db.session.scalars(
+            stmt.returning(cls),
+            execution_options={'populate_existing': True}
+        ).one()
+
+        # Only a freshly inserted row carries the created_at we just sent
+        return customer, customer.created_at == now
+
+    @classmethod
+    def _upsert_fallback(cls, name: str, email: str, phone: str, address: str = ""):
+        """Lookup-then-write upsert for databases without the unique phone index"""
+        existing = cls.get_by_phone(phone)
 
         if existing:
-            # Update existing customer info if provided
-            if existing.name != name:
+            if name:
                 existing.name = name
-            if existing.address != address and address:
-                existing.address = address
-            if email and existing.email != email:
+            if email:
                 existing.email = email
-            if existing.phone != phone:
-                existing.phone = phone
+            if address:
+                existing.address = address
+            existing.phone = phone
             existing.updated_at = datetime.utcnow()
+            db.session.flush()
+            return existing, False
 
-            try:
-                db.session.commit()
-                return existing, False
-            except Exception:
-                db.session.rollback()
-                return existing, False
-        else:
-            # Create new customer
-            new_customer = cls(name=name, email=email, phone=phone, address=address)
-            db.session.add(new_customer)
-            try:
-                db.session.commit()
-                return new_customer, True
-            except Exception:
-                db.session.rollback()
-                raise
+        new_customer = cls(name=name or "", email=email, phone=phone, address=address)
+        db.session.add(new_customer)
+        db.session.flush()
+        return new_customer, True
+
+    @classmethod
+    def get_or_create(cls, name: str, email: str, phone: str, address: str = ""):
+        """Get existing customer or create new one. Returns (customer, created)"""
+        try:
+            customer, created = cls.upsert(name=name, email=email, phone=phone, address=address)
+            db.session.commit()
+            return customer, created
+        except Exception:
+            db.session.rollback()
+            raise
 
     def __str__(self) -> str:
         return f"Customer(id={self.id}, name='{self.name}', email='{self.email}')"
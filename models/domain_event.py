@@ -0,0 +1,157 @@
+from database import db
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from enum import Enum
+import json
+import random
+import uuid
+
+class DomainEventStatus(Enum):
+    PENDING = "pending"
+    DISPATCHING = "dispatching"
+    DISPATCHED = "dispatched"
+    DEAD = "dead"
+
+class DomainEvent(db.Model):
+    """Domain events written in the same transaction as the change they describe.
+
+    The domain event dispatcher turns them into notifications, SSE pushes and
+    SMS after the change has committed, so a rolled-back change never reaches
+    a customer.
+    """
+    __tablename__ = 'domain_events'
+    __table_args__ = (
+        db.Index('ix_domain_events_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String(50), nullable=False)  # e.g. "appointment.status_changed"
+    aggregate_id = Column(Integer, nullable=False)  # Id of the changed record
+    customer_id = Column(Integer, nullable=True)
+    payload = Column(Text, nullable=False, default='{}')  # JSON snapshot taken at the time of the change
+
+    # Dispatch state
+    status = Column(String(20), nullable=False, default=DomainEventStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = Column(String(36), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String(500), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    dispatched_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<DomainEvent {self.id}: {self.event_type} {self.status}>'
+
+    @property
+    def data(self):
+        """The decoded payload"""
+        return json.loads(self.payload or '{}')
+
+    @classmethod
+    def record(cls, event_type, aggregate_id, customer_id=None, max_attempts=5, **payload):
+        """Add an event to the outbox. Does not commit, so it lands atomically with the caller's writes."""
+        event = cls(
+            event_type=event_type,
+            aggregate_id=aggregate_id,
+            customer_id=customer_id,
+            payload=json.dumps(payload, default=str),
+            status=DomainEventStatus.PENDING.value,
+            attempts=0,
+            max_attempts=max_attempts,
+            next_attempt_at=datetime.utcnow()
+        )
+        db.session.add(event)
+        return event
+
+    @classmethod
+    def claim_batch(cls, limit=50, lease_seconds=60):
+        """
+        Atomically claim due events, oldest first. Events stuck in
+        'dispatching' past their lease (e.g. the dispatcher died) are claimed
+        again.
+
+        Returns:
+            list: Claimed events, detached from the session
+        """
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+
+        due_ids = db.select(cls.id).where(
+            db.or_(
+                db.and_(cls.status == DomainEventStatus.PENDING.value, cls.next_attempt_at <= now),
+                db.and_(cls.status == DomainEventStatus.DISPATCHING.value, cls.locked_until < now)
+            )
+        ).order_by(cls.id).limit(limit).scalar_subquery()
+
+        db.session.execute(
+            db.update(cls).where(cls.id.in_(due_ids)).values(
+                status=DomainEventStatus.DISPATCHING.value,
+                claim_token=token,
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=cls.attempts + 1
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+        events = cls.query.filter(cls.claim_token == token).order_by(cls.id).all()
+        for event in events:
+            db.session.expunge(event)
+        return events
+
+    @classmethod
+    def mark_dispatched(cls, event_id, claim_token):
+        """
+        Record a dispatched event. Does not commit, so the event's side effects
+        and its new state commit together.
+
+        Returns:
+            bool: False if the claim was lost to another dispatcher
+        """
+        result = db.session.execute(
+            db.update(cls).where(cls.id == event_id, cls.claim_token == claim_token).values(
+                status=DomainEventStatus.DISPATCHED.value,
+                dispatched_at=datetime.utcnow(),
+                claim_token=None,
+                locked_until=None,
+                last_error=None
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        return result.rowcount == 1
+
+    @classmethod
+    def mark_failed(cls, event, error, base_backoff_seconds=5, max_backoff_seconds=600):
+        """Schedule a failed event for retry with exponential backoff and jitter, or dead-letter it"""
+        values = {'claim_token': None, 'locked_until': None, 'last_error': (error or '')[:500]}
+        if event.attempts >= event.max_attempts:
+            values['status'] = DomainEventStatus.DEAD.value
+        else:
+            backoff = min(max_backoff_seconds, base_backoff_seconds * 2 ** (event.attempts - 1))
+            values['status'] = DomainEventStatus.PENDING.value
+            values['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=backoff * random.uniform(0.5, 1.0))
+        db.session.execute(
+            db.update(cls).where(cls.id == event.id, cls.claim_token == event.claim_token).values(**values),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+    @classmethod
+    def purge_finished_before(cls, cutoff, chunk_size=1000):
+        """Delete dispatched and dead-lettered events created before the cutoff"""
+        from database import delete_in_chunks
+        return delete_in_chunks(
+            cls,
+            cls.status.in_([DomainEventStatus.DISPATCHED.value, DomainEventStatus.DEAD.value]),
+            cls.created_at < cutoff,
+            chunk_size=chunk_size
+        )
+
+    @classmethod
+    def get_status_counts(cls):
+        """Number of events in each dispatch state"""
+        rows = db.session.query(cls.status, db.func.count(cls.id)).group_by(cls.status).all()
+        return {status.value: 0 for status in DomainEventStatus} | dict(rows)
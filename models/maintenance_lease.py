@@ -0,0 +1,48 @@
+from database import db
+from datetime import datetime, timedelta
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.exc import IntegrityError
+import uuid
+
+class MaintenanceLease(db.Model):
+    """One row per maintenance job, claimed by the process that runs it.
+
+    Every app process runs a maintenance scheduler, so a job only runs where
+    its lease could be taken: once per interval across all processes sharing
+    the database.
+    """
+    __tablename__ = 'maintenance_leases'
+
+    job_name = Column(String(50), primary_key=True)
+    owner = Column(String(36), nullable=False)
+    locked_until = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<MaintenanceLease {self.job_name} until {self.locked_until}>'
+
+    @classmethod
+    def try_acquire(cls, job_name, lease_seconds):
+        """
+        Claim a job for lease_seconds unless another process holds it. Commits.
+
+        Returns:
+            bool: True if this process may run the job now
+        """
+        now = datetime.utcnow()
+        values = {'owner': str(uuid.uuid4()), 'locked_until': now + timedelta(seconds=lease_seconds)}
+        result = db.session.execute(
+            db.update(cls).where(cls.job_name == job_name, cls.locked_until <= now).values(**values),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount == 1:
+            db.session.commit()
+            return True
+
+        # No expired lease: either the job was never run or another process holds it
+        try:
+            db.session.execute(db.insert(cls).values(job_name=job_name, **values))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
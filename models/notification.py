@@ -1,6 +1,7 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 from database import db
+from models.notification_counter import NotificationCounter
 from datetime import datetime
 from enum import Enum
 
@@ -15,10 +16,16 @@ class NotificationType(Enum):
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Serves the per-customer unread count and newest-first listing
+        db.Index('ix_notifications_customer_read_created', 'customer_id', 'is_read', 'created_at'),
+        # Keyset pagination of a customer's feed
+        db.Index('ix_notifications_customer_created', 'customer_id', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False)
-    appointment_id = Column(Integer, ForeignKey('appointments.id'), nullable=True)
+    appointment_id = Column(Integer, ForeignKey('appointments.id'), nullable=True, index=True)
 
     # Notification details
     notification_type = Column(String(50), nullable=False)
@@ -28,7 +35,7 @@ class Notification(db.Model):
     # Metadata
     is_read = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    read_at = Column(DateTime, nullable=True)
+    read_at = Column(DateTime, nullable=True, index=True)
 
     # Optional action
     action_text = Column(String(100), nullable=True)  # e.g., "View Appointment Details", "Book Now"
@@ -38,6 +45,9 @@ class Notification(db.Model):
     customer = relationship("Customer", backref="notifications")
     appointment = relationship("Appointment", backref="notifications")
 
+    # True on instances loaded from notifications_archive
+    is_archived = False
+
     def __repr__(self):
         return f'<Notification {self.id}: {self.title}>'
 
@@ -53,8 +63,7 @@ class Notification(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'read_at': self.read_at.isoformat() if self.read_at else None,
             'action_text': self.action_text,
-            'action_url': self.action_url,
-            'time_ago': self.get_time_ago()
+            'action_url': self.action_url
         }
 
     def get_time_ago(self):
@@ -91,14 +100,19 @@ class Notification(db.Model):
 
     def mark_as_read(self):
         """Mark notification as read"""
-        self.is_read = True
-        self.read_at = datetime.utcnow()
+        # Conditional so a concurrent mark-read can't decrement the counter twice
+        rows = Notification.query.filter_by(id=self.id, is_read=False)\
+                                 .update({'is_read': True, 'read_at': datetime.utcnow()})
+        NotificationCounter.adjust(self.customer_id, -rows)
         db.session.commit()
 
     @classmethod
     def create_notification(cls, customer_id, notification_type, title, message,
-                          appointment_id=None, action_text=None, action_url=None):
-        """Create a new notification"""
+                          appointment_id=None, action_text=None, action_url=None, commit=True):
+        """
+        Create a new notification and bump the customer's unread counter in the
+        same transaction. With commit=False the caller commits (the row is flushed).
+        """
         notification = cls(
             customer_id=customer_id,
             appointment_id=appointment_id,
@@ -109,24 +123,119 @@ class Notification(db.Model):
             action_url=action_url
         )
         db.session.add(notification)
-        db.session.commit()
+        NotificationCounter.adjust(customer_id, 1)
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
         return notification
 
     @classmethod
     def get_unread_count(cls, customer_id):
-        """Get count of unread notifications for a customer"""
-        return cls.query.filter_by(customer_id=customer_id, is_read=False).count()
+        """Get count of unread notifications for a customer from the denormalized counter"""
+        return NotificationCounter.get_unread_count(customer_id)
 
     @classmethod
-    def get_customer_notifications(cls, customer_id, limit=50):
-        """Get notifications for a customer, ordered by newest first"""
-        return cls.query.filter_by(customer_id=customer_id)\
-                       .order_by(cls.created_at.desc())\
-                       .limit(limit).all()
+    def get_customer_notifications(cls, customer_id, limit=50, before_id=None, since_id=None, include_archived=False):
+        """
+        Get notifications for a customer, ordered by newest first.
+
+        before_id pages to notifications older than that one, since_id to
+        the ones newer than it (the oldest `limit` of them). Both are keyset
+        cursors on (created_at, id), so a page costs the same at any depth.
+        include_archived also pages through notifications_archive; archived
+        notifications are returned as read-only instances.
+        """
+        from models.archive import notifications_archive, load_archived
+
+        tables = [cls.__table__] + ([notifications_archive] if include_archived else [])
+        cursor_id = before_id or since_id
+        newer = bool(since_id and not before_id)
+
+        cursor = None
+        if cursor_id:
+            for table in tables:
+                cursor = db.session.execute(
+                    db.select(table.c.created_at, table.c.id)
+                      .where(table.c.id == cursor_id, table.c.customer_id == customer_id)
+                ).first()
+                if cursor is not None:
+                    break
+
+        notifications = []
+        for table in tables:
+            criteria = [table.c.customer_id == customer_id]
+            if cursor is not None:
+                position = db.tuple_(table.c.created_at, table.c.id)
+                cursor_key = (cursor.created_at, cursor.id)
+                criteria.append(position > cursor_key if newer else position < cursor_key)
+            elif cursor_id:
+                # Cursor row was purged; ids follow creation order closely enough
+                criteria.append(table.c.id > cursor_id if newer else table.c.id < cursor_id)
+
+            if newer:
+                order_by = (table.c.created_at.asc(), table.c.id.asc())
+            else:
+                order_by = (table.c.created_at.desc(), table.c.id.desc())
+
+            if table is cls.__table__:
+                notifications.extend(cls.query.filter(*criteria).order_by(*order_by).limit(limit).all())
+            else:
+                notifications.extend(load_archived(cls, *criteria, order_by=order_by, limit=limit))
+
+        # Archived notifications are older than the hot ones, but merge in case they overlap
+        notifications.sort(key=lambda notification: (notification.created_at, notification.id), reverse=True)
+        return notifications[-limit:] if newer else notifications[:limit]
+
+    @classmethod
+    def get_feed_version(cls, customer_id):
+        """
+        Cheap validator for a customer's notification feed: changes whenever a
+        notification is created, read or removed.
+
+        Returns:
+            tuple: (version string, last modified datetime)
+        """
+        unread_count, updated_at = NotificationCounter.get_state(customer_id)
+        latest_id = db.session.query(db.func.max(cls.id)).filter(cls.customer_id == customer_id).scalar()
+        return f"{customer_id}.{latest_id or 0}.{unread_count}.{updated_at.timestamp():.6f}", updated_at
 
     @classmethod
     def mark_all_as_read(cls, customer_id):
         """Mark all notifications as read for a customer"""
-        cls.query.filter_by(customer_id=customer_id, is_read=False)\
-                 .update({'is_read': True, 'read_at': datetime.utcnow()})
-        db.session.commit()
\ No newline at end of file
+        rows = cls.query.filter_by(customer_id=customer_id, is_read=False)\
+                        .update({'is_read': True, 'read_at': datetime.utcnow()})
+        NotificationCounter.adjust(customer_id, -rows)
+        db.session.commit()
+        return rows
+
+    @classmethod
+    def purge_read_before(cls, cutoff, chunk_size=1000):
+        """
+        Delete notifications read before the cutoff, hot and archived, in
+        chunked bulk DELETEs. Each hot chunk also changes its customers' feed
+        versions.
+        """
+        from database import delete_in_chunks
+        from models.archive import notifications_archive
+        return delete_in_chunks(cls, cls.is_read == True, cls.read_at < cutoff, chunk_size=chunk_size,
+                                before_delete=NotificationCounter.touch_owners) + \
+            delete_in_chunks(notifications_archive, notifications_archive.c.read_at < cutoff, chunk_size=chunk_size)
+
+    @classmethod
+    def archive_read_before(cls, cutoff, chunk_size=1000):
+        """
+        Move notifications read before the cutoff to notifications_archive.
+        Unread notifications stay hot, so unread counts are unaffected, but
+        each chunk changes its customers' feed versions.
+        """
+        from database import archive_in_chunks
+        from models.archive import notifications_archive
+        return archive_in_chunks(
+            cls, notifications_archive,
+            cls.is_read == True, cls.read_at < cutoff,
+            # Never move the newest row: SQLite would hand its id out again
+            cls.id < db.select(db.func.max(cls.id)).scalar_subquery(),
+            chunk_size=chunk_size,
+            before_delete=NotificationCounter.touch_owners
+        )
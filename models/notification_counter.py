@@ -0,0 +1,142 @@
+from database import db
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy.exc import IntegrityError
+
+class NotificationCounter(db.Model):
+    """Denormalized unread notification count per customer.
+
+    Kept in step with the notifications table by Notification's write methods in
+    the same transaction. A missing row means "not counted yet": it is seeded
+    from a COUNT on first read, and the repair job recomputes drifted rows.
+    """
+    __tablename__ = 'notification_counters'
+
+    customer_id = Column(Integer, ForeignKey('customers.id', ondelete='CASCADE'), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NotificationCounter {self.customer_id}: {self.unread_count}>'
+
+    @classmethod
+    def adjust(cls, customer_id, delta):
+        """Add delta to a customer's counter if it has been seeded. Does not commit."""
+        cls.adjust_many((customer_id,), delta)
+
+    @classmethod
+    def adjust_many(cls, customer_ids, delta):
+        """Add delta to the seeded counters of many customers in one UPDATE. Does not commit."""
+        if not delta or not customer_ids:
+            return
+        db.session.execute(
+            db.update(cls)
+              .where(cls.customer_id.in_(customer_ids))
+              .values(unread_count=db.case((cls.unread_count + delta < 0, 0), else_=cls.unread_count + delta),
+                      updated_at=datetime.utcnow()),
+            execution_options={'synchronize_session': False}
+        )
+
+    @classmethod
+    def touch_owners(cls, notification_ids):
+        """
+        Bump updated_at for the customers owning these notifications, so their
+        feed version changes when the rows leave the hot table. Does not commit.
+        """
+        from models.notification import Notification
+        owners = db.select(Notification.customer_id).where(Notification.id.in_(notification_ids)).distinct()
+        db.session.execute(
+            db.update(cls).where(cls.customer_id.in_(owners)).values(updated_at=datetime.utcnow()),
+            execution_options={'synchronize_session': False}
+        )
+
+    @classmethod
+    def get_unread_count(cls, customer_id):
+        """Read the counter, seeding it from the notifications table on first use"""
+        return cls.get_state(customer_id)[0]
+
+    @classmethod
+    def get_unread_counts(cls, customer_ids):
+        """
+        Unread counts of many customers in at most two queries: the seeded
+        counters, then one grouped COUNT for customers not counted yet.
+        Does not seed the missing counters.
+        """
+        counts = dict(db.session.query(cls.customer_id, cls.unread_count).filter(cls.customer_id.in_(customer_ids)).all())
+        missing = [customer_id for customer_id in customer_ids if customer_id not in counts]
+        if missing:
+            from models.notification import Notification
+            counts.update(
+                db.session.query(Notification.customer_id, db.func.count(Notification.id))
+                          .filter(Notification.customer_id.in_(missing), Notification.is_read == False)
+                          .group_by(Notification.customer_id).all()
+            )
+        return {customer_id: counts.get(customer_id, 0) for customer_id in customer_ids}
+
+    @classmethod
+    def get_state(cls, customer_id):
+        """
+        Return (unread_count, updated_at), seeding the counter on first use.
+        updated_at changes whenever a notification is created or read.
+        """
+        row = db.session.query(cls.unread_count, cls.updated_at).filter(cls.customer_id == customer_id).first()
+        if row is not None:
+            return row.unread_count, row.updated_at
+
+        from models.notification import Notification
+        count = db.session.query(db.func.count(Notification.id))\
+                          .filter(Notification.customer_id == customer_id, Notification.is_read == False)\
+                          .scalar()
+        counter = cls(customer_id=customer_id, unread_count=count, updated_at=datetime.utcnow())
+        try:
+            db.session.add(counter)
+            db.session.commit()
+        except IntegrityError:
+            # Seeded concurrently by another request
+            db.session.rollback()
+            return cls.get_state(customer_id)
+        return count, counter.updated_at
+
+    @classmethod
+    def reset(cls, customer_ids):
+        """Drop counters so they are re-seeded on next read (after bulk re-pointing). Does not commit."""
+        db.session.execute(
+            db.delete(cls).where(cls.customer_id.in_(customer_ids)),
+            execution_options={'synchronize_session': False}
+        )
+
+    @classmethod
+    def repair(cls, chunk_size=1000):
+        """
+        Recompute counters that drifted from the notifications table, walking
+        the counters in primary-key chunks with one UPDATE each.
+
+        Returns:
+            int: Number of counters corrected
+        """
+        from models.notification import Notification
+        actual = db.select(db.func.count(Notification.id))\
+                   .where(Notification.customer_id == cls.customer_id, Notification.is_read == False)\
+                   .scalar_subquery()
+
+        repaired = 0
+        last_id = 0
+        while True:
+            upper = db.session.query(cls.customer_id)\
+                              .filter(cls.customer_id > last_id)\
+                              .order_by(cls.customer_id)\
+                              .offset(chunk_size - 1).limit(1).scalar()
+            criteria = [cls.customer_id > last_id, cls.unread_count != actual]
+            if upper is not None:
+                criteria.append(cls.customer_id <= upper)
+
+            result = db.session.execute(
+                db.update(cls).where(*criteria).values(unread_count=actual, updated_at=datetime.utcnow()),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.commit()
+            repaired += result.rowcount
+
+            if upper is None:
+                return repaired
+            last_id = upper
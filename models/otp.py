@@ -11,9 +11,10 @@ class OTP(db.Model):
     phone_number = Column(String(20), nullable=False, index=True)
     otp_code = Column(String(10), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     is_verified = Column(db.Boolean, default=False)
     attempts = Column(Integer, default=0)
+    last_sent_at = Column(DateTime, nullable=True)  # When the code was last queued for SMS
 
     def __init__(self, phone_number, otp_length=6, expiry_minutes=10):
         self.phone_number = phone_number
@@ -22,6 +23,7 @@ class OTP(db.Model):
         self.expires_at = self.created_at + timedelta(minutes=expiry_minutes)
         self.is_verified = False
         self.attempts = 0
+        self.last_sent_at = self.created_at
 
     @staticmethod
     def generate_otp(length=6):
@@ -29,7 +31,7 @@ class OTP(db.Model):
         return ''.join(random.choices(string.digits, k=length))
 
     @classmethod
-    def create_new_otp(cls, phone_number, otp_length=6, expiry_minutes=10):
+    def create_new_otp(cls, phone_number, otp_length=6, expiry_minutes=10, commit=True):
         """Create a new OTP for the given phone number"""
         # Delete any existing OTPs for this phone number
         cls.query.filter_by(phone_number=phone_number).delete()
@@ -37,48 +39,86 @@ class OTP(db.Model):
         # Create new OTP
         otp = cls(phone_number, otp_length, expiry_minutes)
         db.session.add(otp)
-        db.session.commit()
+        if commit:
+            db.session.commit()
         return otp
 
     @classmethod
-    def verify_otp(cls, phone_number, otp_code):
-        """Verify OTP for a phone number"""
-        otp_record = cls.query.filter_by(
-            phone_number=phone_number,
-            is_verified=False
-        ).first()
+    def reserve_send(cls, phone_number, coalesce_seconds, min_remaining_seconds, max_attempts=5):
+        """
+        Decide how to serve a send request from the current OTP. Claims the
+        resend with a conditional UPDATE of last_sent_at, so concurrent
+        requests (in any worker) cannot both resend. Does not commit.
 
-        if not otp_record:
-            return False, "OTP not found or already verified"
+        Returns:
+            tuple: ('reuse', otp_code) to resend the live code,
+                   ('coalesced', None) if it was sent within the window,
+                   ('new', None) if a new OTP must be issued
+        """
+        now = datetime.utcnow()
+        live = (cls.phone_number == phone_number,
+                cls.is_verified == False,
+                cls.expires_at >= now + timedelta(seconds=min_remaining_seconds),
+                cls.attempts < max_attempts)
 
-        # Check if OTP has expired
-        if datetime.utcnow() > otp_record.expires_at:
-            return False, "OTP has expired"
+        otp_code = db.session.execute(
+            db.update(cls)
+              .where(*live, db.or_(cls.last_sent_at.is_(None),
+                                   cls.last_sent_at <= now - timedelta(seconds=coalesce_seconds)))
+              .values(last_sent_at=now)
+              .returning(cls.otp_code),
+            execution_options={'synchronize_session': False}
+        ).scalars().first()
+        if otp_code:
+            return 'reuse', otp_code
 
-        # Increment attempts
-        otp_record.attempts += 1
+        if db.session.query(cls.id).filter(*live).first():
+            return 'coalesced', None
+        return 'new', None
 
-        # Check max attempts (limit to 5)
-        if otp_record.attempts > 5:
-            return False, "Too many invalid attempts"
+    @classmethod
+    def verify_otp(cls, phone_number, otp_code, max_attempts=5):
+        """
+        Verify OTP for a phone number. The attempt is counted and the code
+        checked in one conditional UPDATE, so concurrent attempts cannot
+        bypass the attempt limit.
+        """
+        now = datetime.utcnow()
+        result = db.session.execute(
+            db.update(cls)
+              .where(cls.phone_number == phone_number,
+                     cls.is_verified == False,
+                     cls.expires_at >= now,
+                     cls.attempts < max_attempts)
+              .values(attempts=cls.attempts + 1,
+                      is_verified=db.case((cls.otp_code == otp_code, True), else_=False))
+              .returning(cls.is_verified),
+            execution_options={'synchronize_session': False}
+        ).scalars().all()
+        db.session.commit()
 
-        # Verify OTP code
-        if otp_record.otp_code == otp_code:
-            otp_record.is_verified = True
-            db.session.commit()
+        if any(result):
             return True, "OTP verified successfully"
-        else:
-            db.session.commit()
+        if result:
             return False, "Invalid OTP code"
 
+        # Nothing was updated - work out why
+        otp_record = db.session.query(cls.expires_at, cls.attempts).filter_by(
+            phone_number=phone_number,
+            is_verified=False
+        ).first()
+
+        if not otp_record:
+            return False, "OTP not found or already verified"
+        if now > otp_record.expires_at:
+            return False, "OTP has expired"
+        return False, "Too many invalid attempts"
+
     @classmethod
-    def cleanup_expired_otps(cls):
-        """Clean up expired OTPs"""
-        expired_otps = cls.query.filter(cls.expires_at < datetime.utcnow()).all()
-        for otp in expired_otps:
-            db.session.delete(otp)
-        db.session.commit()
-        return len(expired_otps)
+    def cleanup_expired_otps(cls, chunk_size=1000):
+        """Delete expired OTPs in chunked bulk DELETEs"""
+        from database import delete_in_chunks
+        return delete_in_chunks(cls, cls.expires_at < datetime.utcnow(), chunk_size=chunk_size)
 
     def is_expired(self):
         """Check if OTP is expired"""
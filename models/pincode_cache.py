@@ -0,0 +1,61 @@
+from database import db
+from datetime import datetime, timedelta
+from sqlalchemy import Column, String, Text, DateTime, Boolean
+import json
+
+class PincodeCache(db.Model):
+    """Results of online pincode lookups, including 'not found' answers"""
+    __tablename__ = 'pincode_cache'
+
+    pincode = Column(String(6), primary_key=True)
+    found = Column(Boolean, nullable=False)
+    payload = Column(Text, nullable=True)  # JSON location when found
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<PincodeCache {self.pincode}: {"found" if self.found else "not found"}>'
+
+    @classmethod
+    def get_fresh(cls, pincode):
+        """
+        Return (found, location) for an unexpired entry, or None on a miss.
+        location is None for cached 'not found' answers.
+        """
+        row = db.session.query(cls.found, cls.payload, cls.expires_at)\
+                        .filter(cls.pincode == pincode, cls.expires_at > datetime.utcnow())\
+                        .first()
+        if row is None:
+            return None
+        return row.found, json.loads(row.payload) if row.found else None
+
+    @classmethod
+    def store(cls, pincode, location, ttl_seconds):
+        """Insert or refresh an entry and commit"""
+        values = {
+            'pincode': pincode,
+            'found': location is not None,
+            'payload': json.dumps(location) if location is not None else None,
+            'expires_at': datetime.utcnow() + timedelta(seconds=ttl_seconds)
+        }
+
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(cls).values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[cls.pincode],
+                set_={key: stmt.excluded[key] for key in ('found', 'payload', 'expires_at')}
+            )
+            db.session.execute(stmt)
+        else:
+            db.session.merge(cls(**values))
+        db.session.commit()
+
+    @classmethod
+    def purge_expired(cls, chunk_size=1000):
+        """Delete expired entries in chunked bulk DELETEs"""
+        from database import delete_in_chunks
+        return delete_in_chunks(cls, cls.expires_at < datetime.utcnow(), chunk_size=chunk_size)
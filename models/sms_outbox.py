@@ -0,0 +1,226 @@
+from database import db
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from enum import Enum
+import random
+import uuid
+
+class SmsStatus(Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    DEAD = "dead"
+
+class SmsOutbox(db.Model):
+    """SMS messages waiting to be delivered by the background outbox worker"""
+    __tablename__ = 'sms_outbox'
+    __table_args__ = (
+        db.Index('ix_sms_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    phone_number = Column(String(20), nullable=False)
+    message = Column(Text, nullable=False)
+    purpose = Column(String(20), nullable=False, default='otp')
+
+    # Delivery state
+    status = Column(String(20), nullable=False, default=SmsStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = Column(String(36), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String(500), nullable=True)
+    provider_ref = Column(String(100), nullable=True)  # Provider request id; shared by the recipients of one batched call
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<SmsOutbox {self.id}: {self.phone_number} {self.status}>'
+
+    @classmethod
+    def enqueue(cls, phone_number, message, purpose='otp', max_attempts=5):
+        """Add a message to the outbox. Does not commit, so it lands atomically with the caller's writes."""
+        entry = cls(
+            phone_number=phone_number,
+            message=message,
+            purpose=purpose,
+            status=SmsStatus.PENDING.value,
+            attempts=0,
+            max_attempts=max_attempts,
+            next_attempt_at=datetime.utcnow()
+        )
+        db.session.add(entry)
+        return entry
+
+    @classmethod
+    def has_pending(cls, phone_number, message):
+        """Whether the same message is queued or being sent"""
+        return db.session.query(cls.id).filter(
+            cls.status.in_([SmsStatus.PENDING.value, SmsStatus.SENDING.value]),
+            cls.phone_number == phone_number,
+            cls.message == message
+        ).first() is not None
+
+    @classmethod
+    def claim_batch(cls, limit=50, lease_seconds=60, purpose=None, exclude_purposes=None):
+        """
+        Atomically claim due messages for delivery. Messages stuck in 'sending'
+        past their lease (e.g. the worker died) are claimed again.
+        Pass `purpose` to only claim messages of that kind, or
+        `exclude_purposes` to leave some kinds to another worker.
+
+        Returns:
+            list: Claimed messages as (id, phone_number, message, attempts, max_attempts) rows
+        """
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+
+        due_ids = db.select(cls.id).where(
+            db.or_(
+                db.and_(cls.status == SmsStatus.PENDING.value, cls.next_attempt_at <= now),
+                db.and_(cls.status == SmsStatus.SENDING.value, cls.locked_until < now)
+            )
+        )
+        if purpose:
+            due_ids = due_ids.where(cls.purpose == purpose)
+        if exclude_purposes:
+            due_ids = due_ids.where(cls.purpose.notin_(exclude_purposes))
+        due_ids = due_ids.order_by(cls.next_attempt_at).limit(limit).scalar_subquery()
+        return cls._claim(due_ids, token, now, lease_seconds)
+
+    @classmethod
+    def claim_groups(cls, purposes, window_seconds=5, max_recipients=100, limit=1000, lease_seconds=60):
+        """
+        Atomically claim due messages of the given purposes for batched
+        delivery. A message text is only claimed once its oldest due copy has
+        waited `window_seconds`, or once `max_recipients` copies are queued, so
+        identical texts queued close together are claimed together.
+
+        Returns:
+            list: Claimed messages as (id, phone_number, message, attempts, max_attempts) rows
+        """
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+
+        due = db.and_(cls.status == SmsStatus.PENDING.value, cls.next_attempt_at <= now, cls.purpose.in_(purposes))
+        ready_messages = db.select(cls.message).where(due).group_by(cls.message).having(db.or_(
+            db.func.min(cls.next_attempt_at) <= now - timedelta(seconds=window_seconds),
+            db.func.count(cls.id) >= max_recipients
+        ))
+        due_ids = db.select(cls.id).where(
+            db.or_(
+                db.and_(due, cls.message.in_(ready_messages)),
+                db.and_(cls.status == SmsStatus.SENDING.value, cls.locked_until < now, cls.purpose.in_(purposes))
+            )
+        ).order_by(cls.next_attempt_at).limit(limit).scalar_subquery()
+        return cls._claim(due_ids, token, now, lease_seconds)
+
+    @classmethod
+    def _claim(cls, due_ids, token, now, lease_seconds):
+        """Mark the selected messages as being sent under a claim token and return them"""
+        db.session.execute(
+            db.update(cls).where(cls.id.in_(due_ids)).values(
+                status=SmsStatus.SENDING.value,
+                claim_token=token,
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=cls.attempts + 1
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+        return db.session.query(cls.id, cls.phone_number, cls.message, cls.attempts, cls.max_attempts)\
+                         .filter(cls.claim_token == token).all()
+
+    @classmethod
+    def release(cls, ids):
+        """Return claimed messages to the queue unsent, without counting the attempt"""
+        if not ids:
+            return
+        db.session.execute(
+            db.update(cls).where(cls.id.in_(ids), cls.status == SmsStatus.SENDING.value).values(
+                status=SmsStatus.PENDING.value,
+                attempts=cls.attempts - 1,
+                claim_token=None,
+                locked_until=None
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+    @classmethod
+    def mark_sent(cls, ids, provider_ref=None):
+        """Record successful deliveries"""
+        if not ids:
+            return
+        db.session.execute(
+            db.update(cls).where(cls.id.in_(ids)).values(
+                status=SmsStatus.SENT.value,
+                sent_at=datetime.utcnow(),
+                claim_token=None,
+                locked_until=None,
+                last_error=None,
+                provider_ref=provider_ref
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+    @classmethod
+    def mark_failed(cls, failures, base_backoff_seconds=5, max_backoff_seconds=600):
+        """
+        Schedule failed deliveries for retry with exponential backoff and jitter,
+        or move them to the dead-letter state once max_attempts is reached.
+
+        Args:
+            failures: Iterable of (claimed row, error message)
+        """
+        now = datetime.utcnow()
+        for row, error in failures:
+            values = {'claim_token': None, 'locked_until': None, 'last_error': (error or '')[:500]}
+            if row.attempts >= row.max_attempts:
+                values['status'] = SmsStatus.DEAD.value
+            else:
+                backoff = min(max_backoff_seconds, base_backoff_seconds * 2 ** (row.attempts - 1))
+                values['status'] = SmsStatus.PENDING.value
+                values['next_attempt_at'] = now + timedelta(seconds=backoff * random.uniform(0.5, 1.0))
+            db.session.execute(
+                db.update(cls).where(cls.id == row.id).values(**values),
+                execution_options={'synchronize_session': False}
+            )
+        db.session.commit()
+
+    @classmethod
+    def purge_finished_before(cls, cutoff, chunk_size=1000):
+        """Delete sent and dead-lettered messages created before the cutoff"""
+        from database import delete_in_chunks
+        return delete_in_chunks(
+            cls,
+            cls.status.in_([SmsStatus.SENT.value, SmsStatus.DEAD.value]),
+            cls.created_at < cutoff,
+            chunk_size=chunk_size
+        )
+
+    @classmethod
+    def get_status_counts(cls):
+        """Number of messages in each delivery state"""
+        rows = db.session.query(cls.status, db.func.count(cls.id)).group_by(cls.status).all()
+        return {status.value: 0 for status in SmsStatus} | dict(rows)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'phone_number': self.phone_number,
+            'purpose': self.purpose,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'provider_ref': self.provider_ref,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
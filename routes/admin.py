@@ -1,9 +1,17 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from datetime import datetime, date, time
-from models import Customer, Service, Appointment, AppointmentStatus, AppointmentType, Notification, NotificationType
+from models import Customer, Service, Appointment, AppointmentStatus, AppointmentType, Notification, NotificationType, SmsOutbox
 from database import db
 import traceback
-from routes.main import broadcast_notification_update
+from services.auth_service import AuthService, token_cache
+from services.http_client import get_http_client_stats
+from services.otp_store import get_otp_store
+from services.maintenance_service import MaintenanceService
+from services.pincode_service import PincodeService
+from services.notification_hub import NotificationHubService
+from services.archive_service import ArchiveService
+from services.domain_event_service import DomainEventService
+from services.sms_outbox_service import SmsOutboxService
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -41,22 +49,45 @@ def customers():
     search = request.args.get('search', '')
     page = request.args.get('page', 1, type=int)
 
-    query = Customer.query
     if search:
-        query = query.filter(
-            db.or_(
-                Customer.name.ilike(f'%{search}%'),
-                Customer.email.ilike(f'%{search}%'),
-                Customer.phone.ilike(f'%{search}%')
-            )
-        )
+        # Full-text search, best matches first
+        query = Customer.search_query(search)
+    else:
+        query = Customer.query.order_by(Customer.created_at.desc())
 
-    customers = query.order_by(Customer.created_at.desc()).paginate(
+    customers = query.paginate(
         page=page, per_page=20, error_out=False
     )
 
     return render_template('admin/customers.html', customers=customers, search=search)
 
+@admin_bp.route('/customers/merge-duplicates', methods=['POST'])
+def merge_duplicate_customers():
+    """Report or merge customers that share a phone number or email"""
+    try:
+        from services.customer_merge_service import CustomerMergeService
+
+        dry_run = request.form.get('mode', 'dry_run') != 'apply'
+        report = CustomerMergeService.merge_duplicates(dry_run=dry_run)
+
+        if dry_run:
+            flash(f"Found {report['duplicate_customers']} duplicate customers in {report['duplicate_groups']} groups.", 'info')
+        else:
+            flash(f"Merged {report['merged_customers']} duplicate customers!", 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error merging duplicate customers: {str(e)}', 'error')
+    return redirect(url_for('admin.customers'))
+
+@admin_bp.route('/api/duplicate-customers')
+def api_duplicate_customers():
+    """API endpoint for a dry-run duplicate customer report"""
+    try:
+        from services.customer_merge_service import CustomerMergeService
+        return jsonify(CustomerMergeService.merge_duplicates(dry_run=True))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/customers/new')
 def new_customer():
     """New customer form"""
@@ -112,6 +143,7 @@ def delete_customer(customer_id):
         customer = Customer.query.get_or_404(customer_id)
         db.session.delete(customer)
         db.session.commit()
+        token_cache.invalidate_customer(customer_id)
         flash('Customer deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -323,59 +355,12 @@ def update_appointment(appointment_id):
         appointment.address = request.form.get('address', '')
         appointment.updated_at = datetime.utcnow()
 
-        # Create notification if status changed
+        # The customer is notified by the domain event dispatcher once this commits
         if old_status != new_status:
-            service = Service.query.get(appointment.service_id)
-            service_name = service.name if service else "Service"
-
-            # Map status to notification type and create appropriate message
-            if new_status == AppointmentStatus.CONFIRMED:
-                notification_type = NotificationType.APPOINTMENT_CONFIRMED.value
-                title = "Appointment Confirmed"
-                message = f"Your {service_name} appointment scheduled for {appointment.appointment_date} at {appointment.appointment_time} has been confirmed."
-                action_text = "View Appointment"
-                action_url = f"/dashboard"
-            elif new_status == AppointmentStatus.COMPLETED:
-                notification_type = NotificationType.SERVICE_COMPLETED.value
-                title = "Service Completed"
-                message = f"Your {service_name} service has been completed successfully."
-                action_text = "View Details"
-                action_url = f"/dashboard"
-            elif new_status == AppointmentStatus.CANCELLED:
-                notification_type = NotificationType.SERVICE_CANCELLED.value
-                title = "Appointment Cancelled"
-                message = f"Your {service_name} appointment scheduled for {appointment.appointment_date} has been cancelled."
-                action_text = "Book New Appointment"
-                action_url = f"/book-service"
-            elif new_status == AppointmentStatus.PENDING:
-                notification_type = NotificationType.SERVICE_SCHEDULED.value
-                title = "Service Scheduled"
-                message = f"Your {service_name} service has been scheduled for {appointment.appointment_date} at {appointment.appointment_time}."
-                action_text = "View Details"
-                action_url = f"/dashboard"
-            else:
-                # For IN_PROGRESS or other statuses
-                notification_type = NotificationType.SYSTEM_UPDATE.value
-                title = "Appointment Status Updated"
-                message = f"Your {service_name} appointment status has been updated to {new_status.value.replace('_', ' ').title()}."
-                action_text = "View Details"
-                action_url = f"/dashboard"
-
-            # Create the notification
-            Notification.create_notification(
-                customer_id=appointment.customer_id,
-                appointment_id=appointment.id,
-                notification_type=notification_type,
-                title=title,
-                message=message,
-                action_text=action_text,
-                action_url=action_url
-            )
-
-            # Broadcast notification update immediately
-            broadcast_notification_update(appointment.customer_id)
+            appointment.record_status_change(old_status)
 
         db.session.commit()
+        DomainEventService.notify_dispatcher()
         flash('Appointment updated successfully!', 'success')
         return redirect(url_for('admin.appointments'))
     except Exception as e:
@@ -396,6 +381,72 @@ def delete_appointment(appointment_id):
         flash(f'Error deleting appointment: {str(e)}', 'error')
     return redirect(url_for('admin.appointments'))
 
+# Notification broadcasts
+def _broadcast_segment(values):
+    """Segment filters from form or JSON values; dates are YYYY-MM-DD"""
+    segment = {
+        'category': values.get('category') or None,
+        'pincode': (values.get('pincode') or '').strip() or None
+    }
+    for key in ('booked_after', 'booked_before'):
+        value = values.get(key)
+        segment[key] = datetime.strptime(value, '%Y-%m-%d') if value else None
+    return segment
+
+@admin_bp.route('/notifications/broadcast')
+def broadcast_form():
+    """Form for sending an offer or system notification to a customer segment"""
+    categories = [row.category for row in db.session.query(Service.category).distinct().order_by(Service.category)]
+    return render_template('admin/broadcast_form.html', categories=categories)
+
+@admin_bp.route('/notifications/broadcast', methods=['POST'])
+def broadcast_notification():
+    """Send a notification to every customer in the selected segment"""
+    try:
+        from services.notification_broadcast_service import NotificationBroadcastService
+
+        report = NotificationBroadcastService.broadcast(
+            title=request.form['title'],
+            message=request.form['message'],
+            notification_type=request.form.get('notification_type', NotificationType.SPECIAL_OFFER.value),
+            action_text=request.form.get('action_text') or None,
+            action_url=request.form.get('action_url') or None,
+            **_broadcast_segment(request.form)
+        )
+        flash(f"Notification sent to {report['recipients']} customers in {report['seconds']}s.", 'success')
+        return redirect(url_for('admin.index'))
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error sending notification: {str(e)}', 'error')
+        return redirect(url_for('admin.broadcast_form'))
+
+@admin_bp.route('/api/notifications/broadcast', methods=['POST'])
+def api_broadcast_notification():
+    """API endpoint for segment broadcasts; {"dry_run": true} only counts the recipients"""
+    try:
+        from services.notification_broadcast_service import NotificationBroadcastService
+
+        data = request.get_json() or {}
+        segment = _broadcast_segment(data)
+        if data.get('dry_run'):
+            return jsonify({'recipients': NotificationBroadcastService.count_recipients(**segment)})
+
+        report = NotificationBroadcastService.broadcast(
+            title=data['title'],
+            message=data['message'],
+            notification_type=data.get('notification_type', NotificationType.SPECIAL_OFFER.value),
+            action_text=data.get('action_text'),
+            action_url=data.get('action_url'),
+            start_after_id=data.get('start_after_id', 0),
+            **segment
+        )
+        return jsonify(report)
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid broadcast request: {str(e)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # Database utilities
 @admin_bp.route('/database/reset', methods=['POST'])
 def reset_database():
@@ -449,7 +500,7 @@ def database_info():
                 'customers': Customer.query.count(),
                 'services': Service.query.count(),
                 'appointments': Appointment.query.count(),
-                'otp_records': db.session.execute(db.text("SELECT COUNT(*) FROM otp")).scalar()
+                'otp_records': get_otp_store().count()
             }
         except Exception:
             table_info = {'error': 'Could not fetch table statistics'}
@@ -476,7 +527,17 @@ def api_stats():
             'appointments': Appointment.query.count(),
             'active_services': Service.query.filter_by(is_active=True).count(),
             'pending_appointments': Appointment.query.filter_by(status=AppointmentStatus.PENDING).count(),
-            'completed_appointments': Appointment.query.filter_by(status=AppointmentStatus.COMPLETED).count()
+            'completed_appointments': Appointment.query.filter_by(status=AppointmentStatus.COMPLETED).count(),
+            'token_cache': AuthService.get_token_cache_stats(),
+            'epoch_cache': AuthService.get_epoch_cache_stats(),
+            'sms_outbox': SmsOutbox.get_status_counts(),
+            'sms_batch_dispatcher': SmsOutboxService.get_batch_dispatcher_stats(),
+            'outbound_http': get_http_client_stats(),
+            'maintenance': MaintenanceService.get_stats(),
+            'pincode_cache': PincodeService.get_cache_stats(),
+            'notification_hub': NotificationHubService.get_stats(),
+            'archive': ArchiveService.get_stats(),
+            'domain_events': DomainEventService.get_stats()
         }
         return jsonify(stats)
     except Exception as e:
@@ -72,7 +72,7 @@ def index():
 @appointments_bp.route('/<int:appointment_id>')
 def detail(appointment_id):
     """Appointment detail page"""
-    appointment = Appointment.query.get(appointment_id)
+    appointment = Appointment.find(appointment_id, include_archived=True)
     if not appointment:
         flash('Appointment not found', 'error')
         return redirect(url_for('appointments.index'))
@@ -298,7 +298,9 @@ def api_appointments():
     return jsonify({
         'appointments': appointments_data,
         'total': len(appointments_data),
-        'statistics': Appointment.get_statistics()
+        'statistics': Appointment.get_statistics(
+            include_archived=request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+        )
     })
 
 @appointments_bp.route('/api/available-slots')
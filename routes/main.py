@@ -1,38 +1,45 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, current_app
+from werkzeug.http import is_resource_modified
 from datetime import datetime, date, time
 from models import Customer, Service, Appointment, AppointmentType, Notification
 from services.auth_service import AuthService
-from utils.auth_decorators import require_auth, get_current_customer, get_auth_response_data
+from services.pincode_service import PincodeService
+from services.notification_hub import NotificationHubService
+from utils.auth_decorators import require_auth, get_current_customer, get_current_customer_id, get_current_identity, get_auth_response_data
 from database import db
-import requests
 import re
 import json
 import time
-from threading import Lock
-from queue import Queue
 
 main_bp = Blueprint('main', __name__)
 
-# Simple notification broadcasting system
-notification_clients = {}
-clients_lock = Lock()
-
-def broadcast_notification_update(customer_id):
-    """Broadcast notification update to specific customer"""
-    with clients_lock:
-        if customer_id in notification_clients:
-            clients = notification_clients[customer_id][:]
-            for client_queue in clients:
-                try:
-                    client_queue.put({
-                        'type': 'notification_update',
-                        'customer_id': customer_id,
-                        'timestamp': time.time()
-                    })
-                except:
-                    # Remove dead clients
-                    if client_queue in notification_clients[customer_id]:
-                        notification_clients[customer_id].remove(client_queue)
+def broadcast_notification_update(customer_id, notification=None):
+    """Broadcast notification update to specific customer, carrying the new notification when given"""
+    if notification is None:
+        # Bare "something changed" ping; clients refetch
+        NotificationHubService.publish(customer_id, {
+            'type': 'notification_update',
+            'coalesce_key': 'notification_update',
+            'customer_id': customer_id,
+            'timestamp': time.time()
+        })
+        return
+
+    NotificationHubService.publish(customer_id, {
+        'type': 'notification_created',
+        'notification': notification.to_dict(),
+        'unread_count': Notification.get_unread_count(customer_id),
+        'timestamp': time.time()
+    })
+
+def broadcast_notifications_read(customer_id, notification_ids=None):
+    """Tell the customer's other open pages which notifications were read (None means all)"""
+    NotificationHubService.publish(customer_id, {
+        'type': 'notification_read',
+        'notification_ids': notification_ids,
+        'unread_count': Notification.get_unread_count(customer_id),
+        'timestamp': time.time()
+    })
 
 def sanitize_text(text):
     """Sanitize and format text fields"""
@@ -120,8 +127,8 @@ def get_started_post():
             flash('Appointment date cannot be more than 90 days in the future', 'error')
             return redirect(url_for('main.get_started'))
 
-        # Create or get customer
-        customer, created = Customer.get_or_create(
+        # Create or update customer in one statement, committed with the appointment
+        customer, created = Customer.upsert(
             name=name,
             email=email,
             phone=phone,
@@ -198,8 +205,8 @@ def request_quotation_post():
             except ValueError:
                 parsed_time = time(10, 0)
 
-        # Create or get customer
-        customer, created = Customer.get_or_create(
+        # Create or update customer in one statement, committed with the appointment
+        customer, created = Customer.upsert(
             name=name,
             email=email,
             phone=phone,
@@ -230,7 +237,7 @@ def request_quotation_post():
 @main_bp.route('/appointment/<int:appointment_id>/confirmation')
 def appointment_confirmation(appointment_id):
     """Appointment confirmation page"""
-    appointment = Appointment.query.get(appointment_id)
+    appointment = Appointment.find(appointment_id, include_archived=True)
     if not appointment:
         flash('Appointment not found', 'error')
         return redirect(url_for('main.index'))
@@ -270,7 +277,7 @@ def terms():
 def profile_completion():
     """Profile completion page for new users"""
     # Get authenticated customer
-    customer = AuthService.get_customer_from_request(request)
+    customer = get_current_customer()
 
     if not customer:
         # If no authentication, redirect to login
@@ -288,7 +295,7 @@ def profile_completion_post():
     """Handle profile completion form submission"""
     try:
         # Get authenticated customer
-        customer = AuthService.get_customer_from_request(request)
+        customer = get_current_customer()
 
         if not customer:
             return jsonify({
@@ -322,13 +329,8 @@ def profile_completion_post():
 
         db.session.commit()
 
-        # Get token from request to include in redirect URL
-        token = None
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ', 1)[1]
-        elif request.headers.get('X-Auth-Token'):
-            token = request.headers.get('X-Auth-Token')
+        # Get token the request authenticated with to include in redirect URL
+        token = get_current_identity().token
 
         # Include token in redirect URL
         dashboard_url = url_for('main.dashboard')
@@ -358,7 +360,7 @@ def dashboard():
     print(f"  Headers: {dict(request.headers)}")
 
     # Try to get authenticated customer
-    customer = AuthService.get_customer_from_request(request)
+    customer = get_current_customer()
     print(f"  Customer found: {customer}")
 
     if not customer:
@@ -500,87 +502,10 @@ def get_pincode_info(pincode):
                 'message': 'Invalid PIN code format'
             }), 400
 
-        # Try multiple reliable API sources, starting with government data
-        api_calls = [
-            {
-                'url': f'https://api.data.gov.in/catalog/709e9d78-bf11-487d-93fd-d547d24cc0ef?api-key=579b464db66ec23bdd0000015c26426692c446bb66a7696808147718&format=json&filters%5Bpincode%5D={pincode}',
-                'type': 'gov_data'
-            },
-            {
-                'url': f'https://api.postalpincode.in/pincode/{pincode}',
-                'type': 'new_format'
-            },
-            {
-                'url': f'http://www.postalpincode.in/api/pincode/{pincode}',
-                'type': 'old_format'
-            },
-            {
-                'url': f'https://api.zippopotam.us/IN/{pincode}',
-                'type': 'zippopotam'
-            }
-        ]
-
-        for api_call in api_calls:
-            try:
-                api_url = api_call['url']
-                api_type = api_call['type']
-                # Remove debug logs for faster execution
-                response = requests.get(api_url, timeout=3)
-
-                if response.status_code == 200:
-                    data = response.json()
-
-                    if api_type == 'gov_data':
-                        # Government data.gov.in API format
-                        if 'records' in data and len(data['records']) > 0:
-                            location = data['records'][0]
-                            return jsonify({
-                                'success': True,
-                                'city': location.get('district', ''),
-                                'state': location.get('statename', ''),
-                                'area': location.get('officename', ''),
-                                'circle': location.get('circlename', ''),
-                                'region': location.get('regionname', '')
-                            }), 200
-
-                    elif api_type == 'new_format':
-                        # New postalpincode.in API format (array)
-                        if isinstance(data, list) and len(data) > 0:
-                            post_office_data = data[0]
-                            if post_office_data.get('Status') == 'Success' and post_office_data.get('PostOffice'):
-                                location = post_office_data['PostOffice'][0]
-                                return jsonify({
-                                    'success': True,
-                                    'city': location.get('District', ''),
-                                    'state': location.get('State', ''),
-                                    'area': location.get('Name', '')
-                                }), 200
-
-                    elif api_type == 'old_format':
-                        # Old postalpincode.in API format (object)
-                        if data.get('Status') == 'Success' and data.get('PostOffice'):
-                            location = data['PostOffice'][0]
-                            return jsonify({
-                                'success': True,
-                                'city': location.get('District', ''),
-                                'state': location.get('State', ''),
-                                'area': location.get('Name', '')
-                            }), 200
-
-                    elif api_type == 'zippopotam':
-                        # Zippopotam.us API format
-                        if 'places' in data and len(data['places']) > 0:
-                            location = data['places'][0]
-                            return jsonify({
-                                'success': True,
-                                'city': location.get('place name', ''),
-                                'state': location.get('state', ''),
-                                'area': location.get('place name', '')
-                            }), 200
-
-            except requests.exceptions.RequestException:
-                # Fail silently and try next API
-                continue
+        # Bundled offline dataset first, external APIs only for codes it doesn't know
+        location = PincodeService.lookup(pincode)
+        if location:
+            return jsonify({'success': True, **location}), 200
 
         return jsonify({
             'success': False,
@@ -649,13 +574,13 @@ def notifications():
 @require_auth
 def get_unread_notifications_count():
     """API endpoint to get unread notifications count"""
-    customer = get_current_customer()
+    customer_id = get_current_customer_id()
 
-    if not customer:
+    if not customer_id:
         return jsonify({'success': False, 'message': 'Authentication required'}), 401
 
     try:
-        unread_count = Notification.get_unread_count(customer.id)
+        unread_count = Notification.get_unread_count(customer_id)
         return jsonify({
             'success': True,
             'unread_count': unread_count
@@ -670,21 +595,22 @@ def get_unread_notifications_count():
 @require_auth
 def mark_notification_read(notification_id):
     """Mark a single notification as read"""
-    customer = get_current_customer()
+    customer_id = get_current_customer_id()
 
-    if not customer:
+    if not customer_id:
         return jsonify({'success': False, 'message': 'Authentication required'}), 401
 
     try:
         notification = Notification.query.filter_by(
             id=notification_id,
-            customer_id=customer.id
+            customer_id=customer_id
         ).first()
 
         if not notification:
             return jsonify({'success': False, 'message': 'Notification not found'}), 404
 
         notification.mark_as_read()
+        broadcast_notifications_read(customer_id, [notification_id])
 
         return jsonify({
             'success': True,
@@ -700,13 +626,14 @@ def mark_notification_read(notification_id):
 @require_auth
 def mark_all_notifications_read():
     """Mark all notifications as read for the current customer"""
-    customer = get_current_customer()
+    customer_id = get_current_customer_id()
 
-    if not customer:
+    if not customer_id:
         return jsonify({'success': False, 'message': 'Authentication required'}), 401
 
     try:
-        Notification.mark_all_as_read(customer.id)
+        Notification.mark_all_as_read(customer_id)
+        broadcast_notifications_read(customer_id)
 
         return jsonify({
             'success': True,
@@ -722,22 +649,42 @@ def mark_all_notifications_read():
 @require_auth
 def get_notifications():
     """API endpoint to get customer notifications"""
-    customer = get_current_customer()
+    customer_id = get_current_customer_id()
 
-    if not customer:
+    if not customer_id:
         return jsonify({'success': False, 'message': 'Authentication required'}), 401
 
     try:
-        limit = request.args.get('limit', 50, type=int)
-        notifications = Notification.get_customer_notifications(customer.id, limit=limit)
-
-        notifications_data = [notification.to_dict() for notification in notifications]
-
-        return jsonify({
-            'success': True,
-            'notifications': notifications_data,
-            'unread_count': Notification.get_unread_count(customer.id)
-        }), 200
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 100)
+        before_id = request.args.get('before_id', type=int)
+        since_id = request.args.get('since_id', type=int)
+        include_archived = request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+        # Polling clients revalidate with If-None-Match/If-Modified-Since; answer
+        # from the feed version alone when nothing changed
+        version, last_modified = Notification.get_feed_version(customer_id)
+        etag = f"{version}.{limit}.{before_id or 0}.{since_id or 0}.{int(include_archived)}"
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response = Response(status=304)
+        else:
+            notifications = Notification.get_customer_notifications(customer_id, limit=limit,
+                                                                     before_id=before_id, since_id=since_id,
+                                                                     include_archived=include_archived)
+            notifications_data = [notification.to_dict() for notification in notifications]
+
+            response = jsonify({
+                'success': True,
+                'notifications': notifications_data,
+                'unread_count': Notification.get_unread_count(customer_id),
+                'has_more': len(notifications_data) == limit,
+                'next_before_id': notifications_data[-1]['id'] if notifications_data else None
+            })
+
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
     except Exception as e:
         return jsonify({
             'success': False,
@@ -748,46 +695,17 @@ def get_notifications():
 @require_auth
 def notification_stream():
     """Server-Sent Events stream for real-time notifications"""
-    customer = get_current_customer()
+    customer_id = get_current_customer_id()
 
-    if not customer:
+    if not customer_id:
         return jsonify({'success': False, 'message': 'Authentication required'}), 401
 
-    def event_stream():
-        # Create a queue for this client
-        client_queue = Queue()
+    # Streams are held by the asyncio notification hub rather than a WSGI thread.
+    # In production the proxy routes this path straight to the hub.
+    NotificationHubService.ensure_started()
+    stream_url = NotificationHubService.get_stream_url(request.query_string.decode('utf-8'))
+    if stream_url is None:
+        current_app.logger.error("Notification stream reached the web app; route it to the notification hub")
+        return jsonify({'success': False, 'message': 'Real-time notifications are unavailable'}), 503
 
-        # Register this client
-        with clients_lock:
-            if customer.id not in notification_clients:
-                notification_clients[customer.id] = []
-            notification_clients[customer.id].append(client_queue)
-
-        try:
-            # Send initial connection message
-            yield f"data: {json.dumps({'type': 'connected', 'customer_id': customer.id})}\n\n"
-
-            while True:
-                try:
-                    # Wait for new notifications with timeout
-                    message = client_queue.get(timeout=30)
-                    yield f"data: {json.dumps(message)}\n\n"
-                except:
-                    # Timeout - send keepalive
-                    yield f"data: {json.dumps({'type': 'keepalive', 'timestamp': time.time()})}\n\n"
-
-        except GeneratorExit:
-            pass
-        finally:
-            # Clean up client
-            with clients_lock:
-                if customer.id in notification_clients and client_queue in notification_clients[customer.id]:
-                    notification_clients[customer.id].remove(client_queue)
-                    if not notification_clients[customer.id]:
-                        del notification_clients[customer.id]
-
-    response = Response(event_stream(), mimetype='text/event-stream')
-    response.headers['Cache-Control'] = 'no-cache'
-    response.headers['Connection'] = 'keep-alive'
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    return response
\ No newline at end of file
+    return redirect(stream_url, code=307)
\ No newline at end of file
@@ -3,18 +3,24 @@ from services.otp_service import OTPService
 from services.auth_service import AuthService
 from models.otp import OTP
 from models.customer_db import Customer
-from utils.auth_decorators import get_auth_response_data
+from utils.auth_decorators import get_auth_response_data, get_current_customer, rate_limit
 from database import db
 from datetime import datetime
 
 otp_bp = Blueprint('otp', __name__)
 
+def _text_field(data, name):
+    """A stripped string field of the request body; '' when missing, not a string, or the body is not an object"""
+    value = data.get(name) if isinstance(data, dict) else None
+    return value.strip() if isinstance(value, str) else ''
+
 @otp_bp.route('/send', methods=['POST'])
+@rate_limit('otp-send')
 def send_otp():
     """Send OTP to phone number"""
     try:
         data = request.get_json() if request.is_json else request.form
-        phone_number = data.get('phone_number', '').strip()
+        phone_number = _text_field(data, 'phone_number')
 
         if not phone_number:
             return jsonify({
@@ -37,12 +43,13 @@ def send_otp():
         }), 500
 
 @otp_bp.route('/verify', methods=['POST'])
+@rate_limit('otp-verify')
 def verify_otp():
     """Verify OTP code and return authentication token"""
     try:
         data = request.get_json() if request.is_json else request.form
-        phone_number = data.get('phone_number', '').strip()
-        otp_code = data.get('otp_code', '').strip()
+        phone_number = _text_field(data, 'phone_number')
+        otp_code = _text_field(data, 'otp_code')
 
         if not phone_number or not otp_code:
             return jsonify({
@@ -96,11 +103,12 @@ def verify_otp():
         }), 500
 
 @otp_bp.route('/refresh-token', methods=['POST'])
+@rate_limit('token-refresh', per_phone=False)
 def refresh_token():
     """Refresh authentication token for a logged-in user"""
     try:
         # Get current customer from token
-        customer = AuthService.get_customer_from_request(request)
+        customer = get_current_customer()
 
         if not customer:
             return jsonify({
@@ -126,7 +134,7 @@ def logout():
     """Logout user by revoking their authentication token"""
     try:
         # Get current customer from token
-        customer = AuthService.get_customer_from_request(request)
+        customer = get_current_customer()
 
         if customer:
             # Revoke the token
@@ -145,11 +153,12 @@ def logout():
         }), 500
 
 @otp_bp.route('/resend', methods=['POST'])
+@rate_limit('otp-send')
 def resend_otp():
     """Resend OTP to phone number"""
     try:
         data = request.get_json() if request.is_json else request.form
-        phone_number = data.get('phone_number', '').strip()
+        phone_number = _text_field(data, 'phone_number')
 
         if not phone_number:
             return jsonify({
@@ -197,7 +206,7 @@ def test_auth():
         print(f"  URL params: {request.args}")
         print(f"  Headers: {dict(request.headers)}")
 
-        customer = AuthService.get_customer_from_request(request)
+        customer = get_current_customer()
         print(f"  Customer result: {customer}")
 
         if customer:
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from flask import current_app
+from database import db
+from models.appointment_db import Appointment
+from models.notification import Notification
+from models.archive import appointments_archive, notifications_archive
+
+
+class ArchiveService:
+    """Service for moving old appointments and notifications to the archive tables"""
+
+    @staticmethod
+    def archive_old_records(appointment_days: Optional[int] = None, notification_days: Optional[int] = None,
+                            chunk_size: Optional[int] = None) -> dict:
+        """
+        Move finished appointments and read notifications past their horizon
+        (APPOINTMENT_ARCHIVE_AFTER_DAYS, NOTIFICATION_ARCHIVE_AFTER_DAYS) to
+        the archive tables. Notifications go first so the appointments they
+        referenced can follow in the same run.
+
+        Returns:
+            dict: Rows moved per table
+        """
+        config = current_app.config
+        if appointment_days is None:
+            appointment_days = config.get('APPOINTMENT_ARCHIVE_AFTER_DAYS', 180)
+        if notification_days is None:
+            notification_days = config.get('NOTIFICATION_ARCHIVE_AFTER_DAYS', 30)
+        chunk_size = chunk_size or config.get('MAINTENANCE_CHUNK_SIZE', 1000)
+
+        now = datetime.utcnow()
+        notifications = Notification.archive_read_before(now - timedelta(days=notification_days), chunk_size)
+        appointments = Appointment.archive_finished_before(now - timedelta(days=appointment_days), chunk_size)
+        return {'notifications': notifications, 'appointments': appointments}
+
+    @staticmethod
+    def get_stats() -> dict:
+        """Row counts of the hot and archive tables"""
+        def count(table):
+            return db.session.execute(db.select(db.func.count()).select_from(table)).scalar()
+
+        return {
+            'appointments': {'hot': count(Appointment.__table__), 'archived': count(appointments_archive)},
+            'notifications': {'hot': count(Notification.__table__), 'archived': count(notifications_archive)}
+        }
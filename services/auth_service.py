@@ -1,8 +1,205 @@
-from typing import Optional, Tuple
+from typing import Optional, Tuple, NamedTuple
+from collections import OrderedDict
+from threading import Lock
+from flask import current_app, g, has_request_context
 from models.customer_db import Customer
 from models.customer_auth import CustomerAuth
 from database import db
-from datetime import datetime
+from config import Config
+from datetime import datetime, timedelta
+
+
+class CachedToken(NamedTuple):
+    """Snapshot of the auth state needed to validate a token without a query"""
+    customer_id: int
+    expires_at: datetime
+    is_active: bool
+    cached_until: datetime
+
+
+class TokenCache:
+    """Bounded LRU cache of auth token -> CachedToken with a per-entry TTL.
+
+    Entries never outlive the token itself, and the TTL bounds how long a
+    revocation made by another worker process can go unnoticed.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: int = 60):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._tokens_by_customer = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[CachedToken]:
+        """Return the cached entry for a token, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if datetime.utcnow() >= entry.cached_until:
+                self._remove(token)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry
+
+    def put(self, token: str, customer_id: int, expires_at: datetime, is_active: bool):
+        """Cache the validation result for a token"""
+        if self.max_size <= 0:
+            return
+
+        cached_until = min(datetime.utcnow() + timedelta(seconds=self.ttl_seconds), expires_at)
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = CachedToken(customer_id, expires_at, is_active, cached_until)
+            self._tokens_by_customer.setdefault(customer_id, set()).add(token)
+
+            while len(self._entries) > self.max_size:
+                oldest_token = next(iter(self._entries))
+                self._remove(oldest_token)
+                self.evictions += 1
+
+    def invalidate(self, token: str):
+        """Drop a single token from the cache"""
+        if not token:
+            return
+        with self._lock:
+            self._remove(token)
+
+    def invalidate_customer(self, customer_id: int):
+        """Drop every cached token belonging to a customer"""
+        with self._lock:
+            for token in list(self._tokens_by_customer.get(customer_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        """Drop all cached tokens"""
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_customer.clear()
+
+    def stats(self) -> dict:
+        """Return cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _remove(self, token: str):
+        """Remove a token from both indexes. Caller must hold the lock."""
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_customer.get(entry.customer_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_customer[entry.customer_id]
+
+
+class RequestIdentity(NamedTuple):
+    """Immutable identity of the caller, resolved once per request"""
+    customer_id: int
+    credential_type: str  # 'token' or 'auth_key'
+    token: Optional[str] = None
+    auth_key: Optional[str] = None
+    token_expires_at: Optional[datetime] = None
+    last_login: Optional[datetime] = None
+
+    @classmethod
+    def from_auth_record(cls, auth_record: CustomerAuth, credential_type: str, token: Optional[str] = None):
+        """Snapshot an auth record into an identity"""
+        return cls(
+            customer_id=auth_record.customer_id,
+            credential_type=credential_type,
+            token=token,
+            auth_key=auth_record.auth_key,
+            token_expires_at=auth_record.token_expires_at,
+            last_login=auth_record.last_login
+        )
+
+
+class CachedEpoch(NamedTuple):
+    """Revocation epoch of a customer as last read from the database"""
+    epoch: int
+    is_active: bool
+    cached_until: datetime
+
+
+class EpochCache:
+    """Small bounded LRU cache of customer_id -> CachedEpoch used to check signed tokens.
+
+    Revocations made in this process update the cache immediately; the TTL
+    bounds how long a revocation made by another worker can go unnoticed.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: int = 30):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, customer_id: int) -> Optional[CachedEpoch]:
+        """Return the cached epoch for a customer, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is None or datetime.utcnow() >= entry.cached_until:
+                self._entries.pop(customer_id, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(customer_id)
+            self.hits += 1
+            return entry
+
+    def put(self, customer_id: int, epoch: int, is_active: bool):
+        """Cache the current revocation epoch of a customer"""
+        cached_until = datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+        with self._lock:
+            self._entries[customer_id] = CachedEpoch(epoch, is_active, cached_until)
+            self._entries.move_to_end(customer_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return cache counters for monitoring"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# Process-wide token validation cache
+token_cache = TokenCache(
+    max_size=Config.AUTH_TOKEN_CACHE_SIZE,
+    ttl_seconds=Config.AUTH_TOKEN_CACHE_TTL_SECONDS
+)
+
+# Process-wide revocation epoch cache for signed tokens
+epoch_cache = EpochCache(
+    max_size=Config.AUTH_TOKEN_CACHE_SIZE,
+    ttl_seconds=Config.AUTH_EPOCH_CACHE_TTL_SECONDS
+)
 
 
 class AuthService:
@@ -15,51 +212,40 @@ class AuthService:
         Returns (customer, auth_token) or (None, error_message)
         """
         try:
-            # Look for existing customers with this phone number
-            customers = Customer.get_all_by_phone(phone_number)
-
-            if len(customers) == 0:
-                # Create new customer for first-time user without default name
-                customer, created = Customer.get_or_create(
-                    name="",  # No default name - user will complete profile
-                    email="",
-                    phone=phone_number,
-                    address=""
-                )
-
-                # Create or get auth record
-                auth_record = CustomerAuth.get_or_create_for_customer(customer.id)
-                token = auth_record.create_auth_token()
-                db.session.commit()
+            # Find or create the customer for this phone in one atomic upsert;
+            # new users get no default name and complete their profile later
+            customer, created = Customer.upsert(
+                name="",
+                email="",
+                phone=phone_number,
+                address=""
+            )
 
-                return customer, token
-
-            elif len(customers) == 1:
-                # Single customer - authenticate directly
-                customer = customers[0]
-
-                # Get or create auth record
-                auth_record = CustomerAuth.get_or_create_for_customer(customer.id)
-                token = auth_record.create_auth_token()
-                db.session.commit()
-
-                return customer, token
-
-            else:
-                # Multiple customers - return the first one for now
-                # In a more complex system, this could show a selection screen
-                customer = customers[0]
-
-                auth_record = CustomerAuth.get_or_create_for_customer(customer.id)
-                token = auth_record.create_auth_token()
-                db.session.commit()
+            # Get or create auth record
+            auth_record = CustomerAuth.get_or_create_for_customer(customer.id)
+            token = AuthService.issue_token(auth_record)
+            identity = RequestIdentity.from_auth_record(auth_record, 'token', token)
+            db.session.commit()
+            AuthService.set_request_identity(identity)
 
-                return customer, token
+            return customer, token
 
         except Exception as e:
             db.session.rollback()
             return None, f"Authentication error: {str(e)}"
 
+    @staticmethod
+    def issue_token(auth_record: CustomerAuth) -> str:
+        """
+        Issue a new token for an auth record. Signed stateless tokens are issued
+        when AUTH_SIGNED_TOKENS is enabled, opaque database tokens otherwise.
+        The caller is responsible for committing.
+        """
+        hours_valid = current_app.config.get('AUTH_TOKEN_EXPIRY_HOURS', 24 * 30)
+        if current_app.config.get('AUTH_SIGNED_TOKENS'):
+            return auth_record.create_signed_auth_token(current_app.config['SECRET_KEY'], hours_valid)
+        return auth_record.create_auth_token(hours_valid)
+
     @staticmethod
     def validate_token(token: str) -> Optional[Customer]:
         """
@@ -72,13 +258,104 @@ class AuthService:
 
         try:
             print(f"  validate_token: Checking token: {token[:20]}...")
-            customer = CustomerAuth.get_customer_by_auth_token(token)
+            customer = AuthService.get_identity_customer(AuthService.resolve_token_identity(token))
             print(f"  validate_token: Customer found: {customer}")
             return customer
         except Exception as e:
             print(f"  validate_token: Exception: {e}")
             return None
 
+    @staticmethod
+    def resolve_token(token: str) -> Optional[int]:
+        """
+        Resolve an authentication token to a customer ID.
+        Returns None if token is invalid or expired.
+        """
+        identity = AuthService.resolve_token_identity(token)
+        return identity.customer_id if identity else None
+
+    @staticmethod
+    def resolve_token_identity(token: str) -> Optional[RequestIdentity]:
+        """
+        Resolve an authentication token to a RequestIdentity.
+        Served from the in-process token cache when possible; a miss costs one
+        joined Customer + CustomerAuth SELECT, which also leaves the customer
+        in the session so loading it afterwards is free.
+        Returns None if token is invalid or expired.
+        """
+        if not token:
+            return None
+
+        if CustomerAuth.is_signed_token(token):
+            return AuthService.resolve_signed_token_identity(token)
+
+        entry = token_cache.get(token)
+        if entry is not None:
+            if not entry.is_active or datetime.utcnow() >= entry.expires_at:
+                return None
+            return RequestIdentity(entry.customer_id, 'token', token=token, token_expires_at=entry.expires_at)
+
+        customer, auth_record = AuthService._load_customer_with_auth(CustomerAuth.auth_token == token)
+        if not auth_record or not auth_record.token_expires_at:
+            return None
+
+        token_cache.put(token, auth_record.customer_id, auth_record.token_expires_at, auth_record.is_active)
+        if not auth_record.is_token_valid():
+            return None
+
+        return RequestIdentity.from_auth_record(auth_record, 'token', token)
+
+    @staticmethod
+    def resolve_signed_token(token: str) -> Optional[int]:
+        """
+        Resolve a signed token to a customer ID.
+        Returns None if token is invalid, expired or revoked.
+        """
+        identity = AuthService.resolve_signed_token_identity(token)
+        return identity.customer_id if identity else None
+
+    @staticmethod
+    def resolve_signed_token_identity(token: str) -> Optional[RequestIdentity]:
+        """
+        Resolve a signed token to a RequestIdentity. Signature and age are
+        verified locally; the revocation epoch comes from the epoch cache, so a
+        warm lookup costs no queries at all.
+        """
+        claims = CustomerAuth.load_signed_auth_token(
+            token,
+            current_app.config['SECRET_KEY'],
+            current_app.config.get('AUTH_TOKEN_EXPIRY_HOURS', 24 * 30) * 3600
+        )
+        if not claims:
+            return None
+
+        customer_id, token_epoch = claims
+        entry = epoch_cache.get(customer_id)
+        if entry is not None:
+            if not entry.is_active or entry.epoch != token_epoch:
+                return None
+            return RequestIdentity(customer_id, 'token', token=token)
+
+        customer, auth_record = AuthService._load_customer_with_auth(CustomerAuth.customer_id == customer_id)
+        if not auth_record:
+            return None
+
+        epoch_cache.put(customer_id, auth_record.token_epoch, auth_record.is_active)
+        if not auth_record.is_active or auth_record.token_epoch != token_epoch:
+            return None
+
+        return RequestIdentity.from_auth_record(auth_record, 'token', token)
+
+    @staticmethod
+    def get_epoch_cache_stats() -> dict:
+        """Return hit/miss counters of the signed token epoch cache"""
+        return epoch_cache.stats()
+
+    @staticmethod
+    def get_token_cache_stats() -> dict:
+        """Return hit/miss/eviction counters of the token validation cache"""
+        return token_cache.stats()
+
     @staticmethod
     def validate_auth_key(auth_key: str) -> Optional[Customer]:
         """
@@ -91,22 +368,95 @@ class AuthService:
 
         try:
             print(f"  validate_auth_key: Checking key: {auth_key}")
-            customer = CustomerAuth.get_customer_by_auth_key(auth_key)
+            customer = AuthService.get_identity_customer(AuthService.resolve_auth_key_identity(auth_key))
             print(f"  validate_auth_key: Customer found: {customer}")
             return customer
         except Exception as e:
             print(f"  validate_auth_key: Exception: {e}")
             return None
 
+    @staticmethod
+    def resolve_auth_key(auth_key: str) -> Optional[int]:
+        """
+        Resolve an authentication key to a customer ID.
+        Returns None if key is invalid.
+        """
+        identity = AuthService.resolve_auth_key_identity(auth_key)
+        return identity.customer_id if identity else None
+
+    @staticmethod
+    def resolve_auth_key_identity(auth_key: str) -> Optional[RequestIdentity]:
+        """
+        Resolve an authentication key to a RequestIdentity with one joined
+        Customer + CustomerAuth SELECT. Returns None if key is invalid.
+        """
+        if not auth_key or len(auth_key) != 16:
+            return None
+
+        customer, auth_record = AuthService._load_customer_with_auth(
+            CustomerAuth.auth_key == auth_key,
+            CustomerAuth.is_active == True
+        )
+        if not auth_record:
+            return None
+
+        return RequestIdentity.from_auth_record(auth_record, 'auth_key')
+
+    @staticmethod
+    def _load_customer_with_auth(*criteria) -> Tuple[Optional[Customer], Optional[CustomerAuth]]:
+        """Load a customer and its auth record with a single joined SELECT"""
+        row = db.session.query(Customer, CustomerAuth)\
+                        .join(CustomerAuth, CustomerAuth.customer_id == Customer.id)\
+                        .filter(*criteria)\
+                        .first()
+        if not row:
+            return None, None
+
+        # Hold a strong reference so the session identity map keeps the customer for this request
+        if has_request_context():
+            g.current_customer = row[0]
+        return row[0], row[1]
+
+    @staticmethod
+    def get_identity_customer(identity: Optional[RequestIdentity]) -> Optional[Customer]:
+        """
+        Load the Customer for an identity. Free when the identity was resolved
+        by a joined query in this session, one primary-key SELECT otherwise.
+        """
+        if not identity:
+            return None
+
+        if has_request_context():
+            customer = g.get('current_customer')
+            if customer is not None and customer.id == identity.customer_id:
+                return customer
+
+        customer = db.session.get(Customer, identity.customer_id)
+        if has_request_context():
+            g.current_customer = customer
+        return customer
+
     @staticmethod
     def refresh_token(customer: Customer) -> str:
         """
         Generate a new authentication token for an existing customer.
+        The previous token stops working, signed or opaque.
         """
         try:
             auth_record = CustomerAuth.get_or_create_for_customer(customer.id)
-            token = auth_record.create_auth_token()
+            signed = current_app.config.get('AUTH_SIGNED_TOKENS')
+            if signed:
+                # Retire the previous signed token; the new one carries the bumped epoch
+                auth_record.revoke_signed_tokens()
+                db.session.flush()
+                db.session.refresh(auth_record, ['token_epoch'])
+            token = AuthService.issue_token(auth_record)
+            identity = RequestIdentity.from_auth_record(auth_record, 'token', token)
             db.session.commit()
+            if signed:
+                epoch_cache.put(customer.id, auth_record.token_epoch, auth_record.is_active)
+            token_cache.invalidate_customer(customer.id)
+            AuthService.set_request_identity(identity)
             return token
         except Exception:
             db.session.rollback()
@@ -122,62 +472,101 @@ class AuthService:
             if auth_record:
                 auth_record.revoke_token()
                 db.session.commit()
+                epoch_cache.put(customer.id, auth_record.token_epoch, auth_record.is_active)
+            token_cache.invalidate_customer(customer.id)
+            AuthService.set_request_identity(None)
         except Exception:
             db.session.rollback()
             raise
 
     @staticmethod
-    def get_customer_from_request_headers(request) -> Optional[Customer]:
+    def _identity_from_headers(request) -> Optional[RequestIdentity]:
         """
-        Extract and validate customer from request headers.
-        Looks for 'Authorization' header with 'Bearer <token>' format
-        or 'X-Auth-Token' header with token directly.
+        Resolve identity from request headers.
+        Looks for 'Authorization' header with 'Bearer <token>' format,
+        'X-Auth-Token' header with token directly, or 'X-Auth-Key'.
         """
         # Try Authorization header first (Bearer token format)
         auth_header = request.headers.get('Authorization')
         if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ', 1)[1]
-            return AuthService.validate_token(token)
+            return AuthService.resolve_token_identity(auth_header.split(' ', 1)[1])
 
         # Try X-Auth-Token header
         token = request.headers.get('X-Auth-Token')
         if token:
-            return AuthService.validate_token(token)
+            return AuthService.resolve_token_identity(token)
 
         # Try auth_key from headers
         auth_key = request.headers.get('X-Auth-Key')
         if auth_key:
-            return AuthService.validate_auth_key(auth_key)
+            return AuthService.resolve_auth_key_identity(auth_key)
 
         return None
 
     @staticmethod
-    def get_customer_from_request_params(request) -> Optional[Customer]:
+    def _identity_from_params(request) -> Optional[RequestIdentity]:
         """
-        Extract and validate customer from request parameters.
+        Resolve identity from request parameters.
         Looks for 'token' or 'auth_key' parameters.
         """
         # Try token parameter
         token = request.args.get('token') or request.form.get('token')
         if token:
-            return AuthService.validate_token(token)
+            return AuthService.resolve_token_identity(token)
 
         # Try auth_key parameter
         auth_key = request.args.get('auth_key') or request.form.get('auth_key')
         if auth_key:
-            return AuthService.validate_auth_key(auth_key)
+            return AuthService.resolve_auth_key_identity(auth_key)
 
         return None
 
+    @staticmethod
+    def get_request_identity(request) -> Optional[RequestIdentity]:
+        """
+        Resolve the caller's identity once per request (headers first, then params)
+        and memoize it on flask.g. Costs at most one query per request.
+        """
+        if 'auth_identity' in g:
+            return g.auth_identity
+
+        # Try headers first (more secure), then fallback to parameters
+        identity = AuthService._identity_from_headers(request) or AuthService._identity_from_params(request)
+        g.auth_identity = identity
+        return identity
+
+    @staticmethod
+    def set_request_identity(identity: Optional[RequestIdentity]):
+        """Replace the memoized identity after a login, token refresh or logout"""
+        if has_request_context():
+            g.auth_identity = identity
+            g.pop('current_customer', None)
+
+    @staticmethod
+    def get_customer_from_request_headers(request) -> Optional[Customer]:
+        """
+        Extract and validate customer from request headers.
+        """
+        return AuthService.get_identity_customer(AuthService._identity_from_headers(request))
+
+    @staticmethod
+    def get_customer_from_request_params(request) -> Optional[Customer]:
+        """
+        Extract and validate customer from request parameters.
+        """
+        return AuthService.get_identity_customer(AuthService._identity_from_params(request))
+
+    @staticmethod
+    def get_customer_id_from_request(request) -> Optional[int]:
+        """
+        Resolve the authenticated customer ID from request without loading the Customer row.
+        """
+        identity = AuthService.get_request_identity(request)
+        return identity.customer_id if identity else None
+
     @staticmethod
     def get_customer_from_request(request) -> Optional[Customer]:
         """
         Extract and validate customer from request (headers first, then params).
         """
-        # Try headers first (more secure)
-        customer = AuthService.get_customer_from_request_headers(request)
-        if customer:
-            return customer
-
-        # Fallback to parameters (less secure but more convenient)
-        return AuthService.get_customer_from_request_params(request)
\ No newline at end of file
+        return AuthService.get_identity_customer(AuthService.get_request_identity(request))
@@ -0,0 +1,174 @@
+from typing import Dict, List
+from models.customer_db import Customer
+from models.customer_auth import CustomerAuth
+from models.appointment_db import Appointment
+from models.notification import Notification
+from models.notification_counter import NotificationCounter
+from models.archive import appointments_archive, notifications_archive
+from database import db
+from utils.normalization import normalize_email
+
+
+class CustomerMergeService:
+    """Service for finding and merging duplicate customer records"""
+
+    @staticmethod
+    def find_duplicate_groups(chunk_size: int = 1000) -> List[List[int]]:
+        """
+        Stream customers in primary-key order and group the IDs that share a
+        canonical phone or email. Only (id, phone, email) tuples are fetched,
+        chunk by chunk, and the only state kept is a hash index of
+        key -> first customer ID plus a union-find over IDs with duplicates.
+
+        Returns:
+            list: Groups of customer IDs, each sorted with the oldest customer first
+        """
+        first_id_by_key: Dict[tuple, int] = {}
+        parent: Dict[int, int] = {}
+
+        def find(customer_id):
+            root = customer_id
+            while parent.get(root, root) != root:
+                root = parent[root]
+            # Path compression
+            while customer_id != root:
+                next_id = parent[customer_id]
+                parent[customer_id] = root
+                customer_id = next_id
+            return root
+
+        def union(a, b):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                # The oldest customer always becomes the root
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+                parent.setdefault(min(root_a, root_b), min(root_a, root_b))
+
+        rows = db.session.query(Customer.id, Customer.phone_normalized, Customer.email_normalized)\
+                         .order_by(Customer.id)\
+                         .execution_options(yield_per=chunk_size)
+
+        for customer_id, phone_normalized, email_normalized in rows:
+            for key in (('phone', phone_normalized), ('email', email_normalized)):
+                if not key[1]:
+                    continue
+                first_id = first_id_by_key.setdefault(key, customer_id)
+                if first_id != customer_id:
+                    union(first_id, customer_id)
+
+        groups: Dict[int, List[int]] = {}
+        for customer_id in parent:
+            groups.setdefault(find(customer_id), []).append(customer_id)
+
+        return [sorted(group) for _, group in sorted(groups.items())]
+
+    @staticmethod
+    def merge_duplicates(dry_run: bool = True, chunk_size: int = 1000,
+                         groups_per_transaction: int = 100, sample_size: int = 50) -> dict:
+        """
+        Merge duplicate customers into the oldest record of each group.
+
+        Appointments, notifications and auth records are re-pointed with
+        set-based UPDATEs, blank survivor fields are filled from the duplicates,
+        and the duplicates are deleted. Work is committed every
+        `groups_per_transaction` groups so transactions stay bounded.
+
+        Args:
+            dry_run: Only report what would be merged
+            chunk_size: Rows fetched per chunk while scanning customers
+            groups_per_transaction: Groups merged per commit
+            sample_size: Number of groups listed in the report
+
+        Returns:
+            dict: Report with counts and a sample of the duplicate groups
+        """
+        groups = CustomerMergeService.find_duplicate_groups(chunk_size)
+
+        report = {
+            'dry_run': dry_run,
+            'duplicate_groups': len(groups),
+            'duplicate_customers': sum(len(group) - 1 for group in groups),
+            'merged_customers': 0,
+            'groups': [{'survivor_id': group[0], 'duplicate_ids': group[1:]} for group in groups[:sample_size]]
+        }
+
+        if dry_run or not groups:
+            return report
+
+        from services.auth_service import token_cache
+
+        try:
+            for start in range(0, len(groups), groups_per_transaction):
+                batch = groups[start:start + groups_per_transaction]
+                for group in batch:
+                    CustomerMergeService._merge_group(group[0], group[1:])
+                db.session.commit()
+
+                for group in batch:
+                    for duplicate_id in group[1:]:
+                        token_cache.invalidate_customer(duplicate_id)
+                report['merged_customers'] += sum(len(group) - 1 for group in batch)
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # With phone duplicates gone, atomic upserts can be enabled
+        from database import ensure_customer_phone_unique_index
+        ensure_customer_phone_unique_index()
+
+        return report
+
+    @staticmethod
+    def _merge_group(survivor_id: int, duplicate_ids: List[int]):
+        """Fold duplicate customers into the survivor. Does not commit."""
+        no_sync = {'synchronize_session': False}
+
+        # Fill blank survivor fields from the oldest duplicate that has them
+        rows = db.session.query(Customer.id, Customer.name, Customer.email, Customer.address)\
+                         .filter(Customer.id.in_([survivor_id] + duplicate_ids))\
+                         .order_by(Customer.id).all()
+        survivor = rows[0]
+        fills = {}
+        for field in ('name', 'email', 'address'):
+            if not getattr(survivor, field):
+                value = next((getattr(row, field) for row in rows[1:] if getattr(row, field)), None)
+                if value:
+                    fills[field] = value
+        if 'email' in fills:
+            fills['email_normalized'] = normalize_email(fills['email'])
+        if fills:
+            db.session.execute(
+                db.update(Customer).where(Customer.id == survivor_id).values(**fills),
+                execution_options=no_sync
+            )
+
+        # Re-point owned rows
+        for table in (Appointment.__table__, Notification.__table__, appointments_archive, notifications_archive):
+            db.session.execute(
+                db.update(table).where(table.c.customer_id.in_(duplicate_ids)).values(customer_id=survivor_id),
+                execution_options=no_sync
+            )
+        # Unread counters no longer match; they are re-seeded on next read
+        NotificationCounter.reset([survivor_id] + duplicate_ids)
+
+        # Keep the survivor's auth record, or adopt the most recently used duplicate one
+        has_auth = db.session.query(CustomerAuth.id).filter_by(customer_id=survivor_id).first()
+        if not has_auth:
+            adopted = db.session.query(CustomerAuth.id)\
+                                .filter(CustomerAuth.customer_id.in_(duplicate_ids))\
+                                .order_by(CustomerAuth.last_login.desc())\
+                                .first()
+            if adopted:
+                db.session.execute(
+                    db.update(CustomerAuth).where(CustomerAuth.id == adopted.id).values(customer_id=survivor_id),
+                    execution_options=no_sync
+                )
+        db.session.execute(
+            db.delete(CustomerAuth).where(CustomerAuth.customer_id.in_(duplicate_ids)),
+            execution_options=no_sync
+        )
+
+        db.session.execute(
+            db.delete(Customer).where(Customer.id.in_(duplicate_ids)),
+            execution_options=no_sync
+        )
@@ -0,0 +1,240 @@
+import time
+from threading import Event, Lock, Thread
+from flask import current_app
+from database import db
+from models.customer_db import Customer
+from models.service_db import Service
+from models.appointment_db import AppointmentStatus
+from models.notification import Notification, NotificationType
+from models.domain_event import DomainEvent
+from services.notification_hub import NotificationHubService
+from services.sms_outbox_service import SmsOutboxService
+
+
+def _appointment_message(status, service_name, appointment_date, appointment_time):
+    """(notification type, title, message, action text, action url) for an appointment's new status"""
+    if status == AppointmentStatus.CONFIRMED:
+        return (NotificationType.APPOINTMENT_CONFIRMED.value, "Appointment Confirmed",
+                f"Your {service_name} appointment scheduled for {appointment_date} at {appointment_time} has been confirmed.",
+                "View Appointment", "/dashboard")
+    if status == AppointmentStatus.COMPLETED:
+        return (NotificationType.SERVICE_COMPLETED.value, "Service Completed",
+                f"Your {service_name} service has been completed successfully.",
+                "View Details", "/dashboard")
+    if status == AppointmentStatus.CANCELLED:
+        return (NotificationType.SERVICE_CANCELLED.value, "Appointment Cancelled",
+                f"Your {service_name} appointment scheduled for {appointment_date} has been cancelled.",
+                "Book New Appointment", "/book-service")
+    if status == AppointmentStatus.PENDING:
+        return (NotificationType.SERVICE_SCHEDULED.value, "Service Scheduled",
+                f"Your {service_name} service has been scheduled for {appointment_date} at {appointment_time}.",
+                "View Details", "/dashboard")
+    if status == AppointmentStatus.RESCHEDULED:
+        return (NotificationType.SERVICE_SCHEDULED.value, "Appointment Rescheduled",
+                f"Your {service_name} appointment has been rescheduled to {appointment_date} at {appointment_time}.",
+                "View Details", "/dashboard")
+    # IN_PROGRESS or other statuses
+    return (NotificationType.SYSTEM_UPDATE.value, "Appointment Status Updated",
+            f"Your {service_name} appointment status has been updated to {status.value.replace('_', ' ').title()}.",
+            "View Details", "/dashboard")
+
+
+def handle_appointment_status_changed(event):
+    """
+    Notify the customer of an appointment status change: a notification,
+    plus an SMS for the statuses in APPOINTMENT_SMS_STATUSES. Does not commit.
+
+    Returns:
+        list: Callables to run once the dispatch has committed
+    """
+    data = event.data
+    status = AppointmentStatus(data['status'])
+    service = db.session.get(Service, data['service_id'])
+    notification_type, title, message, action_text, action_url = _appointment_message(
+        status, service.name if service else "Service", data['appointment_date'], data['appointment_time']
+    )
+
+    notification = Notification.create_notification(
+        customer_id=event.customer_id,
+        appointment_id=event.aggregate_id,
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        action_text=action_text,
+        action_url=action_url,
+        commit=False
+    )
+    after_commit = [lambda: NotificationHubService.publish(event.customer_id, {
+        'type': 'notification_created',
+        'notification': notification.to_dict(),
+        'unread_count': Notification.get_unread_count(event.customer_id),
+        'timestamp': time.time()
+    })]
+
+    if status.value in current_app.config.get('APPOINTMENT_SMS_STATUSES', ()):
+        phone = db.session.query(Customer.phone_normalized).filter(Customer.id == event.customer_id).scalar()
+        if phone:
+            SmsOutboxService.enqueue(phone, f"{current_app.config.get('APP_NAME', '')}: {message}", purpose='appointment')
+            after_commit.append(SmsOutboxService.notify_worker)
+
+    return after_commit
+
+
+# Event type -> handler(event) returning callables to run after the dispatch commits
+EVENT_HANDLERS = {
+    'appointment.status_changed': handle_appointment_status_changed
+}
+
+
+class DomainEventDispatcher:
+    """Background thread that turns outbox events into their side effects.
+
+    Each event is handled in its own transaction: the handler's writes and the
+    event's 'dispatched' state commit together, and pushes that cannot be
+    rolled back (SSE, waking the SMS worker) run only after that commit.
+    Claims are atomic, so several dispatchers can share the outbox.
+    """
+
+    def __init__(self, app, handlers=None, batch_size=100, poll_seconds=2.0, lease_seconds=60,
+                 base_backoff_seconds=5):
+        self.app = app
+        self.handlers = handlers or EVENT_HANDLERS
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.base_backoff_seconds = base_backoff_seconds
+
+        self.dispatched = 0
+        self.failed = 0
+        self._wake = Event()
+        self._stopping = Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, app):
+        """Create a dispatcher using the DOMAIN_EVENT_* settings"""
+        config = app.config
+        return cls(
+            app,
+            batch_size=config.get('DOMAIN_EVENT_BATCH_SIZE', 100),
+            poll_seconds=config.get('DOMAIN_EVENT_POLL_SECONDS', 2.0),
+            lease_seconds=config.get('DOMAIN_EVENT_LEASE_SECONDS', 60),
+            base_backoff_seconds=config.get('DOMAIN_EVENT_RETRY_BASE_SECONDS', 5)
+        )
+
+    def start(self):
+        """Start the dispatcher thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = Thread(target=self._run, name='domain-event-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the current batch"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Wake the dispatcher because new events were committed"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.drain_once()
+            except Exception as e:
+                processed = 0
+                self.app.logger.error(f"Domain event dispatcher error: {str(e)}")
+
+            # Keep going while there is a backlog, otherwise sleep until woken or the next poll
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def drain_once(self):
+        """
+        Claim one batch of due events and dispatch them in order. Must run
+        inside an app context.
+
+        Returns:
+            int: Number of events processed
+        """
+        events = DomainEvent.claim_batch(self.batch_size, self.lease_seconds)
+        for event in events:
+            self.dispatch(event)
+        return len(events)
+
+    def dispatch(self, event):
+        """Run one claimed event's handler and commit it with the event's new state"""
+        try:
+            handler = self.handlers.get(event.event_type)
+            if handler is None:
+                raise ValueError(f"No handler for event type {event.event_type}")
+            after_commit = handler(event) or []
+            if not DomainEvent.mark_dispatched(event.id, event.claim_token):
+                # Our lease expired and another dispatcher took the event over
+                db.session.rollback()
+                return False
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.error(f"Domain event {event.id} ({event.event_type}) failed: {str(e)}")
+            DomainEvent.mark_failed(event, str(e), base_backoff_seconds=self.base_backoff_seconds)
+            self.failed += 1
+            return False
+
+        self.dispatched += 1
+        for callback in after_commit:
+            try:
+                callback()
+            except Exception as e:
+                self.app.logger.error(f"Domain event {event.id} post-commit action failed: {str(e)}")
+        return True
+
+    def get_stats(self):
+        """Dispatch counters for this dispatcher"""
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'dispatched': self.dispatched,
+            'failed': self.failed
+        }
+
+
+_dispatcher = None
+_dispatcher_lock = Lock()
+
+
+class DomainEventService:
+    """Service for the domain event outbox"""
+
+    @staticmethod
+    def notify_dispatcher():
+        """Start this process's dispatcher on first use and wake it"""
+        global _dispatcher
+        app = current_app._get_current_object()
+        if not app.config.get('DOMAIN_EVENT_DISPATCHER_ENABLED', True):
+            return
+
+        if _dispatcher is None:
+            with _dispatcher_lock:
+                if _dispatcher is None:
+                    _dispatcher = DomainEventDispatcher.from_config(app)
+                    _dispatcher.start()
+        _dispatcher.notify()
+
+    @staticmethod
+    def get_dispatcher():
+        """This process's dispatcher, if started"""
+        return _dispatcher
+
+    @staticmethod
+    def get_stats():
+        """Outbox state counts plus this process's dispatcher counters"""
+        return {
+            'events': DomainEvent.get_status_counts(),
+            'dispatcher': _dispatcher.get_stats() if _dispatcher else None
+        }
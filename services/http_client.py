@@ -0,0 +1,187 @@
+import bisect
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from threading import Lock
+from flask import current_app
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of request latencies in milliseconds"""
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, elapsed_ms: float):
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+
+    def percentile(self, fraction: float):
+        """Upper bound of the bucket holding the given percentile (None if empty or beyond the last bucket)"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.BUCKETS_MS, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self) -> dict:
+        buckets = {f'le_{bound}': count for bound, count in zip(self.BUCKETS_MS, self.counts)}
+        buckets['le_inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 1) if self.count else None,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': buckets
+        }
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through once reset_seconds have passed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+
+    def allow_request(self) -> bool:
+        """Caller must hold the client lock"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+            return True
+        # Open, or half-open with the probe already in flight
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class OutboundClient:
+    """HTTP client for one external provider.
+
+    Keeps a keep-alive connection pool per host, applies the provider's
+    timeouts, fails fast through a circuit breaker and records latency and
+    error histograms.
+    """
+
+    def __init__(self, name: str, connect_timeout: float = 3, read_timeout: float = 10,
+                 failure_threshold: int = 5, reset_seconds: float = 30, pool_maxsize: int = 10):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.latency = LatencyHistogram()
+        self.errors = {}
+        self.rejected = 0
+        self._lock = Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request through the provider's pool.
+        Raises CircuitOpenError without calling the provider while its circuit is open.
+        Connection errors, timeouts, 5xx responses and any other exception
+        raised by the call count as failures, so a half-open probe always ends.
+        """
+        with self._lock:
+            if not self.breaker.allow_request():
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception as e:
+            self._record(started, type(e).__name__)
+            raise
+
+        self._record(started, f'http_{response.status_code}' if response.status_code >= 500 else None)
+        return response
+
+    def _record(self, started: float, error_kind):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.latency.observe(elapsed_ms)
+            if error_kind:
+                self.errors[error_kind] = self.errors.get(error_kind, 0) + 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'circuit': self.breaker.state,
+                'times_opened': self.breaker.times_opened,
+                'rejected': self.rejected,
+                'timeout': list(self.timeout),
+                'latency': self.latency.snapshot(),
+                'errors': dict(self.errors)
+            }
+
+
+_clients = {}
+_clients_lock = Lock()
+
+
+def get_http_client(name: str) -> OutboundClient:
+    """
+    Shared client for a provider, created on first use from
+    OUTBOUND_HTTP_DEFAULTS overridden by OUTBOUND_HTTP_PROVIDERS[name].
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                settings = dict(current_app.config.get('OUTBOUND_HTTP_DEFAULTS', {}))
+                settings.update(current_app.config.get('OUTBOUND_HTTP_PROVIDERS', {}).get(name, {}))
+                client = _clients[name] = OutboundClient(name, **settings)
+    return client
+
+
+def get_http_client_stats() -> dict:
+    """Breaker state, latency and error histograms for every provider used so far"""
+    return {name: client.get_stats() for name, client in list(_clients.items())}
@@ -0,0 +1,219 @@
+import time
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from models.customer_auth import CustomerAuth
+from models.notification import Notification
+from models.notification_counter import NotificationCounter
+from models.sms_outbox import SmsOutbox
+from models.domain_event import DomainEvent
+from models.pincode_cache import PincodeCache
+from models.maintenance_lease import MaintenanceLease
+from services.otp_store import get_otp_store
+from services.rate_limiter import RateLimiter
+from database import db
+
+
+def purge_expired_otps(config):
+    return get_otp_store().purge_expired(config.get('MAINTENANCE_CHUNK_SIZE', 1000))
+
+
+def clear_expired_tokens(config):
+    return CustomerAuth.clear_expired_tokens(config.get('MAINTENANCE_CHUNK_SIZE', 1000))
+
+
+def purge_read_notifications(config):
+    cutoff = datetime.utcnow() - timedelta(days=config.get('NOTIFICATION_RETENTION_DAYS', 90))
+    return Notification.purge_read_before(cutoff, config.get('MAINTENANCE_CHUNK_SIZE', 1000))
+
+
+def repair_notification_counters(config):
+    return NotificationCounter.repair(config.get('MAINTENANCE_CHUNK_SIZE', 1000))
+
+
+def archive_old_records(config):
+    from services.archive_service import ArchiveService
+    return sum(ArchiveService.archive_old_records().values())
+
+
+def purge_finished_sms(config):
+    cutoff = datetime.utcnow() - timedelta(days=config.get('SMS_OUTBOX_RETENTION_DAYS', 7))
+    return SmsOutbox.purge_finished_before(cutoff, config.get('MAINTENANCE_CHUNK_SIZE', 1000))
+
+
+def purge_finished_events(config):
+    cutoff = datetime.utcnow() - timedelta(days=config.get('DOMAIN_EVENT_RETENTION_DAYS', 7))
+    return DomainEvent.purge_finished_before(cutoff, config.get('MAINTENANCE_CHUNK_SIZE', 1000))
+
+
+def purge_pincode_cache(config):
+    return PincodeCache.purge_expired(config.get('MAINTENANCE_CHUNK_SIZE', 1000))
+
+
+def prune_rate_limits(config):
+    # A bucket idle for longer than the longest window has refilled, so dropping it changes nothing
+    idle_seconds = max(60, config.get('AUTH_ATTEMPT_WINDOW_SECONDS', 600))
+    return RateLimiter.prune(idle_seconds)
+
+
+# Job name -> (function, config key holding its interval in seconds)
+MAINTENANCE_JOBS = {
+    'expired_otps': (purge_expired_otps, 'MAINTENANCE_OTP_INTERVAL_SECONDS'),
+    'expired_tokens': (clear_expired_tokens, 'MAINTENANCE_TOKEN_INTERVAL_SECONDS'),
+    'read_notifications': (purge_read_notifications, 'MAINTENANCE_NOTIFICATION_INTERVAL_SECONDS'),
+    'notification_counters': (repair_notification_counters, 'MAINTENANCE_NOTIFICATION_COUNTER_INTERVAL_SECONDS'),
+    'archive': (archive_old_records, 'MAINTENANCE_ARCHIVE_INTERVAL_SECONDS'),
+    'finished_sms': (purge_finished_sms, 'MAINTENANCE_SMS_OUTBOX_INTERVAL_SECONDS'),
+    'domain_events': (purge_finished_events, 'MAINTENANCE_DOMAIN_EVENT_INTERVAL_SECONDS'),
+    'pincode_cache': (purge_pincode_cache, 'MAINTENANCE_PINCODE_CACHE_INTERVAL_SECONDS'),
+    'rate_limits': (prune_rate_limits, 'MAINTENANCE_RATE_LIMIT_INTERVAL_SECONDS')
+}
+
+
+class MaintenanceScheduler:
+    """Runs the cleanup jobs on their intervals from a background thread and keeps per-run metrics.
+
+    Every app process runs one, so each scheduled run first takes the job's
+    MaintenanceLease for one interval; runs whose lease is held elsewhere are
+    skipped and counted.
+    """
+
+    def __init__(self, app, jobs=None):
+        self.app = app
+        self.jobs = jobs or MAINTENANCE_JOBS
+        self.metrics = {name: {
+            'runs': 0,
+            'rows_total': 0,
+            'last_rows': None,
+            'last_duration_ms': None,
+            'last_run_at': None,
+            'last_error': None,
+            'errors': 0,
+            'skipped': 0
+        } for name in self.jobs}
+        self._next_run = {}
+        self._lock = Lock()
+        self._stopping = Event()
+        self._thread = None
+
+    @property
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        """Start the scheduler thread. Each job first runs one interval after start."""
+        if self.is_running:
+            return
+        now = time.monotonic()
+        for name, (_, interval_key) in self.jobs.items():
+            self._next_run[name] = now + self._interval(interval_key)
+        self._stopping.clear()
+        self._thread = Thread(target=self._run, name='maintenance-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _interval(self, interval_key):
+        return self.app.config.get(interval_key, 3600)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            now = time.monotonic()
+            for name, (_, interval_key) in self.jobs.items():
+                if now >= self._next_run[name]:
+                    if self._acquire(name, self._interval(interval_key)):
+                        self.run_job(name)
+                    self._next_run[name] = time.monotonic() + self._interval(interval_key)
+
+            # Sleep until the next job is due
+            self._stopping.wait(max(1.0, min(self._next_run.values()) - time.monotonic()))
+
+    def _acquire(self, name, lease_seconds):
+        """Take the job's lease for this process, counting a skip when another process holds it"""
+        with self.app.app_context():
+            try:
+                acquired = MaintenanceLease.try_acquire(name, lease_seconds)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Maintenance lease for {name} failed: {str(e)}")
+                acquired = False
+
+        if not acquired:
+            with self._lock:
+                self.metrics[name]['skipped'] += 1
+        return acquired
+
+    def run_job(self, name):
+        """Run one job now and record its metrics. Returns the number of rows affected (None on error)"""
+        if name not in self.jobs:
+            raise ValueError(f"Unknown maintenance job {name}; expected one of {', '.join(self.jobs)}")
+        function, _ = self.jobs[name]
+        started = time.perf_counter()
+        rows, error = None, None
+
+        with self.app.app_context():
+            try:
+                rows = function(self.app.config)
+            except Exception as e:
+                db.session.rollback()
+                error = str(e)
+                self.app.logger.error(f"Maintenance job {name} failed: {error}")
+
+        with self._lock:
+            metrics = self.metrics[name]
+            metrics['runs'] += 1
+            metrics['last_run_at'] = datetime.utcnow().isoformat()
+            metrics['last_duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            metrics['last_rows'] = rows
+            metrics['last_error'] = error
+            if error:
+                metrics['errors'] += 1
+            else:
+                metrics['rows_total'] += rows or 0
+        return rows
+
+    def run_all(self):
+        """Run every job now. Returns rows affected per job"""
+        return {name: self.run_job(name) for name in self.jobs}
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'running': self.is_running,
+                'jobs': {name: dict(metrics) for name, metrics in self.metrics.items()}
+            }
+
+
+_scheduler = None
+_scheduler_lock = Lock()
+
+
+class MaintenanceService:
+    """Service for the background maintenance scheduler"""
+
+    @staticmethod
+    def get_scheduler(app):
+        """This process's scheduler, created on first use"""
+        global _scheduler
+        if _scheduler is None:
+            with _scheduler_lock:
+                if _scheduler is None:
+                    _scheduler = MaintenanceScheduler(app)
+        return _scheduler
+
+    @staticmethod
+    def ensure_started(app):
+        """Start the scheduler unless disabled by MAINTENANCE_ENABLED"""
+        if not app.config.get('MAINTENANCE_ENABLED', True):
+            return
+        scheduler = MaintenanceService.get_scheduler(app)
+        if not scheduler.is_running:
+            with _scheduler_lock:
+                scheduler.start()
+
+    @staticmethod
+    def get_stats():
+        """Per-job metrics, or None when no scheduler exists in this process"""
+        return _scheduler.get_stats() if _scheduler else None
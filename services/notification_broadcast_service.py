@@ -0,0 +1,144 @@
+import time
+from datetime import datetime
+from typing import Optional
+from flask import current_app
+from database import db
+from models.customer_db import Customer
+from models.appointment_db import Appointment
+from models.service_db import Service
+from models.notification import Notification, NotificationType
+from models.notification_counter import NotificationCounter
+from services.notification_hub import NotificationHubService
+
+# Notification types that may be sent to a whole segment
+BROADCAST_TYPES = (NotificationType.SPECIAL_OFFER.value, NotificationType.SYSTEM_UPDATE.value)
+
+
+class NotificationBroadcastService:
+    """Service for sending one notification to all customers or a segment of them"""
+
+    @staticmethod
+    def segment_criteria(category: Optional[str] = None, pincode: Optional[str] = None,
+                         booked_after: Optional[datetime] = None, booked_before: Optional[datetime] = None) -> list:
+        """
+        WHERE criteria on Customer selecting a segment. With no arguments the
+        segment is every customer.
+
+        Args:
+            category: Customers who booked a service in this category
+            pincode: Customers whose address, or any appointment address, contains this PIN code
+            booked_after: Customers whose last booking was made on or after this time
+            booked_before: Customers whose last booking was made before this time
+        """
+        criteria = []
+        if category:
+            criteria.append(
+                db.select(Appointment.id)
+                  .join(Service, Service.id == Appointment.service_id)
+                  .where(Appointment.customer_id == Customer.id, Service.category == category)
+                  .exists()
+            )
+        if pincode:
+            pattern = f'%{pincode}%'
+            criteria.append(db.or_(
+                Customer.address.like(pattern),
+                db.select(Appointment.id)
+                  .where(Appointment.customer_id == Customer.id, Appointment.address.like(pattern))
+                  .exists()
+            ))
+        if booked_after or booked_before:
+            last_booking = db.select(db.func.max(Appointment.created_at))\
+                             .where(Appointment.customer_id == Customer.id)\
+                             .scalar_subquery()
+            if booked_after:
+                criteria.append(last_booking >= booked_after)
+            if booked_before:
+                criteria.append(last_booking < booked_before)
+        return criteria
+
+    @staticmethod
+    def count_recipients(**segment) -> int:
+        """Number of customers in a segment"""
+        criteria = NotificationBroadcastService.segment_criteria(**segment)
+        return db.session.query(db.func.count(Customer.id)).filter(*criteria).scalar()
+
+    @staticmethod
+    def broadcast(title: str, message: str, notification_type: str = NotificationType.SPECIAL_OFFER.value,
+                  action_text: Optional[str] = None, action_url: Optional[str] = None,
+                  chunk_size: Optional[int] = None, start_after_id: int = 0, **segment) -> dict:
+        """
+        Create one notification per customer in the segment.
+
+        Customers are walked in primary-key chunks. Each chunk is one batched
+        INSERT plus one counter UPDATE, committed together, followed by a
+        single SSE fan-out to the whole chunk: one notification_created delta
+        carrying the shared notification plus each recipient's notification
+        id and unread count, so open pages do not refetch. An interrupted broadcast can be
+        resumed with start_after_id set to the report's last_customer_id.
+
+        Returns:
+            dict: Recipients, chunks, last customer id and duration
+        """
+        if notification_type not in BROADCAST_TYPES:
+            raise ValueError(f"Notification type {notification_type} cannot be broadcast")
+
+        chunk_size = chunk_size or current_app.config.get('NOTIFICATION_BROADCAST_CHUNK_SIZE', 1000)
+        criteria = NotificationBroadcastService.segment_criteria(**segment)
+        started = time.perf_counter()
+        report = {'recipients': 0, 'chunks': 0, 'last_customer_id': start_after_id}
+        last_id = start_after_id
+
+        while True:
+            customer_ids = db.session.query(Customer.id)\
+                                     .filter(Customer.id > last_id, *criteria)\
+                                     .order_by(Customer.id)\
+                                     .limit(chunk_size).all()
+            customer_ids = [row.id for row in customer_ids]
+            if not customer_ids:
+                break
+
+            created_at = datetime.utcnow()
+            try:
+                # Core executemany: one prepared INSERT for the chunk, no per-row ORM work
+                inserted = db.session.execute(
+                    Notification.__table__.insert().returning(Notification.id, Notification.customer_id), [{
+                        'customer_id': customer_id,
+                        'notification_type': notification_type,
+                        'title': title,
+                        'message': message,
+                        'action_text': action_text,
+                        'action_url': action_url,
+                        'is_read': False,
+                        'created_at': created_at
+                    } for customer_id in customer_ids]
+                ).all()
+                NotificationCounter.adjust_many(customer_ids, 1)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            # One wakeup of the hub for the whole chunk; each recipient's id and count ride as an overlay
+            unread_counts = NotificationCounter.get_unread_counts(customer_ids)
+            NotificationHubService.publish_many(customer_ids, {
+                'type': 'notification_created',
+                'notification': Notification(
+                    notification_type=notification_type, title=title, message=message,
+                    action_text=action_text, action_url=action_url, is_read=False, created_at=created_at
+                ).to_dict(),
+                'timestamp': time.time()
+            }, overlays={row.customer_id: {
+                'notification': {'id': row.id, 'customer_id': row.customer_id},
+                'unread_count': unread_counts[row.customer_id]
+            } for row in inserted})
+
+            last_id = customer_ids[-1]
+            report['recipients'] += len(customer_ids)
+            report['chunks'] += 1
+            report['last_customer_id'] = last_id
+
+            if len(customer_ids) < chunk_size:
+                break
+
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        return report
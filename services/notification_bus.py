@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from threading import Lock
+from typing import Callable, Iterable, Optional
+
+# Keep every datagram well under the kernel's default socket buffer
+MAX_IDS_PER_MESSAGE = 2000
+MAX_OVERLAYS_PER_MESSAGE = 500
+
+
+class NotificationBus:
+    """Host-local pub/sub between the web workers and the notification hub.
+
+    Publishers send each event as one JSON datagram to a Unix domain socket;
+    the process running the hub binds that socket and fans the events out to
+    its streams. Datagrams are fire-and-forget, so publishing never blocks a
+    request and is a no-op while no hub is listening.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sent = 0
+        self.undelivered = 0
+        self._socket = None
+        self._lock = Lock()
+
+    @staticmethod
+    def is_supported() -> bool:
+        return hasattr(socket, 'AF_UNIX')
+
+    def _get_socket(self):
+        if self._socket is None:
+            with self._lock:
+                if self._socket is None:
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                    sock.setblocking(False)
+                    self._socket = sock
+        return self._socket
+
+    def publish(self, customer_ids: Iterable[int], event: dict, overlays: Optional[dict] = None) -> bool:
+        """
+        Send an event for the given customers to the hub, with optional
+        per-customer overlays (see NotificationHub.publish_many).
+
+        Returns:
+            bool: False if no hub is listening or its queue is full
+        """
+        customer_ids = list(customer_ids)
+        step = MAX_OVERLAYS_PER_MESSAGE if overlays else MAX_IDS_PER_MESSAGE
+        delivered = True
+        for start in range(0, len(customer_ids), step):
+            chunk = customer_ids[start:start + step]
+            payload = {'customer_ids': chunk, 'event': event}
+            if overlays:
+                # JSON object keys are strings, so overlays travel as a list aligned with the ids
+                payload['overlays'] = [overlays.get(customer_id) for customer_id in chunk]
+            message = json.dumps(payload)
+            try:
+                self._get_socket().sendto(message.encode('utf-8'), self.path)
+                self.sent += 1
+            except OSError:
+                # No hub bound to the socket (FileNotFoundError/ConnectionRefusedError) or its buffer is full
+                self.undelivered += 1
+                delivered = False
+        return delivered
+
+    async def subscribe(self, callback: Callable[[list, dict, Optional[dict]], None], logger=None):
+        """
+        Bind the bus socket on the running event loop and call
+        callback(customer_ids, event, overlays) for every message. Replaces a
+        socket left behind by a previous hub; only call this after winning the
+        hub's port. Malformed messages are reported to logger (the app's).
+        """
+        logger = logger or logging.getLogger(__name__)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        bus = self
+
+        class Subscriber(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                try:
+                    message = json.loads(data)
+                    overlays = message.get('overlays')
+                    if overlays is not None:
+                        overlays = dict(zip(message['customer_ids'], overlays))
+                    callback(message['customer_ids'], message['event'], overlays)
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error(f"Ignoring malformed notification bus message: {str(e)}")
+
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(Subscriber, local_addr=self.path, family=socket.AF_UNIX)
+        os.chmod(self.path, 0o660)
+        return transport
+
+    def get_stats(self) -> dict:
+        return {'path': self.path, 'sent': self.sent, 'undelivered': self.undelivered}
+
+
+_bus = None
+_bus_lock = Lock()
+
+
+def get_notification_bus(path: str):
+    """Shared publisher for the configured socket, or None where Unix sockets are unavailable"""
+    global _bus
+    if not NotificationBus.is_supported():
+        return None
+    if _bus is None or _bus.path != path:
+        with _bus_lock:
+            if _bus is None or _bus.path != path:
+                _bus = NotificationBus(path)
+    return _bus
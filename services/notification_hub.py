@@ -0,0 +1,535 @@
+import asyncio
+import json
+import resource
+import time
+from collections import OrderedDict, deque
+from threading import Event, Lock, Thread
+from typing import Callable, Iterable, Optional
+from urllib.parse import urlsplit, parse_qs
+from flask import current_app, request
+from services.notification_bus import get_notification_bus
+
+SSE_PATH = '/api/notifications/stream'
+
+
+def _apply_overlay(event: dict, overlay: dict) -> dict:
+    """A copy of event with one customer's fields applied, merging one level into dict fields"""
+    merged = dict(event)
+    for key, value in overlay.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+class SSEClient:
+    """One open event stream. Touched only from the hub's event loop."""
+
+    __slots__ = ('customer_id', 'writer', 'pending', 'wake', 'max_pending', 'closed')
+
+    def __init__(self, customer_id: int, writer: asyncio.StreamWriter, max_pending: int):
+        self.customer_id = customer_id
+        self.writer = writer
+        self.pending = OrderedDict()
+        self.wake = asyncio.Event()
+        self.max_pending = max_pending
+        self.closed = False
+
+    def push(self, event: dict) -> str:
+        """
+        Queue an event. Events with the same coalesce key replace the queued
+        one, so repeated pings collapse into one. When the queue is full the
+        backlog is replaced by a single 'resync' event telling the client to
+        reload instead of applying deltas.
+
+        Returns:
+            str: 'queued', 'coalesced' or 'dropped'
+        """
+        key = event.get('coalesce_key') or event.get('id') or event.get('type')
+        outcome = 'queued'
+        if key in self.pending:
+            outcome = 'coalesced'
+        elif len(self.pending) >= self.max_pending:
+            self.pending.clear()
+            self.pending['resync'] = {'type': 'resync'}
+            outcome = 'dropped'
+        self.pending[key] = event
+        self.wake.set()
+        return outcome
+
+    def close(self):
+        self.closed = True
+        self.wake.set()
+
+
+class ReplayBuffer:
+    """Recent events of one customer. floor is the newest id that fell out of the buffer."""
+
+    __slots__ = ('events', 'floor')
+
+    def __init__(self, size: int):
+        self.events = deque(maxlen=size)
+        self.floor = 0
+
+    def append(self, event: dict):
+        if len(self.events) == self.events.maxlen:
+            self.floor = self.events[0]['id']
+        self.events.append(event)
+
+
+class NotificationHub:
+    """asyncio server holding the notification event streams.
+
+    Every connection is a coroutine with a bounded coalescing queue instead of
+    a WSGI thread blocked on Queue.get, so one hub thread holds thousands of
+    idle streams. Connections are authenticated once with the app's
+    AuthService; each customer is capped at max_per_customer streams, the
+    oldest being closed when a new one arrives. With a bus_path the hub also
+    receives events published by the other worker processes on the host.
+
+    Published events get increasing ids and the last replay_size per customer
+    are kept, so a reconnecting client sending Last-Event-ID receives only the
+    events it missed, or a 'resync' event when they are no longer buffered.
+    """
+
+    def __init__(self, app, keepalive_seconds: float = 30, max_pending: int = 32,
+                 max_per_customer: int = 5, authenticate: Optional[Callable] = None,
+                 bus_path: Optional[str] = None, replay_size: int = 50, replay_customers: int = 10000):
+        self.app = app
+        self.keepalive_seconds = keepalive_seconds
+        self.max_pending = max_pending
+        self.max_per_customer = max_per_customer
+        self.authenticate = authenticate or self._authenticate_with_app
+        self.bus_path = bus_path
+        self.bus_transport = None
+        self.clients = {}
+        self.replay_size = replay_size
+        self.replay_customers = replay_customers
+        self.replay = OrderedDict()
+        # Ids start at the hub's start time in microseconds, so they keep increasing across restarts
+        self.first_event_id = self.last_event_id = time.time_ns() // 1000
+        self.replay_floor = self.first_event_id
+        self.loop = None
+        self.server = None
+        self.port = None
+        self.counters = {'connections_total': 0, 'published': 0, 'delivered': 0,
+                         'coalesced': 0, 'dropped': 0, 'evicted': 0, 'rejected': 0, 'bus_messages': 0,
+                         'replayed': 0, 'resyncs': 0}
+
+    # Publishing (thread-safe)
+
+    def publish(self, customer_id: int, event: dict):
+        """Send an event to every stream of one customer, from any thread"""
+        self.publish_many((customer_id,), event)
+
+    def publish_many(self, customer_ids: Iterable[int], event: dict, overlays: Optional[dict] = None):
+        """
+        Send one event to the streams of many customers with a single loop
+        wakeup. overlays optionally maps a customer id to the fields that
+        differ for that customer; dict fields are merged into the event's.
+        """
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._dispatch, tuple(customer_ids), event, overlays)
+
+    def _remember(self, customer_id, event):
+        buffer = self.replay.get(customer_id)
+        if buffer is None:
+            buffer = self.replay[customer_id] = ReplayBuffer(self.replay_size)
+            while len(self.replay) > self.replay_customers:
+                _, evicted = self.replay.popitem(last=False)
+                if evicted.events:
+                    self.replay_floor = max(self.replay_floor, evicted.events[-1]['id'])
+        else:
+            self.replay.move_to_end(customer_id)
+        buffer.append(event)
+
+    def _missed_events(self, customer_id, last_event_id: int) -> Optional[list]:
+        """Events after last_event_id, or None if some of them are no longer buffered"""
+        buffer = self.replay.get(customer_id)
+        if buffer is None:
+            return [] if last_event_id >= self.replay_floor else None
+        if last_event_id < max(buffer.floor, self.first_event_id):
+            return None
+        return [event for event in buffer.events if event['id'] > last_event_id]
+
+    def _dispatch_bus_message(self, customer_ids, event, overlays=None):
+        self.counters['bus_messages'] += 1
+        self._dispatch(customer_ids, event, overlays)
+
+    def _dispatch(self, customer_ids, event, overlays=None):
+        self.last_event_id += 1
+        event = dict(event, id=self.last_event_id)
+        for customer_id in customer_ids:
+            customer_event = event
+            if overlays and overlays.get(customer_id):
+                customer_event = _apply_overlay(event, overlays[customer_id])
+            self._remember(customer_id, customer_event)
+            for client in self.clients.get(customer_id, ()):
+                outcome = client.push(customer_event)
+                self.counters['published'] += 1
+                if outcome != 'queued':
+                    self.counters[outcome] += 1
+
+    # Serving
+
+    async def start(self, host: str, port: int, backlog: int = 2048):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle, host, port, backlog=backlog)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.bus_path:
+            # Subscribed only after winning the port, so a losing worker never steals the socket
+            bus = get_notification_bus(self.bus_path)
+            self.bus_transport = await bus.subscribe(self._dispatch_bus_message, logger=self.app.logger)
+        return self
+
+    def start_in_thread(self, host: str, port: int) -> 'NotificationHub':
+        """Run the hub on its own event loop in a daemon thread. Raises OSError if the port is taken."""
+        ready = Event()
+        errors = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start(host, port))
+            except Exception as e:
+                errors.append(e)
+                ready.set()
+                loop.close()
+                return
+            ready.set()
+            loop.run_forever()
+
+        Thread(target=run, name='notification-hub', daemon=True).start()
+        ready.wait()
+        if errors:
+            self.loop = None
+            raise errors[0]
+        return self
+
+    def stop(self):
+        """Close the listening socket and every open stream, then stop the hub's loop"""
+        if self.loop is None or self.loop.is_closed():
+            return
+
+        def shutdown():
+            self.server.close()
+            if self.bus_transport is not None:
+                self.bus_transport.close()
+            for streams in self.clients.values():
+                for client in streams:
+                    client.close()
+            self.loop.call_later(0.1, self.loop.stop)
+
+        self.loop.call_soon_threadsafe(shutdown)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = None
+        try:
+            method, target, headers = await asyncio.wait_for(self._read_request(reader), 10)
+            path = urlsplit(target).path
+
+            if method == 'OPTIONS':
+                await self._respond(writer, '204 No Content', b'')
+                return
+            if method != 'GET' or path != SSE_PATH:
+                await self._respond(writer, '404 Not Found', b'{"success": false, "message": "Not found"}')
+                return
+
+            customer_id = await self.loop.run_in_executor(None, self.authenticate, target, headers)
+            if not customer_id:
+                self.counters['rejected'] += 1
+                await self._respond(writer, '401 Unauthorized',
+                                    b'{"success": false, "message": "Authentication required", "error_code": "AUTH_REQUIRED"}')
+                return
+
+            # Registering and reading the replay buffer happen in one loop step,
+            # so every event is either replayed or queued live, never both or neither
+            client = self._register(customer_id, writer)
+            last_event_id = self._last_event_id(target, headers)
+            missed = self._missed_events(customer_id, last_event_id) if last_event_id is not None else []
+            # Replayed events advance the client's id themselves, in order
+            resume_from = last_event_id if missed else self.last_event_id
+            connected = {'type': 'connected', 'customer_id': customer_id, 'id': resume_from}
+
+            writer.write(b'HTTP/1.1 200 OK\r\n'
+                         b'Content-Type: text/event-stream\r\n'
+                         b'Cache-Control: no-cache\r\n'
+                         b'Connection: keep-alive\r\n'
+                         b'X-Accel-Buffering: no\r\n'
+                         b'Access-Control-Allow-Origin: *\r\n\r\n')
+            self._write_event(writer, connected)
+            if missed is None:
+                self.counters['resyncs'] += 1
+                self._write_event(writer, {'type': 'resync'})
+            else:
+                self.counters['replayed'] += len(missed)
+                for event in missed:
+                    self._write_event(writer, event)
+            await writer.drain()
+
+            await self._stream(client)
+
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except Exception as e:
+            self.app.logger.error(f"Notification hub connection error: {str(e)}")
+        finally:
+            if client is not None:
+                self._unregister(client)
+            writer.close()
+
+    def _last_event_id(self, target: str, headers: dict) -> Optional[int]:
+        """Last-Event-ID header sent by EventSource on reconnect, or the last_event_id query parameter"""
+        value = next((value for name, value in headers.items() if name.lower() == 'last-event-id'), None)
+        if value is None:
+            value = parse_qs(urlsplit(target).query).get('last_event_id', [None])[0]
+        try:
+            return int(value) if value else None
+        except ValueError:
+            return None
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        method, target, _ = request_line.split(' ', 2)
+        headers = {}
+        for _ in range(100):
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip()] = value.strip()
+        return method.upper(), target, headers
+
+    async def _respond(self, writer, status: str, body: bytes):
+        writer.write(f'HTTP/1.1 {status}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     f'Access-Control-Allow-Origin: *\r\n'
+                     f'Access-Control-Allow-Headers: Content-Type, Authorization, X-Auth-Token, X-Auth-Key, Last-Event-ID\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _stream(self, client: SSEClient):
+        writer = client.writer
+        while not client.closed:
+            try:
+                await asyncio.wait_for(client.wake.wait(), self.keepalive_seconds)
+            except asyncio.TimeoutError:
+                self._write_event(writer, {'type': 'keepalive', 'timestamp': time.time()})
+                await writer.drain()
+                continue
+
+            client.wake.clear()
+            while client.pending:
+                _, event = client.pending.popitem(last=False)
+                self._write_event(writer, event)
+                self.counters['delivered'] += 1
+            await writer.drain()
+
+    def _write_event(self, writer, event: dict):
+        payload = {key: value for key, value in event.items() if key != 'coalesce_key'}
+        lines = f"id: {event['id']}\n" if event.get('id') is not None else ''
+        writer.write(f"{lines}data: {json.dumps(payload)}\n\n".encode('utf-8'))
+
+    def _register(self, customer_id: int, writer) -> SSEClient:
+        streams = self.clients.setdefault(customer_id, deque())
+        # Enforce the per-customer cap by closing the oldest streams
+        while len(streams) >= self.max_per_customer:
+            streams.popleft().close()
+            self.counters['evicted'] += 1
+
+        client = SSEClient(customer_id, writer, self.max_pending)
+        streams.append(client)
+        self.counters['connections_total'] += 1
+        return client
+
+    def _unregister(self, client: SSEClient):
+        streams = self.clients.get(client.customer_id)
+        if streams is not None:
+            try:
+                streams.remove(client)
+            except ValueError:
+                pass
+            if not streams:
+                del self.clients[client.customer_id]
+
+    def _authenticate_with_app(self, target: str, headers: dict) -> Optional[int]:
+        """Resolve the customer from the token/auth key in the URL or headers (runs in a worker thread)"""
+        from services.auth_service import AuthService
+
+        with self.app.test_request_context(target, headers=headers):
+            identity = AuthService.get_request_identity(request)
+            return identity.customer_id if identity else None
+
+    def get_stats(self) -> dict:
+        """Connection and delivery counters (approximate when read from another thread)"""
+        return {
+            'port': self.port,
+            'customers': len(self.clients),
+            'connections': sum(len(streams) for streams in list(self.clients.values())),
+            'replay_customers': len(self.replay),
+            'last_event_id': self.last_event_id,
+            **self.counters
+        }
+
+
+_hub = None
+_hub_lock = Lock()
+
+
+class NotificationHubService:
+    """Service for starting the notification hub and publishing to it"""
+
+    @staticmethod
+    def create_hub(app, **overrides) -> NotificationHub:
+        config = app.config
+        settings = {
+            'keepalive_seconds': config.get('SSE_KEEPALIVE_SECONDS', 30),
+            'max_pending': config.get('SSE_CLIENT_QUEUE_SIZE', 32),
+            'max_per_customer': config.get('SSE_MAX_CONNECTIONS_PER_CUSTOMER', 5),
+            'replay_size': config.get('SSE_REPLAY_BUFFER_SIZE', 50),
+            'replay_customers': config.get('SSE_REPLAY_MAX_CUSTOMERS', 10000),
+            'bus_path': config.get('SSE_BUS_SOCKET') if get_notification_bus(config.get('SSE_BUS_SOCKET')) else None
+        }
+        settings.update(overrides)
+        return NotificationHub(app, **settings)
+
+    @staticmethod
+    def ensure_started():
+        """
+        Only in 'embedded' mode (single-process development), start the hub in
+        this process on first use. Otherwise the hub runs as its own process.
+        """
+        global _hub
+        app = current_app._get_current_object()
+        if _hub is not None or app.config.get('SSE_HUB_MODE', 'external') != 'embedded':
+            return _hub
+
+        with _hub_lock:
+            if _hub is None:
+                hub = NotificationHubService.create_hub(app)
+                try:
+                    _hub = hub.start_in_thread(app.config.get('SSE_HUB_HOST', '127.0.0.1'),
+                                               app.config.get('SSE_HUB_PORT', 5001))
+                except OSError as e:
+                    app.logger.info(f"Notification hub not started in this process: {str(e)}")
+        return _hub
+
+    @staticmethod
+    def set_hub(hub: Optional[NotificationHub]):
+        """Use a hub started elsewhere (CLI command) for publishing from this process"""
+        global _hub
+        _hub = hub
+
+    @staticmethod
+    def publish(customer_id: int, event: dict):
+        """Deliver an event to the customer's open streams, whichever process holds them"""
+        NotificationHubService.publish_many((customer_id,), event)
+
+    @staticmethod
+    def publish_many(customer_ids: Iterable[int], event: dict, overlays: Optional[dict] = None):
+        """Deliver one event, with optional per-customer overlays, to the open streams of many customers"""
+        if _hub is not None:
+            _hub.publish_many(customer_ids, event, overlays)
+            return
+
+        # The hub lives in another worker or in the notification-hub process
+        bus = get_notification_bus(current_app.config.get('SSE_BUS_SOCKET'))
+        if bus is not None:
+            bus.publish(customer_ids, event, overlays)
+
+    @staticmethod
+    def get_stream_url(query_string: str) -> Optional[str]:
+        """
+        URL to send this request's stream to: SSE_HUB_PUBLIC_URL, or the
+        embedded hub's port on this host. None when neither is configured,
+        i.e. the proxy should have routed the stream to the hub itself.
+        """
+        config = current_app.config
+        base = config.get('SSE_HUB_PUBLIC_URL')
+        if not base:
+            if config.get('SSE_HUB_MODE', 'external') != 'embedded':
+                return None
+            base = f"{request.scheme}://{request.host.split(':')[0]}:{config.get('SSE_HUB_PORT', 5001)}"
+        url = base.rstrip('/') + SSE_PATH
+        return f"{url}?{query_string}" if query_string else url
+
+    @staticmethod
+    def get_stats() -> dict:
+        """Hub counters if this process runs the hub, plus this process's bus publishing counters"""
+        bus = get_notification_bus(current_app.config.get('SSE_BUS_SOCKET'))
+        return {
+            'hub': _hub.get_stats() if _hub else None,
+            'bus': bus.get_stats() if bus else None
+        }
+
+    @staticmethod
+    def run_benchmark(app, clients: int = 1000, rounds: int = 5) -> dict:
+        """
+        Open `clients` local streams against a hub on an ephemeral port and
+        time connection setup and fan-out of one event to all of them.
+
+        Returns:
+            dict: Connection, latency and memory figures
+        """
+        # Both ends of every stream live in this process
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < clients * 2 + 100:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, clients * 2 + 100), hard))
+
+        def authenticate(target, headers):
+            return int(parse_qs(urlsplit(target).query)['cid'][0])
+
+        hub = NotificationHubService.create_hub(app, authenticate=authenticate, max_per_customer=1, bus_path=None)
+        hub.start_in_thread('127.0.0.1', 0)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        async def connect(customer_id):
+            reader, writer = await asyncio.open_connection('127.0.0.1', hub.port)
+            writer.write(f'GET {SSE_PATH}?cid={customer_id} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+            await reader.readuntil(b'\r\n\r\n')
+            await reader.readuntil(b'\n\n')  # 'connected' event
+            return reader, writer
+
+        async def run():
+            started = time.perf_counter()
+            streams = []
+            for offset in range(0, clients, 200):
+                streams.extend(await asyncio.gather(*(connect(customer_id)
+                                                      for customer_id in range(offset + 1, min(offset + 200, clients) + 1))))
+            connect_seconds = time.perf_counter() - started
+
+            fanout_ms = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                hub.publish_many(range(1, clients + 1), {'type': 'notification_update', 'timestamp': time.time()})
+                await asyncio.gather(*(reader.readuntil(b'\n\n') for reader, _ in streams))
+                fanout_ms.append((time.perf_counter() - started) * 1000)
+
+            for _, writer in streams:
+                writer.close()
+            return connect_seconds, fanout_ms
+
+        try:
+            connect_seconds, fanout_ms = asyncio.run(run())
+            stats = hub.get_stats()
+        finally:
+            hub.stop()
+
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {
+            'clients': clients,
+            'connected': stats['connections'],
+            'connect_seconds': round(connect_seconds, 3),
+            'fanout_ms': {
+                'min': round(min(fanout_ms), 1),
+                'max': round(max(fanout_ms), 1),
+                'avg': round(sum(fanout_ms) / len(fanout_ms), 1)
+            },
+            'delivered': stats['delivered'],
+            'rss_growth_kb': rss_after - rss_before,
+            'rss_per_stream_bytes': round((rss_after - rss_before) * 1024 / clients) if clients else None
+        }
@@ -1,7 +1,12 @@
-import requests
+from threading import Lock
 from flask import current_app
-from models.otp import OTP
-import re
+from database import db
+from services.sms_outbox_service import SmsOutboxService
+from services.otp_store import get_otp_store, generate_otp_code
+from utils.normalization import normalize_phone_number
+
+# Striped per-phone locks that single-flight concurrent sends within this process
+_send_locks = [Lock() for _ in range(64)]
 
 class OTPService:
     """Service for handling OTP operations with Fast2SMS"""
@@ -9,16 +14,7 @@ class OTPService:
     @staticmethod
     def normalize_phone_number(phone):
         """Normalize phone number to 10 digits without country code"""
-        # Remove all non-digit characters
-        phone = re.sub(r'\D', '', phone)
-
-        # Remove country code if present
-        if phone.startswith('91') and len(phone) == 12:
-            phone = phone[2:]
-        elif phone.startswith('+91') and len(phone) == 13:
-            phone = phone[3:]
-
-        return phone
+        return normalize_phone_number(phone)
 
     @staticmethod
     def validate_phone_number(phone):
@@ -28,7 +24,15 @@ class OTPService:
 
     @staticmethod
     def send_otp(phone_number):
-        """Send OTP to the given phone number"""
+        """
+        Create an OTP and queue its SMS in the outbox. Returns once both are
+        committed; delivery happens on the background outbox worker.
+
+        Repeated requests are coalesced: within OTP_SEND_COALESCE_SECONDS of
+        the last send nothing is written or sent, and after that the live code
+        is sent again instead of being replaced, so a late SMS still works.
+        Concurrent requests for the same phone are single-flighted.
+        """
         try:
             # Validate phone number
             if not OTPService.validate_phone_number(phone_number):
@@ -36,85 +40,51 @@ class OTPService:
 
             # Normalize phone number
             normalized_phone = OTPService.normalize_phone_number(phone_number)
+            config = current_app.config
 
-            # Check if it's the test number to save SMS credits
-            if normalized_phone == "9123187562":
-                # Create test OTP with fixed code
-                otp_record = OTP.create_new_otp(
+            with _send_locks[hash(normalized_phone) % len(_send_locks)]:
+                store = get_otp_store()
+                decision, otp_code = store.reserve_send(
                     normalized_phone,
-                    current_app.config.get('OTP_LENGTH', 6),
-                    current_app.config.get('OTP_EXPIRY_MINUTES', 10)
+                    config.get('OTP_SEND_COALESCE_SECONDS', 30),
+                    config.get('OTP_RESEND_MIN_REMAINING_SECONDS', 120),
+                    config.get('MAX_AUTH_ATTEMPTS', 5)
                 )
-                # Override with fixed test OTP
-                otp_record.otp_code = "123456"
-                from database import db
-                db.session.commit()
 
-                current_app.logger.info(f"Test OTP created for {normalized_phone}: 123456")
-                return True, f"OTP sent successfully to {normalized_phone}"
+                if decision == 'coalesced':
+                    db.session.rollback()
+                    return True, f"OTP already sent to {normalized_phone}"
 
-            # Create new OTP for real numbers
-            otp_record = OTP.create_new_otp(
-                normalized_phone,
-                current_app.config.get('OTP_LENGTH', 6),
-                current_app.config.get('OTP_EXPIRY_MINUTES', 10)
-            )
+                # Fixed code for the test number to save SMS credits
+                is_test_number = normalized_phone == "9123187562"
 
-            # Send OTP via Fast2SMS
-            success, message = OTPService._send_via_fast2sms(normalized_phone, otp_record.otp_code)
+                if decision == 'new':
+                    otp_code = "123456" if is_test_number else generate_otp_code(config.get('OTP_LENGTH', 6))
+                    store.issue(normalized_phone, otp_code, config.get('OTP_EXPIRY_MINUTES', 10))
 
-            if success:
-                return True, f"OTP sent successfully to {normalized_phone}"
-            else:
-                return False, f"Failed to send OTP: {message}"
+                if is_test_number:
+                    db.session.commit()
+                    current_app.logger.info(f"Test OTP created for {normalized_phone}: 123456")
+                    return True, f"OTP sent successfully to {normalized_phone}"
+
+                # Queue the SMS in the same transaction as the OTP, unless the same text is still waiting to go out
+                message = OTPService._build_otp_message(otp_code)
+                if not SmsOutboxService.has_pending(normalized_phone, message):
+                    SmsOutboxService.enqueue(normalized_phone, message)
+                db.session.commit()
+
+            SmsOutboxService.notify_worker()
+            return True, f"OTP sent successfully to {normalized_phone}"
 
         except Exception as e:
+            db.session.rollback()
             current_app.logger.error(f"Error sending OTP: {str(e)}")
             return False, f"Error sending OTP: {str(e)}"
 
     @staticmethod
-    def _send_via_fast2sms(phone_number, otp_code):
-        """Send OTP via Fast2SMS API using Quick SMS route"""
-        try:
-            url = "https://www.fast2sms.com/dev/bulkV2"
-
-            api_key = current_app.config.get('FAST2SMS_API_KEY')
-            if not api_key:
-                return False, "Fast2SMS API key not configured"
-
-            # Create OTP message
-            message = f"Your Om Engineers OTP is: {otp_code}. Valid for 2 minutes. Do not share with anyone."
-
-            payload = {
-                "authorization": api_key,
-                "route": "q",
-                "message": message,
-                "numbers": phone_number,
-                "flash": "0"
-            }
-
-            headers = {
-                'cache-control': "no-cache"
-            }
-
-            response = requests.get(url, headers=headers, params=payload, timeout=30)
-
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('return', False):
-                    return True, "OTP sent successfully"
-                else:
-                    error_msg = result.get('message', ['Unknown error'])[0]
-                    return False, error_msg
-            else:
-                return False, f"API request failed with status {response.status_code}"
-
-        except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Fast2SMS API error: {str(e)}")
-            return False, f"Network error: {str(e)}"
-        except Exception as e:
-            current_app.logger.error(f"Unexpected error in Fast2SMS: {str(e)}")
-            return False, f"Unexpected error: {str(e)}"
+    def _build_otp_message(otp_code):
+        """Text of the OTP SMS"""
+        return f"Your Om Engineers OTP is: {otp_code}. Valid for 2 minutes. Do not share with anyone."
 
     @staticmethod
     def verify_otp(phone_number, otp_code):
@@ -123,8 +93,12 @@ class OTPService:
             # Normalize phone number
             normalized_phone = OTPService.normalize_phone_number(phone_number)
 
-            # Verify OTP using the model
-            success, message = OTP.verify_otp(normalized_phone, otp_code)
+            # Count the attempt and check the code in one atomic store operation
+            success, message = get_otp_store().verify(
+                normalized_phone,
+                otp_code,
+                current_app.config.get('MAX_AUTH_ATTEMPTS', 5)
+            )
             return success, message
 
         except Exception as e:
@@ -140,7 +114,7 @@ class OTPService:
     def cleanup_expired_otps():
         """Clean up expired OTPs from database"""
         try:
-            count = OTP.cleanup_expired_otps()
+            count = get_otp_store().purge_expired()
             return True, f"Cleaned up {count} expired OTPs"
         except Exception as e:
             current_app.logger.error(f"Error cleaning up OTPs: {str(e)}")
@@ -151,10 +125,7 @@ class OTPService:
         """Get OTP status for debugging purposes"""
         try:
             normalized_phone = OTPService.normalize_phone_number(phone_number)
-            otp_record = OTP.query.filter_by(
-                phone_number=normalized_phone,
-                is_verified=False
-            ).first()
+            otp_record = get_otp_store().get(normalized_phone)
 
             if otp_record:
                 return True, otp_record.to_dict()
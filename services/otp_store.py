@@ -0,0 +1,233 @@
+import secrets
+from abc import ABC, abstractmethod
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import NamedTuple, Optional, Tuple
+from flask import current_app
+from models.otp import OTP
+
+
+class OTPRecord(NamedTuple):
+    """Backend-independent view of an issued OTP"""
+    phone_number: str
+    otp_code: str
+    created_at: datetime
+    expires_at: datetime
+    attempts: int = 0
+    is_verified: bool = False
+
+    def is_expired(self) -> bool:
+        return datetime.utcnow() > self.expires_at
+
+    def to_dict(self) -> dict:
+        return {
+            'phone_number': self.phone_number,
+            'created_at': self.created_at.isoformat(),
+            'expires_at': self.expires_at.isoformat(),
+            'is_verified': self.is_verified,
+            'attempts': self.attempts,
+            'is_expired': self.is_expired()
+        }
+
+
+class OTPStore(ABC):
+    """Interface for storing OTPs. OTPService only talks to this."""
+
+    @abstractmethod
+    def issue(self, phone_number: str, otp_code: str, expiry_minutes: int) -> OTPRecord:
+        """Replace any OTP for the phone number with a new one"""
+
+    @abstractmethod
+    def verify(self, phone_number: str, otp_code: str, max_attempts: int = 5) -> Tuple[bool, str]:
+        """Count one attempt and check the code atomically. Returns (success, message)"""
+
+    @abstractmethod
+    def reserve_send(self, phone_number: str, coalesce_seconds: int, min_remaining_seconds: int,
+                     max_attempts: int = 5) -> Tuple[str, Optional[str]]:
+        """
+        Atomically decide how to serve a send request for the phone number.
+        Returns ('reuse', otp_code) when the live code should be sent again
+        (its send time is updated), ('coalesced', None) when it was sent less
+        than coalesce_seconds ago, or ('new', None) when there is no live code
+        with min_remaining_seconds left and attempts to spare.
+        """
+
+    @abstractmethod
+    def get(self, phone_number: str) -> Optional[OTPRecord]:
+        """Current unverified OTP for the phone number, if any"""
+
+    @abstractmethod
+    def purge_expired(self, chunk_size: int = 1000) -> int:
+        """Remove expired OTPs. Returns how many were removed"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored OTPs"""
+
+
+class DatabaseOTPStore(OTPStore):
+    """OTPs in the `otps` table.
+
+    issue() joins the caller's transaction (the OTP and its SMS outbox entry
+    commit together); verify() is a single conditional UPDATE.
+    """
+
+    def issue(self, phone_number, otp_code, expiry_minutes):
+        otp = OTP.create_new_otp(phone_number, len(otp_code), expiry_minutes, commit=False)
+        otp.otp_code = otp_code
+        return _to_record(otp)
+
+    def verify(self, phone_number, otp_code, max_attempts=5):
+        return OTP.verify_otp(phone_number, otp_code, max_attempts)
+
+    def reserve_send(self, phone_number, coalesce_seconds, min_remaining_seconds, max_attempts=5):
+        return OTP.reserve_send(phone_number, coalesce_seconds, min_remaining_seconds, max_attempts)
+
+    def get(self, phone_number):
+        otp = OTP.query.filter_by(phone_number=phone_number, is_verified=False).first()
+        return _to_record(otp) if otp else None
+
+    def purge_expired(self, chunk_size=1000):
+        return OTP.cleanup_expired_otps(chunk_size)
+
+    def count(self):
+        return OTP.query.count()
+
+
+def _to_record(otp: OTP) -> OTPRecord:
+    return OTPRecord(otp.phone_number, otp.otp_code, otp.created_at, otp.expires_at,
+                     otp.attempts or 0, bool(otp.is_verified))
+
+
+class _MemoryEntry:
+    __slots__ = ('record', 'expires_ts', 'sent_ts', 'attempts', 'verified')
+
+    def __init__(self, record: OTPRecord, expires_ts: float, sent_ts: float):
+        self.record = record
+        self.expires_ts = expires_ts
+        self.sent_ts = sent_ts
+        self.attempts = 0
+        self.verified = False
+
+
+class MemoryOTPStore(OTPStore):
+    """OTPs in process memory, expired through a timing wheel.
+
+    Nothing touches the database. Phone numbers are bucketed into wheel slots
+    by expiry time; every call advances the wheel and drops the due entries in
+    the slots it passes, so expiry never scans the whole map. Attempts are
+    counted under a lock. Only suitable when a single process serves all OTP
+    requests.
+    """
+
+    def __init__(self, slot_seconds: int = 10, slots: int = 64):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self._wheel = [set() for _ in range(slots)]
+        self._entries = {}
+        self._cursor_tick = int(time.time() // slot_seconds)
+        self._lock = Lock()
+
+    def _advance(self, now: float) -> int:
+        """Expire due entries in every slot passed since the last call. Caller must hold the lock."""
+        removed = 0
+        current_tick = int(now // self.slot_seconds)
+        # One revolution visits every slot, so never walk further than that
+        for tick in range(max(self._cursor_tick, current_tick - self.slots + 1), current_tick + 1):
+            slot = self._wheel[tick % self.slots]
+            for phone_number in list(slot):
+                entry = self._entries.get(phone_number)
+                if entry is not None and entry.expires_ts > now:
+                    # Not due yet: expires on a later revolution, or was reissued into another slot
+                    continue
+                slot.discard(phone_number)
+                if entry is not None:
+                    del self._entries[phone_number]
+                    removed += 1
+        self._cursor_tick = current_tick
+        return removed
+
+    def issue(self, phone_number, otp_code, expiry_minutes):
+        created_at = datetime.utcnow()
+        record = OTPRecord(phone_number, otp_code, created_at, created_at + timedelta(minutes=expiry_minutes))
+
+        with self._lock:
+            now = time.time()
+            self._advance(now)
+            entry = _MemoryEntry(record, now + expiry_minutes * 60, now)
+            self._entries[phone_number] = entry
+            self._wheel[int(entry.expires_ts // self.slot_seconds) % self.slots].add(phone_number)
+        return record
+
+    def verify(self, phone_number, otp_code, max_attempts=5):
+        with self._lock:
+            now = time.time()
+            self._advance(now)
+            entry = self._entries.get(phone_number)
+
+            if entry is None or entry.verified:
+                return False, "OTP not found or already verified"
+            if now > entry.expires_ts:
+                return False, "OTP has expired"
+            if entry.attempts >= max_attempts:
+                return False, "Too many invalid attempts"
+
+            entry.attempts += 1
+            if entry.record.otp_code == otp_code:
+                entry.verified = True
+                return True, "OTP verified successfully"
+            return False, "Invalid OTP code"
+
+    def reserve_send(self, phone_number, coalesce_seconds, min_remaining_seconds, max_attempts=5):
+        with self._lock:
+            now = time.time()
+            self._advance(now)
+            entry = self._entries.get(phone_number)
+
+            if (entry is None or entry.verified or entry.attempts >= max_attempts
+                    or entry.expires_ts < now + min_remaining_seconds):
+                return 'new', None
+            if now - entry.sent_ts < coalesce_seconds:
+                return 'coalesced', None
+
+            entry.sent_ts = now
+            return 'reuse', entry.record.otp_code
+
+    def get(self, phone_number):
+        with self._lock:
+            self._advance(time.time())
+            entry = self._entries.get(phone_number)
+            if entry is None or entry.verified:
+                return None
+            return entry.record._replace(attempts=entry.attempts)
+
+    def purge_expired(self, chunk_size=1000):
+        with self._lock:
+            return self._advance(time.time())
+
+    def count(self):
+        with self._lock:
+            return len(self._entries)
+
+
+def generate_otp_code(length: int = 6) -> str:
+    """Random numeric OTP"""
+    return ''.join(secrets.choice('0123456789') for _ in range(length))
+
+
+_store = None
+_store_lock = Lock()
+
+
+def get_otp_store() -> OTPStore:
+    """The OTP store selected by OTP_STORE_BACKEND ('database' or 'memory')"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if current_app.config.get('OTP_STORE_BACKEND', 'database') == 'memory':
+                    _store = MemoryOTPStore()
+                else:
+                    _store = DatabaseOTPStore()
+    return _store
@@ -0,0 +1,155 @@
+import csv
+import mmap
+import os
+import struct
+from threading import Lock
+from typing import Optional
+
+
+class PincodeDataset:
+    """Read-only pincode directory compiled into a compact sorted binary file.
+
+    Layout (little-endian):
+        header   b'PIN1', record count (uint32), string table offset (uint32)
+        records  count x (pincode, city, state, area) as uint32s, sorted by pincode;
+                 city/state/area are offsets into the string table
+        strings  deduplicated UTF-8 strings, each prefixed with a uint16 length
+
+    The file is memory-mapped on first use and searched with a binary search,
+    so a lookup is O(log n) and nothing is parsed up front.
+    """
+
+    MAGIC = b'PIN1'
+    HEADER = struct.Struct('<4sII')
+    RECORD = struct.Struct('<IIII')
+    LENGTH = struct.Struct('<H')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map = None
+        self._count = 0
+        self._strings_offset = 0
+        self._unavailable = False
+        self._lock = Lock()
+
+    def _open(self) -> bool:
+        """Map the file on first use. Returns False if there is no usable dataset."""
+        if self._map is not None:
+            return True
+        if self._unavailable:
+            return False
+
+        with self._lock:
+            if self._map is not None:
+                return True
+            try:
+                with open(self.path, 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, count, strings_offset = self.HEADER.unpack_from(mapped, 0)
+                if magic != self.MAGIC:
+                    mapped.close()
+                    raise ValueError(f"{self.path} is not a pincode dataset")
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Offline pincode dataset unavailable, using online providers only: {e}")
+                self._unavailable = True
+                return False
+
+            self._count = count
+            self._strings_offset = strings_offset
+            self._map = mapped
+            return True
+
+    def _string(self, offset: int) -> str:
+        position = self._strings_offset + offset
+        (length,) = self.LENGTH.unpack_from(self._map, position)
+        start = position + self.LENGTH.size
+        return self._map[start:start + length].decode('utf-8')
+
+    def lookup(self, pincode) -> Optional[dict]:
+        """Return {'city', 'state', 'area'} for a 6-digit pincode, or None if unknown"""
+        if not self._open():
+            return None
+
+        target = int(pincode)
+        low, high = 0, self._count - 1
+        base = self.HEADER.size
+        while low <= high:
+            middle = (low + high) // 2
+            code, city, state, area = self.RECORD.unpack_from(self._map, base + middle * self.RECORD.size)
+            if code < target:
+                low = middle + 1
+            elif code > target:
+                high = middle - 1
+            else:
+                return {'city': self._string(city), 'state': self._string(state), 'area': self._string(area)}
+        return None
+
+    def __len__(self):
+        return self._count if self._open() else 0
+
+    @classmethod
+    def compile_csv(cls, source_path: str, output_path: str) -> int:
+        """
+        Compile the All India Pincode Directory CSV published on data.gov.in
+        (columns include officename, pincode, delivery, district, statename)
+        into the binary format. One post office is kept per pincode,
+        preferring delivery offices, as the online providers do.
+
+        Returns:
+            int: Number of pincodes written
+        """
+        entries = {}
+        with open(source_path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+                pincode = row.get('pincode', '')
+                if not (pincode.isdigit() and len(pincode) == 6):
+                    continue
+
+                is_delivery = row.get('delivery', row.get('deliverystatus', '')).lower() == 'delivery'
+                current = entries.get(pincode)
+                if current is None or (is_delivery and not current[0]):
+                    entries[pincode] = (
+                        is_delivery,
+                        row.get('district', '').title(),
+                        row.get('statename', row.get('state', '')).title(),
+                        row.get('officename', '')
+                    )
+
+        strings = bytearray()
+        string_offsets = {}
+
+        def intern(value):
+            if value not in string_offsets:
+                encoded = value.encode('utf-8')[:0xFFFF]
+                string_offsets[value] = len(strings)
+                strings.extend(cls.LENGTH.pack(len(encoded)))
+                strings.extend(encoded)
+            return string_offsets[value]
+
+        records = bytearray()
+        for pincode in sorted(entries, key=int):
+            _, city, state, area = entries[pincode]
+            records.extend(cls.RECORD.pack(int(pincode), intern(city), intern(state), intern(area)))
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        temporary_path = f"{output_path}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(entries), cls.HEADER.size + len(records)))
+            f.write(records)
+            f.write(strings)
+        os.replace(temporary_path, output_path)
+        return len(entries)
+
+
+_datasets = {}
+_datasets_lock = Lock()
+
+
+def get_pincode_dataset(path: str) -> PincodeDataset:
+    """Shared dataset for a file path, mapped lazily on first lookup"""
+    dataset = _datasets.get(path)
+    if dataset is None:
+        with _datasets_lock:
+            dataset = _datasets.setdefault(path, PincodeDataset(path))
+    return dataset
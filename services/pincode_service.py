@@ -0,0 +1,243 @@
+import time
+import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from typing import Optional
+from flask import current_app
+from models.pincode_cache import PincodeCache
+from services.http_client import get_http_client
+from services.pincode_dataset import get_pincode_dataset
+
+
+class PincodeLRUCache:
+    """In-process LRU of pincode results (None for 'not found') with per-entry expiry"""
+
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pincode: str):
+        """Return (found, location) or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(pincode)
+            if entry is None or entry[2] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[pincode]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(pincode)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, pincode: str, found: bool, location: Optional[dict], ttl_seconds: float):
+        with self._lock:
+            self._entries[pincode] = (found, location, time.monotonic() + ttl_seconds)
+            self._entries.move_to_end(pincode)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+_memory_cache = None
+_executor = None
+_setup_lock = Lock()
+
+
+def _get_memory_cache() -> PincodeLRUCache:
+    global _memory_cache
+    if _memory_cache is None:
+        with _setup_lock:
+            if _memory_cache is None:
+                _memory_cache = PincodeLRUCache(current_app.config.get('PINCODE_CACHE_SIZE', 5000))
+    return _memory_cache
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _setup_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('PINCODE_LOOKUP_THREADS', 8),
+                    thread_name_prefix='pincode'
+                )
+    return _executor
+
+
+class PincodeService:
+    """Service for resolving Indian PIN codes to city, state and area"""
+
+    @staticmethod
+    def lookup(pincode: str) -> Optional[dict]:
+        """
+        Resolve a 6-digit PIN code from the bundled offline dataset, then the
+        in-process LRU, then the persistent cache table, and only then the
+        external providers. Online answers, including 'not found', are cached
+        in both tiers.
+
+        Returns:
+            dict: At least 'city', 'state' and 'area', or None if not found
+        """
+        config = current_app.config
+        dataset = get_pincode_dataset(config['PINCODE_DATASET_PATH'])
+        location = dataset.lookup(pincode)
+        if location:
+            return location
+
+        memory_cache = _get_memory_cache()
+        cached = memory_cache.get(pincode)
+        if cached is not None:
+            return cached[1]
+
+        cached = PincodeCache.get_fresh(pincode)
+        if cached is not None:
+            found, location = cached
+            memory_cache.put(pincode, found, location, config.get('PINCODE_MEMORY_CACHE_TTL_SECONDS', 3600))
+            return location
+
+        found, location, definitive = PincodeService.lookup_online(pincode)
+        if found or definitive:
+            # Transport failures are not cached, so a provider outage doesn't pin 'not found'
+            ttl = config.get('PINCODE_CACHE_TTL_SECONDS' if found else 'PINCODE_NEGATIVE_CACHE_TTL_SECONDS', 86400)
+            PincodeCache.store(pincode, location, ttl)
+            memory_cache.put(pincode, found, location,
+                             min(ttl, config.get('PINCODE_MEMORY_CACHE_TTL_SECONDS', 3600)))
+        return location
+
+    @staticmethod
+    def get_cache_stats() -> dict:
+        """In-process cache counters"""
+        return _memory_cache.stats() if _memory_cache else None
+
+    @staticmethod
+    def get_provider_urls(pincode: str) -> list:
+        """External providers in order of preference, starting with government data"""
+        return [
+            {
+                'url': f'https://api.data.gov.in/catalog/709e9d78-bf11-487d-93fd-d547d24cc0ef?api-key=579b464db66ec23bdd0000015c26426692c446bb66a7696808147718&format=json&filters%5Bpincode%5D={pincode}',
+                'type': 'gov_data'
+            },
+            {
+                'url': f'https://api.postalpincode.in/pincode/{pincode}',
+                'type': 'new_format'
+            },
+            {
+                'url': f'http://www.postalpincode.in/api/pincode/{pincode}',
+                'type': 'old_format'
+            },
+            {
+                'url': f'https://api.zippopotam.us/IN/{pincode}',
+                'type': 'zippopotam'
+            }
+        ]
+
+    @staticmethod
+    def lookup_online(pincode: str):
+        """
+        Query every provider concurrently and take the first valid answer.
+        Providers still running when an answer arrives are abandoned; queued
+        ones are cancelled. Waits at most PINCODE_LOOKUP_TIMEOUT_SECONDS.
+
+        Returns:
+            tuple: (found, location, definitive) - definitive is True when every
+                   provider answered, so a 'not found' can be trusted
+        """
+        app = current_app._get_current_object()
+
+        def query(api_call):
+            with app.app_context():
+                return PincodeService.query_provider(api_call['type'], api_call['url'])
+
+        executor = _get_executor()
+        pending = {executor.submit(query, api_call) for api_call in PincodeService.get_provider_urls(pincode)}
+        deadline = time.monotonic() + app.config.get('PINCODE_LOOKUP_TIMEOUT_SECONDS', 4)
+        failures = 0
+
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        location = future.result()
+                    except Exception:
+                        # Transport error, open circuit or malformed response
+                        failures += 1
+                        continue
+                    if location:
+                        return True, location, True
+        finally:
+            for future in pending:
+                future.cancel()
+
+        return False, None, not pending and failures == 0
+
+    @staticmethod
+    def query_provider(api_type: str, api_url: str) -> Optional[dict]:
+        """
+        Query one provider and parse its response format.
+        Raises requests exceptions (including CircuitOpenError) on transport failures.
+        """
+        # Pooled client with per-provider timeouts; raises CircuitOpenError while a provider is down
+        response = get_http_client(f'pincode_{api_type}').get(api_url)
+        if response.status_code >= 500:
+            raise requests.exceptions.HTTPError(f"{api_type} returned {response.status_code}", response=response)
+        if response.status_code != 200:
+            return None
+
+        data = response.json()
+
+        if api_type == 'gov_data':
+            # Government data.gov.in API format
+            if 'records' in data and len(data['records']) > 0:
+                location = data['records'][0]
+                return {
+                    'city': location.get('district', ''),
+                    'state': location.get('statename', ''),
+                    'area': location.get('officename', ''),
+                    'circle': location.get('circlename', ''),
+                    'region': location.get('regionname', '')
+                }
+
+        elif api_type == 'new_format':
+            # New postalpincode.in API format (array)
+            if isinstance(data, list) and len(data) > 0:
+                post_office_data = data[0]
+                if post_office_data.get('Status') == 'Success' and post_office_data.get('PostOffice'):
+                    location = post_office_data['PostOffice'][0]
+                    return {
+                        'city': location.get('District', ''),
+                        'state': location.get('State', ''),
+                        'area': location.get('Name', '')
+                    }
+
+        elif api_type == 'old_format':
+            # Old postalpincode.in API format (object)
+            if data.get('Status') == 'Success' and data.get('PostOffice'):
+                location = data['PostOffice'][0]
+                return {
+                    'city': location.get('District', ''),
+                    'state': location.get('State', ''),
+                    'area': location.get('Name', '')
+                }
+
+        elif api_type == 'zippopotam':
+            # Zippopotam.us API format
+            if 'places' in data and len(data['places']) > 0:
+                location = data['places'][0]
+                return {
+                    'city': location.get('place name', ''),
+                    'state': location.get('state', ''),
+                    'area': location.get('place name', '')
+                }
+
+        return None
@@ -0,0 +1,150 @@
+import math
+import sqlite3
+import time
+from threading import Lock, local
+from typing import Optional, Tuple
+from flask import current_app
+
+
+class MemoryRateLimitBackend:
+    """Token buckets held in this process only"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = Lock()
+
+    def consume(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        """Take one token from a bucket. Returns (allowed, retry_after_seconds)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, capacity, refill_per_second)
+
+        return allowed, 0.0 if allowed else (1 - tokens) / refill_per_second
+
+    def prune(self, older_than_seconds: float) -> int:
+        """Delete buckets that have not been touched for a while"""
+        cutoff = time.monotonic() - older_than_seconds
+        with self._lock:
+            stale = [key for key, (_, updated) in self._buckets.items() if updated < cutoff]
+            for key in stale:
+                del self._buckets[key]
+        return len(stale)
+
+    def _prune(self, now: float, capacity: int, refill_per_second: float):
+        """Drop buckets that have refilled completely. Caller must hold the lock."""
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * refill_per_second >= capacity:
+                del self._buckets[key]
+
+
+class SQLiteRateLimitBackend:
+    """Token buckets in a small SQLite file shared by every worker process on the host.
+
+    Each check is one atomic INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+    statement, so concurrent workers never lose updates.
+    """
+
+    CONSUME_SQL = """
+        INSERT INTO rate_limit_buckets (key, tokens, updated, allowed)
+        VALUES (:key, :capacity - 1, :now, 1)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = MIN(:capacity, tokens + (:now - updated) * :rate)
+                     - (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1),
+            allowed = MIN(:capacity, tokens + (:now - updated) * :rate) >= 1,
+            updated = :now
+        RETURNING allowed, tokens
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One autocommit connection per thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def consume(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        """Take one token from a bucket. Returns (allowed, retry_after_seconds)"""
+        allowed, tokens = self._connection().execute(self.CONSUME_SQL, {
+            'key': key,
+            'capacity': capacity,
+            'rate': refill_per_second,
+            'now': time.time()
+        }).fetchone()
+
+        return bool(allowed), 0.0 if allowed else (1 - tokens) / refill_per_second
+
+    def prune(self, older_than_seconds: float) -> int:
+        """Delete buckets that have not been touched for a while"""
+        cursor = self._connection().execute(
+            "DELETE FROM rate_limit_buckets WHERE updated < ?", (time.time() - older_than_seconds,)
+        )
+        return cursor.rowcount
+
+
+_backend = None
+_backend_lock = Lock()
+
+
+class RateLimiter:
+    """Token-bucket rate limiting for auth and OTP endpoints"""
+
+    @staticmethod
+    def get_backend():
+        """Create the configured backend on first use"""
+        global _backend
+        if _backend is None:
+            with _backend_lock:
+                if _backend is None:
+                    if current_app.config.get('RATE_LIMIT_BACKEND', 'sqlite') == 'memory':
+                        _backend = MemoryRateLimitBackend()
+                    else:
+                        _backend = SQLiteRateLimitBackend(current_app.config['RATE_LIMIT_STORAGE_PATH'])
+        return _backend
+
+    @staticmethod
+    def prune(older_than_seconds: float) -> int:
+        """Delete buckets idle for longer than older_than_seconds. Returns the number deleted"""
+        return RateLimiter.get_backend().prune(older_than_seconds)
+
+    @staticmethod
+    def hit(scope: str, identifier: Optional[str], limit: int, window_seconds: int) -> Tuple[bool, int]:
+        """
+        Count one request against the `limit` per `window_seconds` budget of
+        (scope, identifier). Bursts up to `limit` are allowed, then requests
+        are admitted at the sustained rate.
+        Returns (allowed, retry_after_seconds)
+        """
+        if not identifier or limit <= 0:
+            return True, 0
+
+        try:
+            allowed, retry_after = RateLimiter.get_backend().consume(
+                f"{scope}:{identifier}", limit, limit / window_seconds
+            )
+        except sqlite3.Error as e:
+            # Never lock users out because the limiter store is unavailable
+            current_app.logger.error(f"Rate limiter error: {str(e)}")
+            return True, 0
+
+        return allowed, max(1, math.ceil(retry_after)) if not allowed else 0
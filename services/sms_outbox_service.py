@@ -0,0 +1,485 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from flask import Flask, current_app
+from models.sms_outbox import SmsOutbox
+from services.sms_providers import create_sms_provider
+
+# Purpose of messages written by the benchmarks; never claimed by the real workers
+BENCHMARK_PURPOSE = 'benchmark'
+
+
+@contextmanager
+def benchmark_app(app):
+    """
+    A copy of the app whose database is a throwaway SQLite file holding only
+    the outbox, so benchmark messages can never reach a real worker or provider.
+    """
+    from database import db
+
+    directory = tempfile.mkdtemp(prefix='sms-benchmark-')
+    isolated = Flask(app.import_name)
+    isolated.config.update(app.config)
+    isolated.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directory, 'outbox.db')}"
+    isolated.config['SQLALCHEMY_BINDS'] = {}
+    db.init_app(isolated)
+    try:
+        with isolated.app_context():
+            db.metadata.create_all(db.engine, tables=[SmsOutbox.__table__])
+            try:
+                yield isolated
+            finally:
+                db.session.remove()
+                db.engine.dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class SmsOutboxWorker:
+    """Background worker that drains the SMS outbox through a thread pool.
+
+    A single dispatcher thread claims due messages in batches, hands them to
+    the pool for delivery and records the results. Claims are atomic, so any
+    number of workers (threads, gunicorn processes or the CLI worker) can run
+    against the same outbox.
+    """
+
+    def __init__(self, app, provider=None, threads=8, batch_size=50, poll_seconds=2.0,
+                 lease_seconds=120, base_backoff_seconds=5, purpose=None, exclude_purposes=None):
+        self.app = app
+        self.provider = provider or create_sms_provider(app.config)
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.base_backoff_seconds = base_backoff_seconds
+        self.purpose = purpose
+        self.exclude_purposes = exclude_purposes
+
+        self.sent = 0
+        self.failed = 0
+        self._wake = Event()
+        self._stopping = Event()
+        self._executor = None
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, app, provider=None):
+        """Create a worker using the SMS_OUTBOX_* settings"""
+        config = app.config
+        return cls(
+            app,
+            provider=provider,
+            threads=config.get('SMS_OUTBOX_WORKER_THREADS', 8),
+            batch_size=config.get('SMS_OUTBOX_BATCH_SIZE', 50),
+            poll_seconds=config.get('SMS_OUTBOX_POLL_SECONDS', 2.0),
+            lease_seconds=config.get('SMS_OUTBOX_LEASE_SECONDS', 120),
+            base_backoff_seconds=config.get('SMS_RETRY_BASE_SECONDS', 5),
+            # Batched purposes are delivered by the SmsBatchDispatcher
+            exclude_purposes=list(config.get('SMS_BATCHED_PURPOSES') or ()) + [BENCHMARK_PURPOSE]
+        )
+
+    def start(self):
+        """Start the dispatcher thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='sms-outbox')
+        self._thread = Thread(target=self._run, name='sms-outbox-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the current batch"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def notify(self):
+        """Wake the dispatcher because new messages were committed"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.drain_once()
+            except Exception as e:
+                processed = 0
+                self.app.logger.error(f"SMS outbox worker error: {str(e)}")
+
+            # Keep going while there is a backlog, otherwise sleep until woken or the next poll
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def drain_once(self):
+        """
+        Claim one batch of due messages, deliver them concurrently and record
+        the outcome. Must run inside an app context.
+
+        Returns:
+            int: Number of messages processed
+        """
+        rows = SmsOutbox.claim_batch(self.batch_size, self.lease_seconds, self.purpose, self.exclude_purposes)
+        if not rows:
+            return 0
+
+        executor = self._executor or ThreadPoolExecutor(max_workers=self.threads)
+        try:
+            results = list(executor.map(self._deliver, rows))
+        finally:
+            if executor is not self._executor:
+                executor.shutdown(wait=True)
+
+        sent_ids = [row.id for row, (success, _) in zip(rows, results) if success]
+        failures = [(row, message) for row, (success, message) in zip(rows, results) if not success]
+
+        SmsOutbox.mark_sent(sent_ids)
+        SmsOutbox.mark_failed(failures, base_backoff_seconds=self.base_backoff_seconds)
+
+        self.sent += len(sent_ids)
+        self.failed += len(failures)
+        return len(rows)
+
+    def _deliver(self, row):
+        with self.app.app_context():
+            try:
+                return self.provider.send(row.phone_number, row.message)
+            except Exception as e:
+                return False, f"Unexpected error: {str(e)}"
+
+    def get_stats(self):
+        """Delivery counters for this worker"""
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'threads': self.threads,
+            'sent': self.sent,
+            'failed': self.failed
+        }
+
+
+class SmsBatchDispatcher:
+    """Background worker that delivers identical messages in multi-recipient calls.
+
+    Handles the outbox purposes in SMS_BATCHED_PURPOSES (appointment alerts and
+    reminders), where a few seconds of delay is fine. Copies of the same text
+    queued within the grouping window are claimed together and sent with one
+    provider call per `max_recipients` numbers, paced by a token bucket
+    shared by every worker on the host. Delivery state stays per recipient:
+    each outbox row is marked sent or failed with the call's outcome, and rows
+    whose batch failed are retried one number per call, so an invalid number
+    cannot hold back the rest of its batch.
+    """
+
+    def __init__(self, app, purposes, provider=None, window_seconds=5, max_recipients=100,
+                 calls_per_second=5, claim_size=1000, poll_seconds=2.0, lease_seconds=120,
+                 base_backoff_seconds=5):
+        self.app = app
+        self.purposes = list(purposes)
+        self.provider = provider or create_sms_provider(app.config)
+        self.window_seconds = window_seconds
+        self.max_recipients = max_recipients
+        self.calls_per_second = calls_per_second
+        self.claim_size = claim_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.base_backoff_seconds = base_backoff_seconds
+
+        self.calls = 0
+        self.sent = 0
+        self.failed = 0
+        self._wake = Event()
+        self._stopping = Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, app, provider=None):
+        """Create a dispatcher using the SMS_BATCH_* settings"""
+        config = app.config
+        return cls(
+            app,
+            config.get('SMS_BATCHED_PURPOSES', ()),
+            provider=provider,
+            window_seconds=config.get('SMS_BATCH_WINDOW_SECONDS', 5),
+            max_recipients=config.get('SMS_BATCH_MAX_RECIPIENTS', 100),
+            calls_per_second=config.get('SMS_BATCH_CALLS_PER_SECOND', 5),
+            claim_size=config.get('SMS_BATCH_CLAIM_SIZE', 1000),
+            poll_seconds=config.get('SMS_OUTBOX_POLL_SECONDS', 2.0),
+            lease_seconds=config.get('SMS_OUTBOX_LEASE_SECONDS', 120),
+            base_backoff_seconds=config.get('SMS_RETRY_BASE_SECONDS', 5)
+        )
+
+    def start(self):
+        """Start the dispatcher thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = Thread(target=self._run, name='sms-batch-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the current batch"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Wake the dispatcher because new messages were committed"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.drain_once()
+            except Exception as e:
+                processed = 0
+                self.app.logger.error(f"SMS batch dispatcher error: {str(e)}")
+
+            # Keep going while there is a backlog; otherwise wait for the
+            # grouping window to close on anything queued meanwhile
+            if processed < self.claim_size:
+                self._wake.wait(min(self.poll_seconds, self.window_seconds) or self.poll_seconds)
+                self._wake.clear()
+
+    def drain_once(self):
+        """
+        Claim the messages whose grouping window has closed and deliver them
+        in multi-recipient calls. Must run inside an app context.
+
+        Returns:
+            int: Number of messages processed
+        """
+        rows = SmsOutbox.claim_groups(self.purposes, self.window_seconds, self.max_recipients,
+                                      self.claim_size, self.lease_seconds)
+        if not rows:
+            return 0
+
+        calls = list(self._plan_calls(rows))
+        for index, (message, recipients) in enumerate(calls):
+            if not self._throttle():
+                # Stopping: hand the unsent rows back rather than call outside the budget
+                SmsOutbox.release([row.id for _, pending in calls[index:] for row in pending])
+                break
+            self._deliver(message, recipients)
+        return len(rows)
+
+    def _plan_calls(self, rows):
+        """Group claimed rows into (message, rows) provider calls"""
+        groups = OrderedDict()
+        for row in rows:
+            groups.setdefault(row.message, []).append(row)
+
+        for message, group in groups.items():
+            fresh = []
+            for row in group:
+                if row.attempts > 1:
+                    # Failed in an earlier batch; isolate it
+                    yield message, [row]
+                else:
+                    fresh.append(row)
+
+            # Each call carries up to max_recipients distinct numbers; a number
+            # queued twice for the same text gets it once
+            by_number = OrderedDict()
+            for row in fresh:
+                by_number.setdefault(row.phone_number, []).append(row)
+            numbers = list(by_number)
+            for start in range(0, len(numbers), self.max_recipients):
+                yield message, [row for number in numbers[start:start + self.max_recipients]
+                                for row in by_number[number]]
+
+    def _deliver(self, message, rows):
+        """Send one provider call and record the outcome on every recipient row"""
+        phone_numbers = list(OrderedDict.fromkeys(row.phone_number for row in rows))
+        try:
+            success, result_message, provider_ref = self.provider.send_many(phone_numbers, message)
+        except Exception as e:
+            success, result_message, provider_ref = False, f"Unexpected error: {str(e)}", None
+        self.calls += 1
+
+        if success:
+            SmsOutbox.mark_sent([row.id for row in rows], provider_ref=provider_ref)
+            self.sent += len(rows)
+        else:
+            SmsOutbox.mark_failed([(row, result_message) for row in rows],
+                                  base_backoff_seconds=self.base_backoff_seconds)
+            self.failed += len(rows)
+
+    def _throttle(self):
+        """
+        Wait for a token from the provider's call budget, shared by all workers
+        on the host. Returns False if the dispatcher is stopped while waiting.
+        """
+        if not self.calls_per_second:
+            return True
+        from services.rate_limiter import RateLimiter
+
+        while not self._stopping.is_set():
+            try:
+                allowed, retry_after = RateLimiter.get_backend().consume(
+                    'sms_provider_calls', max(1, int(self.calls_per_second)), self.calls_per_second
+                )
+            except sqlite3.Error as e:
+                # Never stall delivery because the limiter store is unavailable
+                self.app.logger.error(f"SMS rate limiter error: {str(e)}")
+                return True
+            if allowed:
+                return True
+            self._stopping.wait(retry_after)
+        return False
+
+    def get_stats(self):
+        """Call and delivery counters for this dispatcher"""
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'purposes': self.purposes,
+            'calls': self.calls,
+            'sent': self.sent,
+            'failed': self.failed,
+            'recipients_per_call': round((self.sent + self.failed) / self.calls, 1) if self.calls else None
+        }
+
+
+_worker = None
+_batch_dispatcher = None
+_worker_lock = Lock()
+
+
+class SmsOutboxService:
+    """Service for queueing SMS through the outbox"""
+
+    @staticmethod
+    def enqueue(phone_number, message, purpose='otp'):
+        """Queue a message. Does not commit; call notify_worker() after committing."""
+        return SmsOutbox.enqueue(
+            phone_number,
+            message,
+            purpose=purpose,
+            max_attempts=current_app.config.get('SMS_OUTBOX_MAX_ATTEMPTS', 5)
+        )
+
+    @staticmethod
+    def has_pending(phone_number, message):
+        """Whether the same message is already queued and not yet delivered"""
+        return SmsOutbox.has_pending(phone_number, message)
+
+    @staticmethod
+    def notify_worker():
+        """Start this process's background workers on first use and wake them"""
+        global _worker, _batch_dispatcher
+        app = current_app._get_current_object()
+        if not app.config.get('SMS_OUTBOX_WORKER_ENABLED', True):
+            return
+
+        if _worker is None:
+            with _worker_lock:
+                if _worker is None:
+                    if app.config.get('SMS_BATCHED_PURPOSES'):
+                        _batch_dispatcher = SmsBatchDispatcher.from_config(app)
+                        _batch_dispatcher.start()
+                    _worker = SmsOutboxWorker.from_config(app)
+                    _worker.start()
+        _worker.notify()
+        if _batch_dispatcher:
+            _batch_dispatcher.notify()
+
+    @staticmethod
+    def get_worker():
+        """This process's background worker, if started"""
+        return _worker
+
+    @staticmethod
+    def get_batch_dispatcher():
+        """This process's batch dispatcher, if started"""
+        return _batch_dispatcher
+
+    @staticmethod
+    def get_batch_dispatcher_stats():
+        """Call counters of this process's batch dispatcher, or None when not started"""
+        return _batch_dispatcher.get_stats() if _batch_dispatcher else None
+
+    @staticmethod
+    def run_benchmark(app, count=1000, threads=8, batch_size=50, latency_ms=50):
+        """
+        Enqueue `count` messages in a throwaway outbox and drain them through a
+        fake provider.
+
+        Returns:
+            dict: Throughput figures
+        """
+        from services.sms_providers import FakeSMSProvider
+        from database import db
+
+        with benchmark_app(app) as isolated:
+            provider = FakeSMSProvider(latency_ms=latency_ms, keep_last=0)
+            worker = SmsOutboxWorker(isolated, provider=provider, threads=threads, batch_size=batch_size,
+                                     purpose=BENCHMARK_PURPOSE)
+
+            for i in range(count):
+                SmsOutbox.enqueue(f'0000{i:06d}', 'Benchmark message', purpose=BENCHMARK_PURPOSE)
+            db.session.commit()
+
+            started = time.perf_counter()
+            worker._executor = ThreadPoolExecutor(max_workers=threads)
+            try:
+                while worker.drain_once():
+                    pass
+            finally:
+                worker._executor.shutdown(wait=True)
+            elapsed = time.perf_counter() - started
+
+        return {
+            'messages': count,
+            'sent': worker.sent,
+            'failed': worker.failed,
+            'seconds': round(elapsed, 3),
+            'messages_per_second': round(count / elapsed, 1) if elapsed else None
+        }
+
+    @staticmethod
+    def run_batch_benchmark(app, count=1000, distinct_messages=10, max_recipients=100, latency_ms=50):
+        """
+        Enqueue `count` messages spread over `distinct_messages` texts in a
+        throwaway outbox and drain them through the batch dispatcher with a
+        fake provider.
+
+        Returns:
+            dict: Provider calls and throughput figures
+        """
+        from services.sms_providers import FakeSMSProvider
+        from database import db
+
+        with benchmark_app(app) as isolated:
+            provider = FakeSMSProvider(latency_ms=latency_ms, keep_last=0)
+            dispatcher = SmsBatchDispatcher(isolated, [BENCHMARK_PURPOSE], provider=provider, window_seconds=0,
+                                            max_recipients=max_recipients, calls_per_second=0)
+
+            for i in range(count):
+                SmsOutbox.enqueue(f'0000{i:06d}', f'Benchmark message {i % distinct_messages}',
+                                  purpose=BENCHMARK_PURPOSE)
+            db.session.commit()
+
+            started = time.perf_counter()
+            while dispatcher.drain_once():
+                pass
+            elapsed = time.perf_counter() - started
+
+        return {
+            'messages': count,
+            'provider_calls': dispatcher.calls,
+            'sent': dispatcher.sent,
+            'failed': dispatcher.failed,
+            'seconds': round(elapsed, 3),
+            'messages_per_second': round(count / elapsed, 1) if elapsed else None
+        }
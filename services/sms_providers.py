@@ -0,0 +1,119 @@
+import random
+import time
+import requests
+from threading import Lock
+from flask import current_app
+from services.http_client import get_http_client
+
+
+class Fast2SMSProvider:
+    """Delivers SMS through the Fast2SMS Quick SMS route"""
+
+    URL = "https://www.fast2sms.com/dev/bulkV2"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def send(self, phone_number, message):
+        """Send one SMS. Returns (success, message)"""
+        success, result_message, _ = self.send_many([phone_number], message)
+        return success, result_message
+
+    def send_many(self, phone_numbers, message):
+        """
+        Send the same SMS to several numbers in one call. The gateway accepts or
+        rejects the call as a whole.
+
+        Returns:
+            tuple: (success, message, provider request id)
+        """
+        try:
+            if not self.api_key:
+                return False, "Fast2SMS API key not configured", None
+
+            payload = {
+                "authorization": self.api_key,
+                "route": "q",
+                "message": message,
+                "numbers": ",".join(phone_numbers),
+                "flash": "0"
+            }
+
+            headers = {
+                'cache-control': "no-cache"
+            }
+
+            response = get_http_client('fast2sms').get(self.URL, headers=headers, params=payload)
+
+            if response.status_code == 200:
+                result = response.json()
+                if result.get('return', False):
+                    return True, "SMS sent successfully", result.get('request_id')
+                else:
+                    error_msg = result.get('message', ['Unknown error'])[0]
+                    return False, error_msg, None
+            else:
+                return False, f"API request failed with status {response.status_code}", None
+
+        except requests.exceptions.RequestException as e:
+            current_app.logger.error(f"Fast2SMS API error: {str(e)}")
+            return False, f"Network error: {str(e)}", None
+        except Exception as e:
+            current_app.logger.error(f"Unexpected error in Fast2SMS: {str(e)}")
+            return False, f"Unexpected error: {str(e)}", None
+
+
+class FakeSMSProvider:
+    """Local provider for offline development and throughput testing.
+
+    Simulates gateway latency and a failure rate, and keeps the last messages
+    it "sent" in memory.
+    """
+
+    def __init__(self, latency_ms=0, failure_rate=0.0, keep_last=1000):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.keep_last = keep_last
+        self.sent = []
+        self.sent_count = 0
+        self.failed_count = 0
+        self.calls = 0
+        self._lock = Lock()
+
+    def send(self, phone_number, message):
+        """Pretend to send one SMS. Returns (success, message)"""
+        success, result_message, _ = self.send_many([phone_number], message)
+        return success, result_message
+
+    def send_many(self, phone_numbers, message):
+        """Pretend to send one SMS to several numbers in one call. Returns (success, message, request id)"""
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+        with self._lock:
+            self.calls += 1
+            request_id = f"fake-{self.calls}"
+
+        if self.failure_rate and random.random() < self.failure_rate:
+            with self._lock:
+                self.failed_count += len(phone_numbers)
+            return False, "Simulated gateway failure", None
+
+        with self._lock:
+            self.sent_count += len(phone_numbers)
+            self.sent.extend((phone_number, message) for phone_number in phone_numbers)
+            if len(self.sent) > self.keep_last:
+                del self.sent[:len(self.sent) - self.keep_last]
+
+        current_app.logger.info(f"Fake SMS to {', '.join(phone_numbers)}: {message}")
+        return True, "SMS sent successfully", request_id
+
+
+def create_sms_provider(config):
+    """Build the SMS provider selected by SMS_PROVIDER"""
+    if config.get('SMS_PROVIDER') == 'fake':
+        return FakeSMSProvider(
+            latency_ms=config.get('FAKE_SMS_LATENCY_MS', 0),
+            failure_rate=config.get('FAKE_SMS_FAILURE_RATE', 0.0)
+        )
+    return Fast2SMSProvider(config.get('FAST2SMS_API_KEY'))
@@ -1,30 +1,31 @@
 from functools import wraps
-from flask import request, jsonify, g
+from flask import request, jsonify, g, current_app
 from typing import Optional
-from services.auth_service import AuthService
+from services.auth_service import AuthService, RequestIdentity
+from services.rate_limiter import RateLimiter
 from models.customer_db import Customer
+from utils.normalization import normalize_phone_number
 
 
 def require_auth(f):
     """
     Decorator to require authentication for a route.
-    Sets g.current_customer if authentication is successful.
+    Resolves the request identity (stored on g.auth_identity) if authentication
+    is successful; the Customer row is only loaded when the route calls
+    get_current_customer().
     Returns 401 JSON response if authentication fails.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        customer = AuthService.get_customer_from_request(request)
+        identity = AuthService.get_request_identity(request)
 
-        if not customer:
+        if not identity:
             return jsonify({
                 'success': False,
                 'message': 'Authentication required. Please provide a valid token or auth key.',
                 'error_code': 'AUTH_REQUIRED'
             }), 401
 
-        # Set current customer in Flask's g object for use in the route
-        g.current_customer = customer
-
         return f(*args, **kwargs)
 
     return decorated_function
@@ -33,13 +34,12 @@ def require_auth(f):
 def require_auth_optional(f):
     """
     Decorator that optionally authenticates a user.
-    Sets g.current_customer if authentication is successful, but doesn't fail if not.
+    Resolves the request identity if authentication is successful, but doesn't fail if not.
     Useful for routes that can work with or without authentication.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        customer = AuthService.get_customer_from_request(request)
-        g.current_customer = customer  # Will be None if not authenticated
+        AuthService.get_request_identity(request)  # Will be None if not authenticated
         return f(*args, **kwargs)
 
     return decorated_function
@@ -55,9 +55,9 @@ def require_customer_match(customer_id_param: str = 'customer_id'):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            customer = AuthService.get_customer_from_request(request)
+            identity = AuthService.get_request_identity(request)
 
-            if not customer:
+            if not identity:
                 return jsonify({
                     'success': False,
                     'message': 'Authentication required.',
@@ -85,14 +85,60 @@ def require_customer_match(customer_id_param: str = 'customer_id'):
                 }), 400
 
             # Check if the authenticated customer matches the target customer
-            if customer.id != target_customer_id:
+            if identity.customer_id != target_customer_id:
                 return jsonify({
                     'success': False,
                     'message': 'Access denied. You can only access your own data.',
                     'error_code': 'ACCESS_DENIED'
                 }), 403
 
-            g.current_customer = customer
+            return f(*args, **kwargs)
+
+        return decorated_function
+    return decorator
+
+
+def rate_limit(action: str, per_phone: bool = True):
+    """
+    Decorator to enforce auth rate limits before the route does any work.
+    Each client IP gets AUTH_RATE_LIMIT requests per minute for the action and,
+    when per_phone is set, each phone number gets MAX_AUTH_ATTEMPTS requests
+    per AUTH_ATTEMPT_WINDOW_SECONDS. Returns 429 JSON with Retry-After when exceeded.
+
+    Args:
+        action: Name of the limited action; routes sharing a name share limits
+        per_phone: Also limit by the phone_number in the request body
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            config = current_app.config
+
+            allowed, retry_after = RateLimiter.hit(
+                f'{action}:ip', request.remote_addr, config['AUTH_RATE_LIMIT'], 60
+            )
+
+            if allowed and per_phone:
+                data = request.get_json(silent=True) if request.is_json else request.form
+                # A JSON body that is not an object, or a phone number that is not a
+                # string, gets no phone bucket; the view rejects it with its own 400
+                phone_number = data.get('phone_number') if isinstance(data, dict) else None
+                phone_number = normalize_phone_number(phone_number) if isinstance(phone_number, str) else ''
+                allowed, retry_after = RateLimiter.hit(
+                    f'{action}:phone', phone_number,
+                    config['MAX_AUTH_ATTEMPTS'], config['AUTH_ATTEMPT_WINDOW_SECONDS']
+                )
+
+            if not allowed:
+                response = jsonify({
+                    'success': False,
+                    'message': f'Too many attempts. Please try again in {retry_after} seconds.',
+                    'error_code': 'RATE_LIMITED',
+                    'retry_after': retry_after
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+
             return f(*args, **kwargs)
 
         return decorated_function
@@ -101,10 +147,28 @@ def require_customer_match(customer_id_param: str = 'customer_id'):
 
 def get_current_customer() -> Optional[Customer]:
     """
-    Helper function to get the current authenticated customer from Flask's g object.
+    Helper function to get the current authenticated customer for this request.
+    Loads the Customer row on first use and keeps it on Flask's g object.
+    Returns None if no customer is authenticated.
+    """
+    return AuthService.get_identity_customer(get_current_identity())
+
+
+def get_current_customer_id() -> Optional[int]:
+    """
+    Helper function to get the current authenticated customer ID without
+    loading the Customer row. Returns None if no customer is authenticated.
+    """
+    identity = get_current_identity()
+    return identity.customer_id if identity else None
+
+
+def get_current_identity() -> Optional[RequestIdentity]:
+    """
+    Helper function to get the request identity, resolving it on first use.
     Returns None if no customer is authenticated.
     """
-    return getattr(g, 'current_customer', None)
+    return AuthService.get_request_identity(request)
 
 
 def get_auth_response_data(customer: Customer, token: str) -> dict:
@@ -120,8 +184,12 @@ def get_auth_response_data(customer: Customer, token: str) -> dict:
     """
     from models.customer_auth import CustomerAuth
 
-    # Get auth record to include auth_key and expiration
-    auth_record = CustomerAuth.query.filter_by(customer_id=customer.id).first()
+    # Reuse the identity captured at login/refresh, otherwise load the auth record
+    identity = g.get('auth_identity')
+    if identity and identity.customer_id == customer.id and identity.auth_key:
+        auth_record = identity
+    else:
+        auth_record = CustomerAuth.query.filter_by(customer_id=customer.id).first()
 
     return {
         'success': True,
@@ -0,0 +1,23 @@
+import re
+
+
+def normalize_phone_number(phone: str) -> str:
+    """Normalize phone number to 10 digits without country code"""
+    if not phone:
+        return ""
+
+    # Remove all non-digit characters
+    phone = re.sub(r'\D', '', phone)
+
+    # Remove country code if present
+    if phone.startswith('91') and len(phone) == 12:
+        phone = phone[2:]
+
+    return phone
+
+
+def normalize_email(email: str) -> str:
+    """Normalize email address for case-insensitive lookups"""
+    if not email:
+        return ""
+    return email.strip().lower()